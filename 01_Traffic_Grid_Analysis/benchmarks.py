@@ -0,0 +1,274 @@
+# benchmarks.py
+
+"""
+Benchmarks for the traffic grid analysis.
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from traffic_cube import TrafficCube
+from traffic_grid_analysis import TrafficGrid
+from traffic_hotspots import SparseTrafficGrid, hotspot_regions, top_k_intersections
+from traffic_batch import run_batch
+from traffic_loader import load_traffic_array
+from traffic_render import write_grid_text
+from traffic_simulation import TrafficSimulation
+
+def timed(function, *args, **kwargs):
+    """
+    Runs a function and returns its result and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def benchmark_grid(size=10_000, seed=42):
+    """
+    Times the TrafficGrid operations on a size x size grid.
+    """
+    grid, elapsed = timed(TrafficGrid.random, size, size, 0, 20, seed=seed)
+    timings = {'initialize': elapsed}
+    _, timings['total'] = timed(grid.total)
+    _, timings['max (array of ties)'] = timed(grid.max_intersections, as_array=True)
+    _, timings['max (list of ties)'] = timed(grid.max_intersections)
+    _, timings['transpose'] = timed(grid.transpose)
+
+    print(f"TrafficGrid {size} x {size} ({grid.counts.dtype}, {grid.counts.nbytes / 2**20:.0f} MB):")
+    for name, elapsed in timings.items():
+        print(f" - {name}: {elapsed * 1000:.1f} ms")
+    return timings
+
+def benchmark_simulation(size=1_000, steps=100, tile_size=None, workers_list=(1, 2, 4, 8)):
+    """
+    Measures the steps per second of the traffic simulation for several worker counts.
+    """
+    grid = TrafficGrid.random(size, size, 0, 20, seed=42)
+    results = {}
+    for workers in workers_list:
+        with TrafficSimulation(grid, tile_size=tile_size or -(-size // workers), workers=workers) as simulation:
+            _, stats = simulation.run(steps)
+        results[workers] = stats['steps_per_second']
+        print(f"Simulation {size} x {size}, {workers} worker(s): {stats['steps_per_second']:.1f} steps/s "
+              f"({stats['cell_updates_per_second']:,.0f} cell updates/s)")
+    return results
+
+def benchmark_hotspots(size=5_000, occupied=1_000_000, k=100, level=18, dense=True, seed=42):
+    """
+    Times top-k and hotspot regions on a sparse grid and, optionally, on a dense grid of the same size.
+    """
+    rng = np.random.default_rng(seed)
+    sparse = SparseTrafficGrid(rng.integers(0, size, occupied), rng.integers(0, size, occupied),
+                               rng.integers(1, 20, occupied, endpoint=True), (size, size))
+    grids = [(f'sparse, {sparse.nnz:,} occupied', sparse)]
+    if dense:
+        grids.insert(0, ('dense', TrafficGrid.random(size, size, 0, 20, seed=seed)))
+    timings = {}
+    for name, grid in grids:
+        _, top = timed(top_k_intersections, grid, k)
+        regions, found = timed(hotspot_regions, grid, level)
+        _, total = timed(grid.total)
+        timings[name] = {'top_k': top, 'regions': found, 'total': total}
+        print(f"{name} {size} x {size}: top {k} {top:.3f} s, {len(regions['vehicles']):,} regions above {level} in {found:.3f} s, "
+              f"total {total * 1000:.1f} ms")
+    return timings
+
+def legacy_load(file_path):
+    """
+    The original loader: csv.reader and one Python int per cell.
+    """
+    grid = []
+    with open(file_path, 'r') as file:
+        for row in csv.reader(file):
+            grid.append([int(value) for value in row])
+    return grid
+
+def anonymous_rss_mb():
+    """
+    Returns the current anonymous (non file-backed) resident memory in MB, from /proc (Linux).
+    Pages of a memory-mapped file are file-backed: they belong to the page cache and can be
+    dropped by the kernel at any time.
+    """
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('RssAnon:'):
+                return int(line.split()[1]) / 1024
+    return float('nan')
+
+def measure_loader(mode, file_path):
+    """
+    Loads a CSV grid and computes its total, and returns the time and memory use.
+    """
+    start = time.perf_counter()
+    if mode == 'legacy':
+        grid = TrafficGrid(legacy_load(file_path))
+    else:
+        grid = TrafficGrid(load_traffic_array(file_path))
+    loaded = time.perf_counter()
+    grid.total()
+    return {
+        'mode': mode,
+        'load_seconds': round(loaded - start, 3),
+        'total_seconds': round(time.perf_counter() - loaded, 3),
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'anonymous_rss_mb': round(anonymous_rss_mb(), 1)
+    }
+
+def benchmark_loader(file_path, size=5_000, modes=('legacy', 'mmap-convert', 'mmap')):
+    """
+    Compares the original CSV loader with the memory-mapped loader, each in a fresh process.
+    """
+    if not os.path.exists(file_path):
+        rng = np.random.default_rng(42)
+        with open(file_path, 'w') as file:
+            for start in range(0, size, 1_000):
+                np.savetxt(file, rng.integers(0, 20, size=(min(1_000, size - start), size), endpoint=True), fmt='%d', delimiter=',')
+    npy_path = os.path.splitext(file_path)[0] + '.npy'
+    results = []
+    for mode in modes:
+        if mode == 'mmap-convert' and os.path.exists(npy_path):
+            os.remove(npy_path)
+        output = subprocess.run([sys.executable, __file__, 'measure-loader', mode, file_path],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode:>12}: load {result['load_seconds']:.2f} s, total {result['total_seconds']:.2f} s, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB, anonymous RSS after the total {result['anonymous_rss_mb']:.0f} MB")
+    return results
+
+def benchmark_cube(frames=1_440, size=100, queries=1_000, seed=42):
+    """
+    Compares cube queries with rescanning the frames, for random rectangles and time ranges.
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 20, size=(frames, size, size), dtype=np.uint8, endpoint=True)
+    cube, build = timed(TrafficCube.from_frames, data)
+    print(f"Cube of {frames} frames of {size} x {size}: built in {build:.2f} s, {cube.nbytes() / 2**20:.0f} MB")
+
+    windows = []
+    for _ in range(queries):
+        t0, t1 = np.sort(rng.integers(0, frames + 1, size=2))
+        r0, r1 = np.sort(rng.integers(0, size + 1, size=2))
+        c0, c1 = np.sort(rng.integers(0, size + 1, size=2))
+        windows.append((t0, t1, (r0, r1), (c0, c1)))
+    timings = {}
+    _, timings['region total (cube)'] = timed(lambda: [cube.region_total(*window) for window in windows])
+    _, timings['region total (rescan)'] = timed(lambda: [int(data[t0:t1, r0:r1, c0:c1].sum(dtype=np.int64))
+                                                         for t0, t1, (r0, r1), (c0, c1) in windows])
+    _, timings['window max (cube)'] = timed(lambda: [cube.window_max(*window) for window in windows])
+    _, timings['window max (rescan)'] = timed(lambda: [data[t0:t1, r0:r1, c0:c1].max(axis=0, initial=0)
+                                                       for t0, t1, (r0, r1), (c0, c1) in windows])
+    for name, elapsed in timings.items():
+        print(f" - {name}: {elapsed / queries * 1e6:,.1f} us per query")
+    return timings
+
+def legacy_print_grid(grid, file):
+    """
+    The original print_grid: one f-string per cell.
+    """
+    for row in grid.counts:
+        print(' '.join(f"{value:2}" for value in row), file=file)
+
+def legacy_save_heatmap(counts, file_path):
+    """
+    Saves a heatmap through a pyplot figure, as visualize_traffic_density draws it.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.imshow(counts, cmap='hot', interpolation='nearest')
+    plt.colorbar(label='Number of Vehicles')
+    plt.savefig(file_path)
+    plt.close()
+
+def benchmark_batch(frames=2_000, size=100, legacy_frames=50, text_size=2_000, workers=None, seed=42):
+    """
+    Compares the headless batch renderer with pyplot figures, and the bulk text dump with the
+    original print_grid.
+    """
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        stack_path = os.path.join(directory, 'frames.npy')
+        np.save(stack_path, rng.integers(0, 20, size=(frames, size, size), dtype=np.uint8, endpoint=True))
+        _, stats = run_batch([stack_path], os.path.join(directory, 'output'), workers)
+        print(f"Batch of {frames} frames of {size} x {size}: {stats['seconds']:.2f} s, "
+              f"{stats['frames_per_minute']:,.0f} frames per minute")
+
+        stack = np.load(stack_path, mmap_mode='r')
+        _, elapsed = timed(lambda: [legacy_save_heatmap(stack[t], os.path.join(directory, f'legacy_{t}.png'))
+                                    for t in range(legacy_frames)])
+        print(f"pyplot figures, {legacy_frames} frames: {elapsed:.2f} s, {60 * legacy_frames / elapsed:,.0f} frames per minute")
+
+    grid = TrafficGrid.random(text_size, text_size, 0, 20, seed=seed)
+    with open(os.devnull, 'w') as devnull:
+        _, legacy = timed(legacy_print_grid, grid, devnull)
+        _, bulk = timed(write_grid_text, grid, devnull)
+    print(f"Text dump of {text_size} x {text_size}: original print_grid {legacy:.2f} s, bulk {bulk:.3f} s")
+    return stats, legacy, bulk
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the traffic grid analysis.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    grid_parser = subparsers.add_parser('grid', help='TrafficGrid operations on a large grid')
+    grid_parser.add_argument('--size', type=int, default=10_000)
+
+    simulation_parser = subparsers.add_parser('simulation', help='Steps per second of the traffic simulation')
+    simulation_parser.add_argument('--size', type=int, default=1_000)
+    simulation_parser.add_argument('--steps', type=int, default=100)
+    simulation_parser.add_argument('--tile-size', type=int, default=None)
+    simulation_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+
+    cube_parser = subparsers.add_parser('cube', help='Traffic cube queries versus rescanning the frames')
+    cube_parser.add_argument('--frames', type=int, default=1_440)
+    cube_parser.add_argument('--size', type=int, default=100)
+    cube_parser.add_argument('--queries', type=int, default=1_000)
+
+    hotspots_parser = subparsers.add_parser('hotspots', help='Top-k and hotspot regions on dense and sparse grids')
+    hotspots_parser.add_argument('--size', type=int, default=5_000)
+    hotspots_parser.add_argument('--occupied', type=int, default=1_000_000)
+    hotspots_parser.add_argument('--sparse-only', action='store_true', help='skip the dense grid (for grids too large to hold densely)')
+
+    batch_parser = subparsers.add_parser('batch', help='Headless batch rendering and text dumps versus pyplot and print_grid')
+    batch_parser.add_argument('--frames', type=int, default=2_000)
+    batch_parser.add_argument('--size', type=int, default=100)
+    batch_parser.add_argument('--workers', type=int, default=None)
+
+    loader_parser = subparsers.add_parser('loader', help='Original CSV loader versus the memory-mapped loader')
+    loader_parser.add_argument('--file', default='data/large_grid.csv')
+    loader_parser.add_argument('--size', type=int, default=5_000)
+
+    measure_parser = subparsers.add_parser('measure-loader', help=argparse.SUPPRESS)
+    measure_parser.add_argument('mode', choices=['legacy', 'mmap-convert', 'mmap'])
+    measure_parser.add_argument('file')
+
+    args = parser.parse_args()
+    if args.command == 'grid':
+        benchmark_grid(args.size)
+    elif args.command == 'simulation':
+        benchmark_simulation(args.size, args.steps, args.tile_size, args.workers)
+    elif args.command == 'cube':
+        benchmark_cube(args.frames, args.size, args.queries)
+    elif args.command == 'hotspots':
+        benchmark_hotspots(args.size, args.occupied, dense=not args.sparse_only)
+    elif args.command == 'batch':
+        benchmark_batch(args.frames, args.size, workers=args.workers)
+    elif args.command == 'loader':
+        os.makedirs(os.path.dirname(args.file) or '.', exist_ok=True)
+        benchmark_loader(args.file, args.size)
+    elif args.command == 'measure-loader':
+        print(json.dumps(measure_loader(args.mode, args.file)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# traffic_batch.py
+
+"""
+Traffic Grid Batch Processing
+
+This script analyzes and renders many traffic grid files without any prompt or display:
+- Every file is a CSV, .npy or raw grid (see traffic_loader); a 3D .npy file is a stack of
+  frames (time x rows x columns), e.g. recorded by the traffic simulation
+- Every frame gets its total and highest number of vehicles, a PNG heatmap and, optionally,
+  a text or CSV dump
+- Files and blocks of frames are processed in parallel by a process pool
+- A summary of all the frames is written to summary.csv in the output directory
+"""
+
+import csv
+import os
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+
+from traffic_grid_analysis import TrafficGrid
+from traffic_loader import load_traffic_array
+from traffic_render import colormap_lut, save_heatmap, write_grid_text
+
+# Frames of a stacked file handled by one task of the pool
+FRAMES_PER_TASK = 64
+SUMMARY_FIELDS = ['file', 'frame', 'rows', 'cols', 'total_vehicles', 'max_vehicles', 'max_intersections', 'image', 'text']
+TEXT_FORMATS = {'txt': ('%2d', ' '), 'csv': ('%d', ',')}
+
+def output_names(files):
+    """
+    Returns the base name of the outputs of every file: the file name without its extension,
+    followed by the position of the file in the list when several files share that name.
+    """
+    stems = [os.path.splitext(os.path.basename(file_path))[0] for file_path in files]
+    repeated = Counter(stems)
+    return [stem if repeated[stem] == 1 else f'{stem}_{index}' for index, stem in enumerate(stems)]
+
+def split_tasks(files, frames_per_task=FRAMES_PER_TASK):
+    """
+    Splits the files into (file, name, first_frame, last_frame) tasks: one per 2D grid, one per
+    block of frames of a stacked file (the frame range is None for a 2D grid). Only .npy files
+    can hold stacks; their header is read here, and the other files are loaded (and CSV files
+    converted) by the workers.
+    """
+    tasks = []
+    for file_path, name in zip(files, output_names(files)):
+        is_npy = os.path.splitext(file_path)[1].lower() == '.npy'
+        counts = np.load(file_path, mmap_mode='r') if is_npy else None
+        if counts is not None and counts.ndim == 3:
+            tasks.extend((file_path, name, start, min(start + frames_per_task, len(counts)))
+                         for start in range(0, len(counts), frames_per_task))
+        else:
+            tasks.append((file_path, name, None, None))
+    return tasks
+
+def process_task(task, output_dir, image=True, text=None, cmap='hot', scale=1, vmin=None, vmax=None):
+    """
+    Analyzes and renders the frames of one task and returns their summary rows.
+    """
+    file_path, stem, start, stop = task
+    counts = load_traffic_array(file_path)
+    frames = [(None, counts)] if start is None else [(t, counts[t]) for t in range(start, stop)]
+    lut = colormap_lut(cmap) if image else None
+    summaries = []
+    for t, frame in frames:
+        grid = TrafficGrid(frame)
+        name = stem if t is None else f'{stem}_{t:05d}'
+        max_vehicles, positions = grid.max_intersections(as_array=True)
+        summary = {
+            'file': file_path, 'frame': '' if t is None else t, 'rows': grid.shape[0], 'cols': grid.shape[1],
+            'total_vehicles': grid.total(), 'max_vehicles': max_vehicles, 'max_intersections': len(positions),
+            'image': '', 'text': ''
+        }
+        if image:
+            summary['image'] = save_heatmap(grid, os.path.join(output_dir, name + '.png'), scale=scale, vmin=vmin, vmax=vmax, lut=lut)
+        if text:
+            summary['text'] = os.path.join(output_dir, f'{name}.{text}')
+            write_grid_text(grid, summary['text'], *TEXT_FORMATS[text])
+        summaries.append(summary)
+    return summaries
+
+def _process_task(arguments):
+    task, options = arguments
+    return process_task(task, **options)
+
+def run_batch(files, output_dir, workers=None, image=True, text=None, cmap='hot', scale=1, vmin=None, vmax=None,
+              frames_per_task=FRAMES_PER_TASK):
+    """
+    Processes the grid files in a pool of workers (all CPU cores by default) and writes the
+    summary of every frame to summary.csv. Returns the summary rows and the throughput.
+    """
+    if text not in (None, *TEXT_FORMATS):
+        raise ValueError(f"text must be one of {tuple(TEXT_FORMATS)} or None, got {text!r}")
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    tasks = split_tasks(files, frames_per_task)
+    options = {'output_dir': output_dir, 'image': image, 'text': text, 'cmap': cmap, 'scale': scale, 'vmin': vmin, 'vmax': vmax}
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(_process_task, [(task, options) for task in tasks], chunksize=1)
+    else:
+        results = [process_task(task, **options) for task in tasks]
+    summaries = [summary for result in results for summary in result]
+
+    with open(os.path.join(output_dir, 'summary.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(summaries)
+    elapsed = time.perf_counter() - start
+    return summaries, {
+        'files': len(files),
+        'frames': len(summaries),
+        'seconds': elapsed,
+        'frames_per_minute': 60 * len(summaries) / elapsed if elapsed else float('inf')
+    }
@@ -0,0 +1,193 @@
+# traffic_cube.py
+
+"""
+Traffic Cube
+
+This script stores a time series of traffic grids (time x rows x columns), e.g. one grid per
+minute, and answers region queries without rescanning the frames:
+- A 3D summed-area table (prefix sums over time, rows and columns) gives the total number of
+  vehicles in any rectangle over any time range in O(1)
+- A pyramid of per-cell maxima over blocks of 1, 2, 4, ... frames gives the busiest
+  intersections of any rectangle over any time range from O(log n) blocks
+- Frames can be appended one at a time; both structures are updated incrementally
+"""
+
+import numpy as np
+
+from traffic_grid_analysis import TrafficGrid, as_traffic_grid
+from traffic_hotspots import top_k_intersections
+
+class TrafficCube:
+    """
+    A growing (time x rows x columns) store of traffic grids with region queries.
+
+    Time slots are frame indices; with a start time, datetime64 values are accepted as well and
+    mapped to slots of the given interval (one minute by default). Ranges are half-open:
+    [t0, t1) for time, [r0, r1) for rows and [c0, c1) for columns.
+    """
+
+    def __init__(self, rows, cols, start=None, interval=np.timedelta64(1, 'm'), capacity=64):
+        self.rows = rows
+        self.cols = cols
+        self.start = None if start is None else np.datetime64(start)
+        self.interval = np.timedelta64(interval)
+        self.num_frames = 0
+        # Prefix sums: sums[t, r, c] is the total of frames [0, t) over rows [0, r) and columns [0, c)
+        self._sums = np.zeros((capacity + 1, rows + 1, cols + 1), dtype=np.int64)
+        # Max pyramid: level k holds the per-cell maximum of every complete block of 2**k frames
+        self._levels = []
+
+    @classmethod
+    def from_frames(cls, frames, start=None, interval=np.timedelta64(1, 'm')):
+        """
+        Builds a cube from a sequence of grids or a (time x rows x columns) array.
+        """
+        frames = [as_traffic_grid(frame).counts for frame in frames]
+        cube = cls(*frames[0].shape, start=start, interval=interval, capacity=len(frames))
+        for frame in frames:
+            cube.append(frame)
+        return cube
+
+    def _grow(self, array, length):
+        # Doubles the capacity of a growing array along its first axis when it is full
+        if length < len(array):
+            return array
+        grown = np.zeros((max(2 * len(array), 1),) + array.shape[1:], dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def append(self, frame):
+        """
+        Appends the next frame (any grid accepted by the analysis functions).
+        """
+        counts = as_traffic_grid(frame).counts
+        if counts.shape != (self.rows, self.cols):
+            raise ValueError(f"frame shape {counts.shape} does not match the cube ({self.rows}, {self.cols})")
+        t = self.num_frames
+
+        self._sums = self._grow(self._sums, t + 1)
+        integral = np.zeros((self.rows + 1, self.cols + 1), dtype=np.int64)
+        np.cumsum(np.cumsum(counts, axis=0, dtype=np.int64), axis=1, out=integral[1:, 1:])
+        np.add(self._sums[t], integral, out=self._sums[t + 1])
+
+        if not self._levels:
+            self._levels.append(np.zeros((1, self.rows, self.cols), dtype=counts.dtype))
+        self._levels[0] = self._grow(self._levels[0], t)
+        self._levels[0][t] = counts
+        # Close every block that this frame completes
+        level, index = 0, t
+        while index % 2 == 1:
+            level, index = level + 1, index // 2
+            if len(self._levels) == level:
+                self._levels.append(np.zeros((1, self.rows, self.cols), dtype=self._levels[0].dtype))
+            self._levels[level] = self._grow(self._levels[level], index)
+            below = self._levels[level - 1]
+            np.maximum(below[2 * index], below[2 * index + 1], out=self._levels[level][index])
+        self.num_frames += 1
+
+    def slot(self, time):
+        """
+        Returns the frame index of a time: an int is a frame index, a datetime64 is mapped with start and interval.
+        """
+        if isinstance(time, (int, np.integer)):
+            return int(time)
+        if self.start is None:
+            raise ValueError("the cube has no start time; use frame indices")
+        return int((np.datetime64(time) - self.start) // self.interval)
+
+    def _ranges(self, t0, t1, rows, cols):
+        t0 = 0 if t0 is None else self.slot(t0)
+        t1 = self.num_frames if t1 is None else self.slot(t1)
+        r0, r1 = rows if rows is not None else (0, self.rows)
+        c0, c1 = cols if cols is not None else (0, self.cols)
+        t0, t1 = max(t0, 0), min(t1, self.num_frames)
+        r0, r1, c0, c1 = max(r0, 0), min(r1, self.rows), max(c0, 0), min(c1, self.cols)
+        return t0, max(t1, t0), r0, max(r1, r0), c0, max(c1, c0)
+
+    def frame(self, t):
+        """
+        Returns the frame at a time slot as a TrafficGrid.
+        """
+        return TrafficGrid(self._levels[0][self.slot(t)])
+
+    def region_total(self, t0=None, t1=None, rows=None, cols=None):
+        """
+        Returns the total number of vehicles in rows [r0, r1) x columns [c0, c1) over frames
+        [t0, t1), in O(1). With no arguments it is calculate_total_vehicles of all frames.
+        """
+        t0, t1, r0, r1, c0, c1 = self._ranges(t0, t1, rows, cols)
+        s = self._sums
+        return int(
+            s[t1, r1, c1] - s[t1, r0, c1] - s[t1, r1, c0] + s[t1, r0, c0]
+            - s[t0, r1, c1] + s[t0, r0, c1] + s[t0, r1, c0] - s[t0, r0, c0]
+        )
+
+    def cell_totals(self, t0=None, t1=None, rows=None, cols=None):
+        """
+        Returns the total number of vehicles of every cell of the rectangle over frames [t0, t1),
+        from the prefix sums (O(area), independent of the number of frames).
+        """
+        t0, t1, r0, r1, c0, c1 = self._ranges(t0, t1, rows, cols)
+        window = self._sums[t1, r0:r1 + 1, c0:c1 + 1] - self._sums[t0, r0:r1 + 1, c0:c1 + 1]
+        return window[1:, 1:] - window[:-1, 1:] - window[1:, :-1] + window[:-1, :-1]
+
+    def window_max(self, t0=None, t1=None, rows=None, cols=None):
+        """
+        Returns the per-cell maximum of the rectangle over frames [t0, t1), combined from
+        O(log n) blocks of the max pyramid.
+        """
+        t0, t1, r0, r1, c0, c1 = self._ranges(t0, t1, rows, cols)
+        result = np.zeros((r1 - r0, c1 - c0), dtype=self._levels[0].dtype if self._levels else np.int64)
+        if t0 == t1:
+            return result
+        first = True
+        level = 0
+        while t0 < t1:
+            blocks = []
+            if t0 % 2 == 1:
+                blocks.append(t0)
+                t0 += 1
+            if t1 % 2 == 1:
+                t1 -= 1
+                blocks.append(t1)
+            for index in blocks:
+                block = self._levels[level][index, r0:r1, c0:c1]
+                if first:
+                    result[:] = block
+                    first = False
+                else:
+                    np.maximum(result, block, out=result)
+            t0, t1, level = t0 // 2, t1 // 2, level + 1
+        return result
+
+    def max_intersections(self, t0=None, t1=None, rows=None, cols=None):
+        """
+        Returns the highest vehicle count of the rectangle over frames [t0, t1) and the grid
+        positions that reach it, like find_max_traffic_intersections on the window.
+        """
+        _, _, r0, _, c0, _ = self._ranges(t0, t1, rows, cols)
+        max_vehicles, positions = TrafficGrid(self.window_max(t0, t1, rows, cols)).max_intersections()
+        return max_vehicles, [(r + r0, c + c0) for r, c in positions]
+
+    def top_hotspots(self, k, t0=None, t1=None, rows=None, cols=None, by='total'):
+        """
+        Returns the k busiest intersections of the rectangle over frames [t0, t1), as
+        ((row, column), value) pairs from the busiest down. by='total' ranks cells by their total
+        number of vehicles over the window, by='max' by their highest count in a single frame.
+        """
+        _, _, r0, _, c0, _ = self._ranges(t0, t1, rows, cols)
+        if by == 'total':
+            values = self.cell_totals(t0, t1, rows, cols)
+        elif by == 'max':
+            values = self.window_max(t0, t1, rows, cols)
+        else:
+            raise ValueError(f"by must be 'total' or 'max', got {by!r}")
+        return [((row + r0, col + c0), value) for (row, col), value in top_k_intersections(values, k)]
+
+    def nbytes(self):
+        """
+        Returns the memory used by the frames, the prefix sums and the pyramid, in bytes.
+        """
+        return self._sums[:self.num_frames + 1].nbytes + sum(
+            level[:self.num_frames >> k].nbytes for k, level in enumerate(self._levels)
+        )
@@ -9,69 +9,166 @@ This script simulates traffic flow in a city grid and performs analyses such as:
 - Transposing the grid
 - Visualizing traffic density
 - Processing real traffic data from external sources
+- Processing many grid files in a batch, without prompts or display (see traffic_batch)
 
 Author: Your Name
 Date: YYYY-MM-DD
 """
 
-import random
-import csv
+import argparse
+import numpy as np
 import matplotlib.pyplot as plt
 
+# Number of cells scanned at a time by the TrafficGrid reductions
+BAND_CELLS = 1 << 22
+
+def vehicle_dtype(min_vehicles, max_vehicles):
+    """
+    Returns the smallest integer dtype that holds every vehicle count in the range.
+    """
+    candidates = (np.uint8, np.uint16, np.uint32, np.uint64) if min_vehicles >= 0 else (np.int8, np.int16, np.int32, np.int64)
+    for dtype in candidates:
+        info = np.iinfo(dtype)
+        if info.min <= min_vehicles and max_vehicles <= info.max:
+            return np.dtype(dtype)
+    raise ValueError(f"no integer dtype holds vehicle counts from {min_vehicles} to {max_vehicles}")
+
+class TrafficGrid:
+    """
+    A 2D traffic grid of vehicle counts stored in a compact integer NumPy array.
+    """
+
+    def __init__(self, counts):
+        if not isinstance(counts, np.ndarray):
+            # Lists of Python ints are stored in the smallest dtype of their range
+            counts = np.asarray(counts, dtype=np.int64)
+            if counts.size:
+                counts = counts.astype(vehicle_dtype(int(counts.min()), int(counts.max())))
+        elif counts.dtype.kind not in 'iu':
+            counts = counts.astype(np.int64)
+        if counts.ndim != 2:
+            # An empty list is a grid without rows or columns
+            counts = counts.reshape(len(counts), -1) if len(counts) else counts.reshape(0, 0)
+        self.counts = counts
+
+    @classmethod
+    def random(cls, rows=10, cols=10, min_vehicles=0, max_vehicles=20, seed=None):
+        """
+        Creates a grid with uniformly random vehicle counts in [min_vehicles, max_vehicles].
+        """
+        rng = np.random.default_rng(seed)
+        dtype = vehicle_dtype(min_vehicles, max_vehicles)
+        return cls(rng.integers(min_vehicles, max_vehicles, size=(rows, cols), dtype=dtype, endpoint=True))
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, index):
+        return self.counts[index]
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.counts if dtype is None else self.counts.astype(dtype)
+
+    def row_bands(self, band_cells=BAND_CELLS):
+        """
+        Yields (first_row, band) blocks of whole rows with about band_cells cells each, so that
+        scans of a memory-mapped grid only keep one band in memory.
+        """
+        band_rows = max(1, band_cells // max(self.counts.shape[1], 1))
+        for start in range(0, self.counts.shape[0], band_rows):
+            yield start, self.counts[start:start + band_rows]
+
+    def total(self):
+        """
+        Returns the total number of vehicles in the grid.
+        """
+        return sum(int(band.sum(dtype=np.int64)) for _, band in self.row_bands())
+
+    def max_intersections(self, as_array=False):
+        """
+        Returns the highest vehicle count and the (row, column) positions that have it, in row order.
+        Like the original scan, the maximum starts at 0, so a grid without positive counts reports 0.
+        With as_array=True the positions are an (n, 2) array instead of a list of tuples, which
+        avoids building millions of tuples when a large grid has many ties.
+        """
+        if self.counts.size == 0:
+            return 0, np.empty((0, 2), dtype=np.int64) if as_array else []
+        max_vehicles = max(max(int(band.max()) for _, band in self.row_bands()), 0)
+        positions = []
+        for start, band in self.row_bands():
+            rows, cols = np.nonzero(band == max_vehicles)
+            positions.append(np.column_stack([rows + start, cols]))
+        positions = np.concatenate(positions)
+        if as_array:
+            return max_vehicles, positions
+        return max_vehicles, list(zip(positions[:, 0].tolist(), positions[:, 1].tolist()))
+
+    def transpose(self):
+        """
+        Returns the transposed grid as a view of the same counts (no copy).
+        """
+        return TrafficGrid(self.counts.T)
+
+    def tolist(self):
+        return self.counts.tolist()
+
+def as_traffic_grid(grid):
+    """
+    Wraps a list of lists or an array as a TrafficGrid (a TrafficGrid is returned as is).
+    """
+    return grid if isinstance(grid, TrafficGrid) else TrafficGrid(grid)
+
 def initialize_traffic_grid(rows=10, cols=10, min_vehicles=0, max_vehicles=20):
     """
     Initializes a 2D traffic grid with random vehicle counts.
     """
-    grid = []
-    for i in range(rows):
-        row = []
-        for j in range(cols):
-            row.append(random.randint(min_vehicles, max_vehicles))
-        grid.append(row)
-    return grid
+    return TrafficGrid.random(rows, cols, min_vehicles, max_vehicles)
 
 def print_grid(grid, title="Grid"):
     """
     Prints the grid in a formatted way.
+    Every distinct count is formatted once and the rows are assembled in bulk (see traffic_render).
     """
+    from traffic_render import write_grid_text
+
     print(f"\n{title}:")
-    for row in grid:
-        print(' '.join(f"{value:2}" for value in row))
+    write_grid_text(grid, fmt='%2d', delimiter=' ')
 
 def calculate_total_vehicles(grid):
     """
     Calculates the total number of vehicles in the grid.
     """
-    total = sum(sum(row) for row in grid)
-    return total
+    return as_traffic_grid(grid).total()
 
 def find_max_traffic_intersections(grid):
     """
     Finds the intersections with the highest number of vehicles.
     """
-    max_vehicles = 0
-    max_positions = []
-    for i, row in enumerate(grid):
-        for j, value in enumerate(row):
-            if value > max_vehicles:
-                max_vehicles = value
-                max_positions = [(i, j)]
-            elif value == max_vehicles:
-                max_positions.append((i, j))
-    return max_vehicles, max_positions
+    return as_traffic_grid(grid).max_intersections()
 
 def transpose_grid(grid):
     """
     Transposes the given 2D grid.
     """
-    transposed = [list(row) for row in zip(*grid)]
-    return transposed
+    return as_traffic_grid(grid).transpose()
 
-def visualize_traffic_density(grid, title="Traffic Density"):
+def visualize_traffic_density(grid, title="Traffic Density", save_path=None):
     """
     Visualizes the traffic density using a heatmap.
+    With a save_path, the heatmap is written as a PNG image instead, without pyplot (see traffic_render).
     """
-    plt.imshow(grid, cmap='hot', interpolation='nearest')
+    if save_path is not None:
+        from traffic_render import save_heatmap
+
+        return save_heatmap(grid, save_path)
+    plt.imshow(as_traffic_grid(grid).counts, cmap='hot', interpolation='nearest')
     plt.colorbar(label='Number of Vehicles')
     plt.title(title)
     plt.xlabel('Columns')
@@ -80,16 +177,14 @@ def visualize_traffic_density(grid, title="Traffic Density"):
 
 def load_real_traffic_data(file_path):
     """
-    Loads real traffic data from a CSV file.
+    Loads real traffic data from a CSV, .npy or raw file as a memory-mapped grid.
+    A CSV file is converted once to a .npy file next to it (see traffic_loader).
     """
-    grid = []
-    with open(file_path, 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            grid.append([int(value) for value in row])
-    return grid
+    from traffic_loader import load_traffic_array
+
+    return TrafficGrid(load_traffic_array(file_path))
 
-def main():
+def run_interactive():
     # User input for grid size and vehicle count range
     rows = int(input("Enter the number of rows: "))
     cols = int(input("Enter the number of columns: "))
@@ -129,5 +224,32 @@ def main():
         print_grid(real_traffic_grid, title="Real Traffic Grid")
         visualize_traffic_density(real_traffic_grid, title="Real Traffic Density")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Analyze traffic grids. Without files, asks for a random grid to analyze interactively.'
+    )
+    parser.add_argument('files', nargs='*', help='CSV, .npy or stacked (time x rows x columns) .npy grid files')
+    parser.add_argument('--output-dir', default='output', help='directory of the images, text dumps and summary.csv')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all CPU cores)')
+    parser.add_argument('--no-images', action='store_true', help='skip the PNG heatmaps')
+    parser.add_argument('--text', choices=['txt', 'csv'], default=None, help='also dump every frame as text or CSV')
+    parser.add_argument('--cmap', default='hot')
+    parser.add_argument('--scale', type=int, default=1, help='pixels per intersection along each side')
+    parser.add_argument('--vmin', type=float, default=None, help='count of the first color (default: each frame\'s minimum)')
+    parser.add_argument('--vmax', type=float, default=None, help='count of the last color (default: each frame\'s maximum)')
+    args = parser.parse_args(argv)
+
+    if not args.files:
+        run_interactive()
+        return
+
+    from traffic_batch import run_batch
+
+    summaries, stats = run_batch(args.files, args.output_dir, args.workers, image=not args.no_images, text=args.text,
+                                 cmap=args.cmap, scale=args.scale, vmin=args.vmin, vmax=args.vmax)
+    print(f"Processed {stats['frames']} frame(s) of {stats['files']} file(s) in {stats['seconds']:.2f} s "
+          f"({stats['frames_per_minute']:,.0f} frames per minute)")
+    print(f"Summary saved to '{args.output_dir}/summary.csv'")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,328 @@
+# traffic_hotspots.py
+
+"""
+Traffic Hotspots
+
+This script finds the busiest parts of a traffic grid:
+- The top-k busiest intersections, by partial selection (no full sort)
+- Hotspot regions: connected groups of intersections above a vehicle level, labeled with a
+  union-find over runs of consecutive cells rather than over single cells
+- A sparse grid (coordinates and counts of the non-zero intersections, in COO form with a CSR
+  row index) that the analysis functions of traffic_grid_analysis accept
+
+Dense grids are scanned in bands of rows; for sparse grids, memory and time depend on the
+number of occupied intersections rather than on the grid area.
+"""
+
+import argparse
+import numpy as np
+
+from traffic_grid_analysis import BAND_CELLS, TrafficGrid, as_traffic_grid, vehicle_dtype
+
+class SparseTrafficGrid(TrafficGrid):
+    """
+    A traffic grid that only stores its non-zero intersections, sorted in row order.
+    Duplicate coordinates are summed. The dense counts are only built when requested.
+    """
+
+    def __init__(self, rows, cols, values, shape):
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values)
+        if values.dtype.kind not in 'iu':
+            values = values.astype(np.int64)
+        self.sparse_shape = tuple(shape)
+        keys = rows * self.sparse_shape[1] + cols
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+        # Sum duplicate coordinates, then drop explicit zeros
+        if len(keys):
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            keys = keys[starts]
+            values = np.add.reduceat(values.astype(np.int64), starts)
+        keep = values != 0
+        keys, values = keys[keep], values[keep]
+        self.rows, self.cols = np.divmod(keys, self.sparse_shape[1])
+        self.values = values.astype(vehicle_dtype(int(values.min(initial=0)), int(values.max(initial=0))))
+
+    @classmethod
+    def from_dense(cls, grid):
+        """
+        Builds a sparse grid from any dense grid, one band of rows at a time.
+        """
+        grid = as_traffic_grid(grid)
+        rows, cols, values = [], [], []
+        for start, band in grid.row_bands():
+            r, c = np.nonzero(band)
+            rows.append(r + start)
+            cols.append(c)
+            values.append(band[r, c])
+        return cls(np.concatenate(rows), np.concatenate(cols), np.concatenate(values), grid.shape)
+
+    @property
+    def shape(self):
+        return self.sparse_shape
+
+    @property
+    def counts(self):
+        """
+        The dense counts, built again on every access (e.g. for printing or plotting). Rows,
+        cells, iteration and the reductions read the sparse entries instead.
+        """
+        dense = np.zeros(self.sparse_shape, dtype=self.values.dtype)
+        dense[self.rows, self.cols] = self.values
+        return dense
+
+    def __len__(self):
+        return self.sparse_shape[0]
+
+    def row(self, index):
+        """
+        Returns one dense row, built from its entries only.
+        """
+        rows = self.sparse_shape[0]
+        if not -rows <= index < rows:
+            raise IndexError(f"row {index} is out of bounds for a grid of {rows} rows")
+        index %= rows
+        start, stop = np.searchsorted(self.rows, [index, index + 1])
+        row = np.zeros(self.sparse_shape[1], dtype=self.values.dtype)
+        row[self.cols[start:stop]] = self.values[start:stop]
+        return row
+
+    def __getitem__(self, index):
+        # A row (grid[i], so grid[i][j] too) or a cell (grid[i, j]) is read from the sparse
+        # entries; other indexes (slices, masks) go through the dense counts
+        if isinstance(index, (int, np.integer)):
+            return self.row(int(index))
+        if isinstance(index, tuple) and len(index) == 2 and all(isinstance(i, (int, np.integer)) for i in index):
+            return self.row(int(index[0]))[index[1]]
+        return self.counts[index]
+
+    def __iter__(self):
+        for _, band in self.row_bands():
+            yield from band
+
+    @property
+    def nnz(self):
+        return len(self.values)
+
+    def row_pointers(self):
+        """
+        Returns the CSR row index: the entries of row i are [pointers[i], pointers[i + 1]).
+        """
+        return np.searchsorted(self.rows, np.arange(self.sparse_shape[0] + 1))
+
+    def row_bands(self, band_cells=BAND_CELLS):
+        """
+        Yields (first_row, band) blocks of dense rows, built one band at a time from the row index.
+        """
+        rows, cols = self.sparse_shape
+        band_rows = max(1, band_cells // max(cols, 1))
+        pointers = self.row_pointers()
+        for start in range(0, rows, band_rows):
+            stop = min(start + band_rows, rows)
+            band = np.zeros((stop - start, cols), dtype=self.values.dtype)
+            entries = slice(pointers[start], pointers[stop])
+            band[self.rows[entries] - start, self.cols[entries]] = self.values[entries]
+            yield start, band
+
+    def total(self):
+        return int(self.values.sum(dtype=np.int64))
+
+    def max_intersections(self, as_array=False):
+        max_vehicles = int(self.values.max(initial=0))
+        if max_vehicles <= 0:
+            # The maximum is 0 and every empty intersection ties: fall back to the dense scan
+            return TrafficGrid(self.counts).max_intersections(as_array)
+        positions = np.column_stack([self.rows, self.cols])[self.values == max_vehicles]
+        if as_array:
+            return max_vehicles, positions
+        return max_vehicles, list(zip(positions[:, 0].tolist(), positions[:, 1].tolist()))
+
+    def transpose(self):
+        return SparseTrafficGrid(self.cols, self.rows, self.values, self.sparse_shape[::-1])
+
+    def tolist(self):
+        return self.counts.tolist()
+
+# Columns of the table returned by hotspot_regions
+REGION_COLUMNS = ('intersections', 'vehicles', 'peak', 'peak_row', 'peak_col', 'first_row', 'last_row', 'first_col', 'last_col')
+
+def occupied_cells(grid, level=0):
+    """
+    Returns the rows, columns and counts of the intersections with more than level vehicles, in row order.
+    """
+    grid = as_traffic_grid(grid)
+    if isinstance(grid, SparseTrafficGrid):
+        above = grid.values > level
+        return grid.rows[above], grid.cols[above], grid.values[above]
+    rows, cols, values = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=grid.counts.dtype)]
+    for start, band in grid.row_bands():
+        r, c = np.nonzero(band > level)
+        rows.append(r + start)
+        cols.append(c)
+        values.append(band[r, c])
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(values)
+
+def select_top(keys, values, k):
+    """
+    Partial selection of the k largest values (ties with the k-th largest in key order).
+    keys must be sorted; returns the selected keys and values, unordered.
+    """
+    if len(values) <= k:
+        return keys, values
+    kth = np.partition(values, len(values) - k)[len(values) - k]
+    above = np.flatnonzero(values > kth)
+    best = np.concatenate([above, np.flatnonzero(values == kth)[:k - len(above)]])
+    return keys[best], values[best]
+
+def top_k_intersections(grid, k):
+    """
+    Returns the k busiest intersections as ((row, column), vehicles) pairs, busiest first (ties in row order).
+    Dense grids are reduced band by band to k candidates each; sparse grids only select among
+    their occupied intersections, plus empty ones when fewer than k have vehicles.
+    """
+    grid = as_traffic_grid(grid)
+    if k <= 0:
+        return []
+    candidates = []
+    if isinstance(grid, SparseTrafficGrid):
+        keys, values = select_top(grid.rows * grid.shape[1] + grid.cols, grid.values.astype(np.int64), k)
+        candidates.append((keys, values))
+        if (values > 0).sum() < k:
+            # Empty intersections complete the ranking: the first k of them in row order are enough
+            stored = grid.rows * grid.shape[1] + grid.cols
+            first = np.arange(min(k + grid.nnz, grid.shape[0] * grid.shape[1]))
+            positions = np.minimum(np.searchsorted(stored, first), max(grid.nnz - 1, 0))
+            empty = first[stored[positions] != first] if grid.nnz else first
+            candidates.append((empty[:k], np.zeros(min(k, len(empty)), dtype=np.int64)))
+    else:
+        for start, band in grid.row_bands():
+            flat = band.ravel().astype(np.int64)
+            candidates.append(select_top(np.arange(flat.size) + start * grid.shape[1], flat, k))
+    if not candidates:
+        return []
+    keys = np.concatenate([keys for keys, _ in candidates])
+    values = np.concatenate([values for _, values in candidates])
+    order = np.lexsort((keys, -values))[:k]
+    rows, cols = np.divmod(keys[order], grid.shape[1])
+    return [((int(r), int(c)), int(v)) for r, c, v in zip(rows, cols, values[order])]
+
+def find_runs(rows, cols):
+    """
+    Groups cells given in row order into runs of consecutive columns of the same row.
+    Returns the run of every cell and the row, first and last column of every run.
+    """
+    new_run = np.ones(len(rows), dtype=bool)
+    new_run[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1)
+    run_of_cell = np.cumsum(new_run) - 1
+    starts = np.flatnonzero(new_run)
+    ends = np.r_[starts[1:], len(rows)] - 1
+    return run_of_cell, rows[starts], cols[starts], cols[ends]
+
+def connect_runs(run_rows, run_starts, run_ends, width, diagonal=False):
+    """
+    Returns the pairs of runs in consecutive rows that touch (share a column, or a corner with diagonal=True).
+    """
+    reach = 1 if diagonal else 0
+    # Keys that order runs by row, then by column; width + 2 leaves room for the reach
+    span = width + 2
+    start_keys = run_rows * span + run_starts + 1
+    end_keys = run_rows * span + run_ends + 1
+    # Runs of the previous row that end at or after this run's start and start at or before its end
+    first = np.searchsorted(end_keys, (run_rows - 1) * span + run_starts + 1 - reach, side='left')
+    last = np.searchsorted(start_keys, (run_rows - 1) * span + run_ends + 1 + reach, side='right')
+    counts = np.maximum(last - first, 0)
+    current = np.repeat(np.arange(len(run_rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return current, np.repeat(first, counts) + offsets
+
+def union_find(num_items, left, right):
+    """
+    Returns the component of every item given pairs of connected items: roots are hooked to the
+    smaller root and the parent pointers are compressed, all in vectorized rounds.
+    """
+    parent = np.arange(num_items)
+    while True:
+        # Full path compression: every item points to its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        root_left, root_right = parent[left], parent[right]
+        differ = root_left != root_right
+        if not differ.any():
+            return parent
+        low = np.minimum(root_left[differ], root_right[differ])
+        high = np.maximum(root_left[differ], root_right[differ])
+        np.minimum.at(parent, high, low)
+
+def hotspot_regions(grid, level, diagonal=False):
+    """
+    Finds the connected regions of intersections with more than level vehicles.
+    Returns a table (dict of arrays, one entry per region, busiest first) with the number of
+    intersections, the total and peak vehicles, the position of the peak (first in row order)
+    and the bounds (first and last row and column) of every region.
+    """
+    grid = as_traffic_grid(grid)
+    rows, cols, values = occupied_cells(grid, level)
+    if len(rows) == 0:
+        return {name: np.empty(0, dtype=np.int64) for name in REGION_COLUMNS}
+    run_of_cell, run_rows, run_starts, run_ends = find_runs(rows, cols)
+    left, right = connect_runs(run_rows, run_starts, run_ends, grid.shape[1], diagonal)
+    _, component_of_run = np.unique(union_find(len(run_rows), left, right), return_inverse=True)
+    component = component_of_run[run_of_cell]
+
+    num_regions = component.max() + 1
+    values = values.astype(np.int64)
+    # The peak of every region: sort its cells by decreasing count, ties in row order
+    order = np.lexsort((np.arange(len(values)), -values, component))
+    peak = order[np.r_[0, np.flatnonzero(np.diff(component[order])) + 1]]
+    table = {
+        'intersections': np.bincount(component, minlength=num_regions),
+        'vehicles': np.bincount(component, weights=values, minlength=num_regions).astype(np.int64),
+        'peak': values[peak],
+        'peak_row': rows[peak],
+        'peak_col': cols[peak],
+        'first_row': np.full(num_regions, grid.shape[0]),
+        'last_row': np.full(num_regions, -1),
+        'first_col': np.full(num_regions, grid.shape[1]),
+        'last_col': np.full(num_regions, -1)
+    }
+    np.minimum.at(table['first_row'], component, rows)
+    np.maximum.at(table['last_row'], component, rows)
+    np.minimum.at(table['first_col'], component, cols)
+    np.maximum.at(table['last_col'], component, cols)
+    busiest = np.lexsort((table['peak_col'], table['peak_row'], -table['vehicles']))
+    return {name: column[busiest] for name, column in table.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='Find the busiest intersections and hotspot regions of a traffic grid.')
+    parser.add_argument('file', nargs='?', help='CSV, .npy or raw grid (default: a random sparse grid)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--level', type=int, default=15, help='hotspots are regions of intersections above this count')
+    parser.add_argument('--diagonal', action='store_true', help='connect intersections that only share a corner')
+    args = parser.parse_args()
+
+    if args.file:
+        from traffic_grid_analysis import load_real_traffic_data
+        grid = load_real_traffic_data(args.file)
+    else:
+        rng = np.random.default_rng(42)
+        size, occupied = 10_000, 1_000_000
+        grid = SparseTrafficGrid(rng.integers(0, size, occupied), rng.integers(0, size, occupied),
+                                 rng.integers(1, 20, occupied, endpoint=True), (size, size))
+
+    print(f"Top {args.top} intersections:")
+    for (row, col), vehicles in top_k_intersections(grid, args.top):
+        print(f" - Row {row}, Column {col}: {vehicles} vehicles")
+    regions = hotspot_regions(grid, args.level, args.diagonal)
+    print(f"\n{len(regions['vehicles'])} hotspot region(s) above {args.level} vehicles; the largest:")
+    for i in range(min(args.top, len(regions['vehicles']))):
+        print(f" - {regions['intersections'][i]} intersections, {regions['vehicles'][i]} vehicles, "
+              f"peak {regions['peak'][i]} at row {regions['peak_row'][i]}, column {regions['peak_col'][i]}, "
+              f"rows {regions['first_row'][i]}-{regions['last_row'][i]}, columns {regions['first_col'][i]}-{regions['last_col'][i]}")
+
+if __name__ == "__main__":
+    main()
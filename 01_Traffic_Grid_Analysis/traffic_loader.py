@@ -0,0 +1,203 @@
+# traffic_loader.py
+
+"""
+Traffic Grid Loader
+
+This script loads traffic sensor grids that are too large to parse into memory:
+- A CSV grid is converted once, in chunks of rows, into a binary .npy file
+- .npy files and raw binary files are memory-mapped instead of read
+- Analyses then scan the memory-mapped grid in bands of rows (see TrafficGrid.row_bands),
+  so memory use stays flat no matter how large the grid is
+"""
+
+import argparse
+import itertools
+import os
+import numpy as np
+
+from traffic_grid_analysis import TrafficGrid, vehicle_dtype
+
+# Cells parsed at a time when converting a CSV grid
+CHUNK_CELLS = 1 << 22
+# Side of the square tiles copied at a time by transpose_to_file
+TILE_SIZE = 4_096
+
+def is_blank(line):
+    """
+    Returns whether a line of bytes is empty or only white space.
+    """
+    return not line or line.isspace()
+
+def first_csv_row(file):
+    """
+    Reads lines of bytes from an open file up to the first one that is not blank, and returns it
+    (empty bytes if there is none).
+    """
+    line = file.readline()
+    while line and is_blank(line):
+        line = file.readline()
+    return line
+
+def count_csv_columns(file_path):
+    """
+    Returns the number of columns of a CSV grid, from its first row only.
+    """
+    with open(file_path, 'rb') as file:
+        first_line = first_csv_row(file)
+    return first_line.count(b',') + 1 if first_line else 0
+
+def count_csv_shape(file_path, block_size=1 << 24):
+    """
+    Returns the number of rows and columns of a CSV grid without parsing its values.
+    Blank lines (such as extra newlines at the end of the file) are not rows.
+    """
+    with open(file_path, 'rb') as file:
+        first_line = first_csv_row(file)
+        if not first_line:
+            return 0, 0
+        cols = first_line.count(b',') + 1
+        rows = 1
+        # Whether the line being read has a character other than white space so far
+        has_content = False
+        while block := file.read(block_size):
+            newlines = block.count(b'\n')
+            if not any(character in block for character in (b'\n\n', b' ', b'\r', b'\t')):
+                # Without white space or empty lines, every line ended in the block is a row,
+                # except a first line that is only the end of an empty line
+                if newlines:
+                    rows += newlines - 1 + int(has_content or block[0:1] != b'\n')
+                    has_content = block[-1:] != b'\n'
+                else:
+                    has_content = True
+                continue
+            lines = block.split(b'\n')
+            if newlines:
+                rows += int(has_content or not is_blank(lines[0])) + sum(not is_blank(line) for line in lines[1:-1])
+                has_content = not is_blank(lines[-1])
+            else:
+                has_content = has_content or not is_blank(lines[-1])
+        # The last row may have no trailing newline
+        rows += int(has_content)
+    return rows, cols
+
+def write_npy_header(file, dtype, shape):
+    """
+    Writes the header of a C-ordered .npy file; the array data is then appended as raw bytes.
+    The header leaves room for the number of rows to grow, so it can be written again once the
+    rows are known without changing its length.
+    """
+    header = {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)}
+    np.lib.format.write_array_header_1_0(file, header)
+
+def rewrite_npy_rows(file, dtype, rows, cols, header_length):
+    """
+    Writes the header of a .npy file again with the number of rows actually written.
+    """
+    end = file.tell()
+    file.seek(0)
+    write_npy_header(file, dtype, (rows, cols))
+    if file.tell() != header_length:
+        raise ValueError(f"the .npy header of {rows} rows does not fit in {header_length} bytes")
+    file.seek(end)
+
+def convert_csv_to_npy(csv_path, npy_path=None, dtype=None, chunk_cells=CHUNK_CELLS):
+    """
+    Converts a CSV grid into a .npy file, parsing whole rows of about chunk_cells cells at a time.
+    Without a dtype, the values are first written to a temporary int64 file and then copied
+    into the smallest dtype of the vehicle range. Returns the path of the .npy file.
+    The file is written with plain writes rather than through a memory map, so that dirty
+    pages of the output do not accumulate in memory. It is written to a temporary file that
+    replaces npy_path once complete, so a failed conversion never leaves a file to reuse.
+    """
+    npy_path = npy_path or os.path.splitext(csv_path)[0] + '.npy'
+    cols = count_csv_columns(csv_path)
+    chunk_rows = max(1, chunk_cells // max(cols, 1))
+    temporary_path = npy_path + '.tmp'
+    wide_path = npy_path + '.int64'
+    min_vehicles, max_vehicles = 0, 0
+    rows = 0
+    try:
+        with open(csv_path, 'r') as file, open(temporary_path if dtype is not None else wide_path, 'wb') as output:
+            if dtype is not None:
+                write_npy_header(output, dtype, (0, cols))
+                header_length = output.tell()
+            # Blank lines are skipped, and the rows are counted as they are parsed
+            while lines := list(itertools.islice(file, chunk_rows)):
+                lines = [line for line in lines if not line.isspace()]
+                if not lines:
+                    continue
+                chunk = np.loadtxt(lines, delimiter=',', dtype=np.int64, ndmin=2)
+                if chunk.size:
+                    min_vehicles = min(min_vehicles, int(chunk.min()))
+                    max_vehicles = max(max_vehicles, int(chunk.max()))
+                    rows += len(chunk)
+                output.write(chunk.astype(dtype or np.int64, copy=False).tobytes())
+            if dtype is not None:
+                rewrite_npy_rows(output, dtype, rows, cols, header_length)
+
+        if dtype is None:
+            # Copy the int64 values into the compact dtype, one chunk of rows at a time
+            with open(wide_path, 'rb') as wide, open(temporary_path, 'wb') as output:
+                write_npy_header(output, vehicle_dtype(min_vehicles, max_vehicles), (rows, cols))
+                while (chunk := np.fromfile(wide, dtype=np.int64, count=chunk_rows * cols)).size:
+                    output.write(chunk.astype(vehicle_dtype(min_vehicles, max_vehicles)).tobytes())
+        os.replace(temporary_path, npy_path)
+    finally:
+        for path in (wide_path, temporary_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return npy_path
+
+def load_traffic_array(file_path, dtype=None, shape=None, npy_path=None):
+    """
+    Returns a read-only memory-mapped array of the grid stored in file_path:
+    - .npy files are memory-mapped directly
+    - CSV files are converted to a .npy file next to them (or at npy_path) on first use; the
+      conversion is reused as long as it is newer than the CSV file
+    - other files are raw binary grids and need their dtype and (rows, cols) shape
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.npy':
+        return np.load(file_path, mmap_mode='r')
+    if extension == '.csv':
+        npy_path = npy_path or os.path.splitext(file_path)[0] + '.npy'
+        if not os.path.exists(npy_path) or os.path.getmtime(npy_path) < os.path.getmtime(file_path):
+            convert_csv_to_npy(file_path, npy_path, dtype)
+        return np.load(npy_path, mmap_mode='r')
+    if dtype is None or shape is None:
+        raise ValueError(f"raw grid file {file_path!r} needs a dtype and a shape")
+    return np.memmap(file_path, dtype=dtype, mode='r', shape=tuple(shape))
+
+def transpose_to_file(counts, npy_path, tile_size=TILE_SIZE):
+    """
+    Writes the transpose of a (memory-mapped) grid to a .npy file, one square tile at a time.
+    Returns the transposed grid, memory-mapped.
+    """
+    rows, cols = counts.shape
+    output = np.lib.format.open_memmap(npy_path, mode='w+', dtype=counts.dtype, shape=(cols, rows))
+    for r in range(0, rows, tile_size):
+        for c in range(0, cols, tile_size):
+            output[c:c + tile_size, r:r + tile_size] = counts[r:r + tile_size, c:c + tile_size].T
+    output.flush()
+    del output
+    return np.load(npy_path, mmap_mode='r')
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert and analyze a large traffic grid file.')
+    parser.add_argument('file', help='CSV, .npy or raw binary grid')
+    parser.add_argument('--dtype', default=None, help='dtype of a raw grid, or of the converted CSV grid')
+    parser.add_argument('--shape', type=int, nargs=2, default=None, metavar=('ROWS', 'COLS'), help='shape of a raw grid')
+    parser.add_argument('--transpose', default=None, help='write the transposed grid to this .npy file')
+    args = parser.parse_args()
+
+    grid = TrafficGrid(load_traffic_array(args.file, args.dtype, args.shape))
+    print(f"Grid of {grid.shape[0]} x {grid.shape[1]} ({grid.counts.dtype})")
+    print(f"Total number of vehicles in the grid: {grid.total()}")
+    max_vehicles, positions = grid.max_intersections(as_array=True)
+    print(f"Highest number of vehicles at an intersection: {max_vehicles} ({len(positions)} intersection(s))")
+    if args.transpose:
+        transpose_to_file(grid.counts, args.transpose)
+        print(f"Transposed grid saved to '{args.transpose}'")
+
+if __name__ == "__main__":
+    main()
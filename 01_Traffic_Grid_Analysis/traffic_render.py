@@ -0,0 +1,152 @@
+# traffic_render.py
+
+"""
+Traffic Grid Rendering
+
+This script renders traffic grids without a display or any pyplot state, for batch jobs:
+- Heatmaps are written as indexed PNG images: every vehicle count is mapped to a color of a
+  256-entry colormap lookup table, and the image rows are compressed with zlib
+- Grids are dumped as text (aligned columns or CSV) by formatting every distinct count once
+  and assembling the rows with NumPy, one band of rows at a time
+"""
+
+import struct
+import sys
+import zlib
+import numpy as np
+from matplotlib import colormaps
+
+from traffic_grid_analysis import as_traffic_grid
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# zlib level of the PNG images: level 1 is several times faster than the default for a slightly larger file
+PNG_COMPRESSION = 1
+# Most distinct counts mapped through a lookup table (colors or text); wider ranges are converted cell by cell
+TABLE_VALUES = 1 << 16
+
+def colormap_lut(cmap='hot'):
+    """
+    Returns the (256, 3) uint8 RGB lookup table of a matplotlib colormap.
+    """
+    return colormaps[cmap](np.arange(256), bytes=True)[:, :3].copy()
+
+def color_indices(counts, vmin=None, vmax=None):
+    """
+    Maps the vehicle counts to uint8 colormap indices, scaled linearly from vmin to vmax
+    (the grid's minimum and maximum by default, like plt.imshow).
+    """
+    counts = np.asarray(counts)
+    low, high = (counts.min().item(), counts.max().item()) if counts.size else (0, 0)
+    vmin = low if vmin is None else vmin
+    vmax = high if vmax is None else vmax
+    if counts.dtype.kind in 'iu' and int(high) - int(low) <= TABLE_VALUES:
+        # Integer counts: scale every distinct count once, then index the table
+        values = np.arange(low, int(high) + 1)
+        table = np.clip((values - vmin) * 256 // max(vmax - vmin, 1), 0, 255).astype(np.uint8)
+        return table[counts] if low == 0 else table[counts.astype(np.int64) - low]
+    scaled = (np.asarray(counts, dtype=np.float64) - vmin) * (256 / max(vmax - vmin, np.finfo(float).tiny))
+    return np.clip(scaled, 0, 255).astype(np.uint8)
+
+def png_chunk(kind, data):
+    """
+    Returns a PNG chunk: length, type, data and CRC.
+    """
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def encode_png(indices, palette, compression=PNG_COMPRESSION):
+    """
+    Encodes a 2D array of palette indices as an 8-bit indexed PNG image.
+    """
+    height, width = indices.shape
+    # Every row starts with its filter type (0: none)
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = indices
+    return b''.join([
+        PNG_SIGNATURE,
+        png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 3, 0, 0, 0)),
+        png_chunk(b'PLTE', np.ascontiguousarray(palette, dtype=np.uint8).tobytes()),
+        png_chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)),
+        png_chunk(b'IEND', b'')
+    ])
+
+def render_heatmap(grid, scale=1, vmin=None, vmax=None):
+    """
+    Returns the colormap indices of a grid's heatmap, with every intersection drawn as a
+    scale x scale square of pixels.
+    """
+    indices = color_indices(as_traffic_grid(grid).counts, vmin, vmax)
+    if scale > 1:
+        indices = np.repeat(np.repeat(indices, scale, axis=0), scale, axis=1)
+    return indices
+
+def save_heatmap(grid, file_path, cmap='hot', scale=1, vmin=None, vmax=None, lut=None):
+    """
+    Saves the heatmap of a grid as a PNG image, without matplotlib figures.
+    Pass the lut of colormap_lut to reuse it across many frames.
+    """
+    image = encode_png(render_heatmap(grid, scale, vmin, vmax), colormap_lut(cmap) if lut is None else lut)
+    with open(file_path, 'wb') as file:
+        file.write(image)
+    return file_path
+
+def text_table(min_value, max_value, fmt, delimiter):
+    """
+    Returns the formatted text of every count in the range, as the rows of a uint8 array
+    right-aligned with NUL padding and followed by the delimiter.
+    """
+    tokens = [(fmt % value).encode() + delimiter for value in range(min_value, max_value + 1)]
+    width = max(len(token) for token in tokens)
+    table = np.zeros((len(tokens), width), dtype=np.uint8)
+    for i, token in enumerate(tokens):
+        table[i, width - len(token):] = np.frombuffer(token, dtype=np.uint8)
+    return table
+
+def grid_text_bands(grid, fmt='%2d', delimiter=' '):
+    """
+    Yields the text of the grid (one line per row, like np.savetxt) as bytes, one band of rows at a time.
+    """
+    if not delimiter:
+        raise ValueError("the delimiter must not be empty")
+    grid = as_traffic_grid(grid)
+    delimiter = delimiter.encode()
+    rows, cols = grid.shape
+    if rows == 0 or cols == 0:
+        yield b'\n' * rows
+        return
+    min_value, max_value = grid.counts.min().item(), grid.counts.max().item()
+    if grid.counts.dtype.kind not in 'iu' or max_value - min_value >= TABLE_VALUES:
+        for _, band in grid.row_bands():
+            yield ''.join(delimiter.decode().join(fmt % value for value in row) + '\n' for row in band.tolist()).encode()
+        return
+    table = text_table(min_value, max_value, fmt, delimiter)
+    # The delimiter after the last column becomes the end of the line
+    end_of_line = np.zeros(len(delimiter), dtype=np.uint8)
+    end_of_line[0] = ord('\n')
+    padded = bool((table[:, 0] == 0).any() or len(delimiter) > 1)
+    for _, band in grid.row_bands():
+        text = table[band] if min_value == 0 else table[band.astype(np.int64) - min_value]
+        text[:, -1, -len(delimiter):] = end_of_line
+        text = text.reshape(-1)
+        yield (text[text != 0] if padded else text).tobytes()
+
+def write_grid_text(grid, file=None, fmt='%2d', delimiter=' '):
+    """
+    Writes the grid as text to a file path or an open file (standard output by default).
+    fmt='%d', delimiter=',' writes a CSV grid.
+    """
+    if isinstance(file, str):
+        with open(file, 'wb') as output:
+            for text in grid_text_bands(grid, fmt, delimiter):
+                output.write(text)
+        return
+    file = sys.stdout if file is None else file
+    buffer = getattr(file, 'buffer', None)
+    if buffer is not None:
+        file.flush()
+    for text in grid_text_bands(grid, fmt, delimiter):
+        if buffer is not None:
+            buffer.write(text)
+        else:
+            file.write(text.decode())
+    if buffer is not None:
+        buffer.flush()
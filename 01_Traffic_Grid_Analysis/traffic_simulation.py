@@ -0,0 +1,259 @@
+# traffic_simulation.py
+
+"""
+Traffic Flow Simulation
+
+This script simulates how vehicles move between the intersections of a traffic grid over time:
+- Every time step, a share of the vehicles at each intersection moves to its four neighbors
+  according to turn probabilities (north, south, east, west)
+- Moves into an intersection are scaled down when they would exceed its capacity
+- The update is a vectorized stencil over shifted views of the grid
+- Boundaries are closed (vehicles stay in the grid), open (vehicles leave it) or periodic
+- Large grids are split into tiles that are updated in a process pool, exchanging halos
+  through shared memory
+"""
+
+import argparse
+import time
+from multiprocessing import Pool, shared_memory
+import numpy as np
+
+from traffic_grid_analysis import TrafficGrid, as_traffic_grid, vehicle_dtype, visualize_traffic_density
+
+# Width of the halo around the grid and around every tile: the acceptance of a neighbor's
+# intersection depends on the vehicles of its own neighbors, two cells away
+HALO = 2
+BOUNDARIES = ('closed', 'open', 'periodic')
+
+def flow_step(vehicles, capacity, turn_probabilities, move_rate):
+    """
+    Computes one time step of the traffic flow on a padded block and returns its interior.
+
+    vehicles and capacity include a halo of HALO cells on every side; turn_probabilities are
+    the shares of moving vehicles that go north, south, east and west.
+    """
+    north, south, east, west = (move_rate * p for p in turn_probabilities)
+
+    # Vehicles that want to enter every cell (all but the outer ring of the block): the
+    # southbound vehicles of the cell above, the northbound ones of the cell below, and so on
+    demand = south * vehicles[:-2, 1:-1]
+    demand += north * vehicles[2:, 1:-1]
+    demand += east * vehicles[1:-1, :-2]
+    demand += west * vehicles[1:-1, 2:]
+    free = capacity[1:-1, 1:-1] - vehicles[1:-1, 1:-1]
+    np.maximum(free, 0, out=free)
+    accepted = np.ones_like(demand)
+    np.divide(free, demand, out=accepted, where=demand > 0)
+    np.minimum(accepted, 1, out=accepted)
+
+    # Share of the vehicles of every interior cell that leaves it, given its neighbors' acceptance
+    leaving = north * accepted[:-2, 1:-1]
+    leaving += south * accepted[2:, 1:-1]
+    leaving += east * accepted[1:-1, 2:]
+    leaving += west * accepted[1:-1, :-2]
+
+    # New vehicles: those that stay plus the accepted inflow
+    result = np.subtract(1, leaving, out=leaving)
+    result *= vehicles[HALO:-HALO, HALO:-HALO]
+    inflow = demand[1:-1, 1:-1]
+    inflow *= accepted[1:-1, 1:-1]
+    result += inflow
+    return result
+
+def fill_halo(padded, boundary, value=0.0):
+    """
+    Fills the halo of a padded array: periodic copies of the opposite edges, or a constant.
+    """
+    if boundary == 'periodic':
+        padded[:HALO] = padded[-2 * HALO:-HALO]
+        padded[-HALO:] = padded[HALO:2 * HALO]
+        padded[:, :HALO] = padded[:, -2 * HALO:-HALO]
+        padded[:, -HALO:] = padded[:, HALO:2 * HALO]
+    else:
+        padded[:HALO] = value
+        padded[-HALO:] = value
+        padded[:, :HALO] = value
+        padded[:, -HALO:] = value
+
+def split_tiles(rows, cols, tile_size):
+    """
+    Splits the grid into tiles, returned as (row_start, row_stop, col_start, col_stop).
+    """
+    return [
+        (r, min(r + tile_size, rows), c, min(c + tile_size, cols))
+        for r in range(0, rows, tile_size)
+        for c in range(0, cols, tile_size)
+    ]
+
+# State of the worker processes: the shared buffers and the flow parameters
+_worker = {}
+
+def _init_worker(names, shape, turn_probabilities, move_rate):
+    """
+    Attaches a worker process to the shared buffers of the simulation.
+    """
+    _worker['memory'] = [shared_memory.SharedMemory(name=name) for name in names]
+    _worker['arrays'] = [np.ndarray(shape, dtype=np.float64, buffer=memory.buf) for memory in _worker['memory']]
+    _worker['parameters'] = (turn_probabilities, move_rate)
+
+def _step_tile(tile, source, target):
+    """
+    Updates one tile from the source buffer into the target buffer (run in a worker process).
+    """
+    r0, r1, c0, c1 = tile
+    capacity, buffers = _worker['arrays'][0], _worker['arrays'][1:]
+    block = (slice(r0, r1 + 2 * HALO), slice(c0, c1 + 2 * HALO))
+    buffers[target][r0 + HALO:r1 + HALO, c0 + HALO:c1 + HALO] = flow_step(
+        buffers[source][block], capacity[block], *_worker['parameters']
+    )
+
+class TrafficSimulation:
+    """
+    Time-stepped simulation of the vehicles moving between the intersections of a grid.
+    """
+
+    def __init__(self, grid, capacity=40, turn_probabilities=(0.25, 0.25, 0.25, 0.25), move_rate=0.5,
+                 boundary='closed', tile_size=None, workers=1):
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {BOUNDARIES}, got {boundary!r}")
+        if len(turn_probabilities) != 4 or min(turn_probabilities) < 0 or sum(turn_probabilities) > 1 + 1e-9:
+            raise ValueError("turn_probabilities must be four non-negative shares (north, south, east, west) summing to at most 1")
+        counts = as_traffic_grid(grid).counts
+        self.rows, self.cols = counts.shape
+        self.boundary = boundary
+        self.turn_probabilities = tuple(float(p) for p in turn_probabilities)
+        self.move_rate = float(move_rate)
+        self.steps = 0
+        self.workers = workers
+        self.tiles = split_tiles(self.rows, self.cols, tile_size or max(self.rows, self.cols))
+        self._pool = None
+        self._memory = []
+
+        # Two padded vehicle buffers (read one, write the other) and the padded capacity
+        shape = (self.rows + 2 * HALO, self.cols + 2 * HALO)
+        if workers > 1:
+            self._memory = [shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8) for _ in range(3)]
+            arrays = [np.ndarray(shape, dtype=np.float64, buffer=memory.buf) for memory in self._memory]
+        else:
+            arrays = [np.zeros(shape) for _ in range(3)]
+        self._capacity, self._buffers = arrays[0], arrays[1:]
+        self._current = 0
+
+        self._capacity[HALO:-HALO, HALO:-HALO] = capacity
+        # Closed boundaries accept no vehicles; open boundaries absorb all of them
+        fill_halo(self._capacity, boundary, 0.0 if boundary == 'closed' else np.inf)
+        for buffer in self._buffers:
+            buffer[HALO:-HALO, HALO:-HALO] = counts
+            fill_halo(buffer, boundary)
+
+        if workers > 1:
+            self._pool = Pool(workers, initializer=_init_worker,
+                              initargs=([memory.name for memory in self._memory], shape,
+                                        self.turn_probabilities, self.move_rate))
+
+    @property
+    def vehicles(self):
+        """
+        The current number of vehicles at every intersection (a float array view).
+        """
+        return self._buffers[self._current][HALO:-HALO, HALO:-HALO]
+
+    def step(self, steps=1):
+        """
+        Advances the simulation by the given number of time steps.
+        """
+        for _ in range(steps):
+            source, target = self._current, 1 - self._current
+            if self._pool is None:
+                for r0, r1, c0, c1 in self.tiles:
+                    block = (slice(r0, r1 + 2 * HALO), slice(c0, c1 + 2 * HALO))
+                    self._buffers[target][r0 + HALO:r1 + HALO, c0 + HALO:c1 + HALO] = flow_step(
+                        self._buffers[source][block], self._capacity[block], self.turn_probabilities, self.move_rate
+                    )
+            else:
+                self._pool.starmap(_step_tile, [(tile, source, target) for tile in self.tiles])
+            # Halo exchange for the next step
+            fill_halo(self._buffers[target], self.boundary)
+            self._current = target
+            self.steps += 1
+
+    def run(self, steps, record_every=None):
+        """
+        Runs the simulation and returns the recorded frames and the throughput.
+        """
+        frames = []
+        start = time.perf_counter()
+        for done in range(steps):
+            self.step()
+            if record_every and (done + 1) % record_every == 0:
+                frames.append(self.frame())
+        elapsed = time.perf_counter() - start
+        return frames, {
+            'steps': steps,
+            'seconds': elapsed,
+            'steps_per_second': steps / elapsed if elapsed else float('inf'),
+            'cell_updates_per_second': steps * self.rows * self.cols / elapsed if elapsed else float('inf')
+        }
+
+    def frame(self):
+        """
+        Returns the current state as a TrafficGrid of whole vehicles (usable by the analysis functions).
+        """
+        counts = np.rint(self.vehicles)
+        return TrafficGrid(counts.astype(vehicle_dtype(0, int(counts.max(initial=0)))))
+
+    def total(self):
+        """
+        Returns the current total number of vehicles (not rounded).
+        """
+        return float(self.vehicles.sum())
+
+    def close(self):
+        """
+        Stops the worker processes and releases the shared memory.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._capacity = self._buffers = None
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the traffic flow on a random grid.')
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--cols', type=int, default=100)
+    parser.add_argument('--steps', type=int, default=1000)
+    parser.add_argument('--capacity', type=float, default=40)
+    parser.add_argument('--move-rate', type=float, default=0.5)
+    parser.add_argument('--turn-probabilities', type=float, nargs=4, default=[0.25, 0.25, 0.25, 0.25],
+                        metavar=('NORTH', 'SOUTH', 'EAST', 'WEST'))
+    parser.add_argument('--boundary', choices=BOUNDARIES, default='closed')
+    parser.add_argument('--tile-size', type=int, default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--show', action='store_true', help='visualize the final frame')
+    args = parser.parse_args()
+
+    grid = TrafficGrid.random(args.rows, args.cols, 0, 20, seed=args.seed)
+    with TrafficSimulation(grid, args.capacity, args.turn_probabilities, args.move_rate,
+                           args.boundary, args.tile_size, args.workers) as simulation:
+        initial_total = simulation.total()
+        _, stats = simulation.run(args.steps)
+        print(f"Simulated {args.steps} steps of a {args.rows} x {args.cols} grid in {stats['seconds']:.2f} s "
+              f"({stats['steps_per_second']:.1f} steps/s, {stats['cell_updates_per_second']:,.0f} cell updates/s)")
+        print(f"Vehicles: {initial_total:.0f} at the start, {simulation.total():.0f} at the end")
+        if args.show:
+            visualize_traffic_density(simulation.frame(), title=f"Traffic Density after {args.steps} Steps")
+
+if __name__ == "__main__":
+    main()
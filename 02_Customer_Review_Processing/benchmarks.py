@@ -0,0 +1,275 @@
+# Benchmarks for the review processing, on a generated corpus (see generate_reviews.py).
+# Every measurement runs in a fresh process, so that its peak memory can be compared.
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from generate_reviews import generate_reviews, write_reviews
+from review_dedup import THRESHOLD, MinHasher, SignatureStore
+from review_index import ReviewIndex, parse_query
+from review_pipeline import clean_batch, process_file, review_batches, shard_offsets
+from review_sentiment import LABELS, score_file
+
+def timed(function, *args, **kwargs):
+    """
+    Runs a function and returns its result and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def ensure_corpus(file_path, reviews, file_format="jsonl"):
+    """
+    Generates the corpus file unless it already exists.
+    """
+    if not os.path.exists(file_path):
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        _, elapsed = timed(write_reviews, generate_reviews(reviews), file_path, file_format)
+        print(f"Generated {reviews:,} reviews in '{file_path}' in {elapsed:.1f} s")
+    return file_path
+
+def legacy_process(file_path, output_path):
+    """
+    The original processing, applied to a whole file: every review is loaded into a list,
+    cleaned with two replace calls, and joined into one string before being written.
+    """
+    with open(file_path) as file:
+        reviews = [json.loads(line)["review"] for line in file]
+    processed_reviews = []
+    for review in reviews:
+        escaped_review = review.replace('"', '').replace('\n', ' ')
+        processed_reviews.append(escaped_review)
+    all_reviews = ' '.join(processed_reviews)
+    with open(output_path, "w") as file:
+        file.write(all_reviews)
+    return len(reviews)
+
+def measure_pipeline(mode, file_path, output_path, workers=1):
+    """
+    Processes the corpus with the legacy or the streaming pipeline and returns the time and peak memory.
+    """
+    start = time.perf_counter()
+    if mode == "legacy":
+        reviews = legacy_process(file_path, output_path)
+    else:
+        reviews = process_file(file_path, output_path, separator=" ", workers=workers)["reviews"]
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "workers": workers,
+        "reviews": reviews,
+        "seconds": round(elapsed, 3),
+        # ru_maxrss is reported in kilobytes on Linux; worker processes are children
+        "peak_rss_mb": round(max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024, 1)
+    }
+
+def benchmark_pipeline(file_path, reviews=2_000_000, workers_list=(1, 2, 4)):
+    """
+    Compares the legacy processing with the streaming pipeline (one and several workers), each in
+    a fresh process, and checks that they write the same output.
+    """
+    ensure_corpus(file_path, reviews)
+    size_mb = os.path.getsize(file_path) / 2**20
+    runs = [("legacy", 1)] + [("streaming", workers) for workers in workers_list]
+    results = []
+    outputs = []
+    for mode, workers in runs:
+        output_path = os.path.splitext(file_path)[0] + f".{mode}-{workers}.out"
+        output = subprocess.run([sys.executable, __file__, "measure-pipeline", mode, file_path, output_path, str(workers)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        outputs.append(output_path)
+        print(f"{mode:>9} ({workers} worker(s)): {result['reviews']:,} reviews ({size_mb:.0f} MB) in {result['seconds']:.2f} s, "
+              f"{result['reviews'] / result['seconds']:,.0f} reviews/s, peak RSS {result['peak_rss_mb']:.0f} MB")
+    identical = all(open(path, "rb").read() == open(outputs[0], "rb").read() for path in outputs[1:])
+    print(f"Identical outputs: {identical}")
+    for path in outputs:
+        os.remove(path)
+    return results
+
+def directory_size_mb(directory):
+    """
+    Returns the total size of the files of a directory tree in MB.
+    """
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names) / 2**20
+
+def scan_search(file_path, query):
+    """
+    Counts the reviews that contain every term and phrase of a query by scanning the corpus.
+    These are substring matches on the lowercase cleaned text, so the count can differ slightly
+    from the token matches of the index.
+    """
+    needles = [" ".join(clause) for clause in parse_query(query)]
+    matches = 0
+    for reviews in review_batches(file_path):
+        for review in clean_batch(reviews).lower().split("\n"):
+            matches += all(needle in review for needle in needles)
+    return matches
+
+def benchmark_index(file_path, reviews=2_000_000, index_dir="data/review_index", queries=None, repeat=20):
+    """
+    Builds the index of the corpus, then times term and phrase queries against a scan of the corpus.
+    """
+    ensure_corpus(file_path, reviews)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    index = ReviewIndex(index_dir)
+    added, elapsed = timed(index.add, review_batches(file_path))
+    print(f"Indexed {added:,} reviews in {elapsed:.1f} s ({added / elapsed:,.0f} reviews/s): {len(index.segments)} segments, "
+          f"{directory_size_mb(index_dir):.0f} MB (corpus {os.path.getsize(file_path) / 2**20:.0f} MB, "
+          f"of which {sum(os.path.getsize(os.path.join(index_dir, entry['name'], 'texts.bin')) for entry in index.manifest['segments']) / 2**20:.0f} MB of review texts)")
+
+    index = ReviewIndex(index_dir)
+    queries = queries or ["wonderful", "headset broke", '"value for the money"', '"broke after two days" refund', '"not bad either"']
+    results = {}
+    for query in queries:
+        matches, elapsed = timed(lambda: [index.search(query) for _ in range(repeat)])
+        results[query] = elapsed / repeat
+        print(f" - {query}: {len(matches[0]):,} reviews in {elapsed / repeat * 1000:.1f} ms")
+    count, elapsed = timed(scan_search, file_path, queries[2])
+    print(f"Scanning the corpus for {queries[2]}: {count:,} reviews in {elapsed:.1f} s")
+    return results
+
+def sentiment_accuracy(file_path, scores_path):
+    """
+    Returns the share of the reviews whose label matches the sentiment the generator wrote them with.
+    """
+    with open(file_path) as reviews, open(scores_path) as scores:
+        next(scores)
+        matches = total = 0
+        for line, score in zip(reviews, scores):
+            matches += json.loads(line)["sentiment"] == score.rstrip("\n").split(",")[1]
+            total += 1
+    return matches / total if total else 0.0
+
+def benchmark_sentiment(file_path, reviews=2_000_000, workers_list=(1, 2), cache_size=100_000):
+    """
+    Scores the corpus with and without the score cache, with one and several workers, and checks
+    that every run writes the same scores.
+    """
+    ensure_corpus(file_path, reviews)
+    results = []
+    outputs = []
+    for size in (0, cache_size):
+        for workers in workers_list:
+            output_path = os.path.splitext(file_path)[0] + f".sentiment-{size}-{workers}.csv"
+            stats = score_file(file_path, output_path, workers=workers, cache_size=size)
+            results.append({"cache_size": size, "workers": workers, **stats})
+            outputs.append(output_path)
+            print(f"cache {size:>7,} ({workers} worker(s)): {stats['reviews']:,} reviews in {stats['seconds']:.2f} s, "
+                  f"{stats['reviews_per_second']:,.0f} reviews/s, cache hit rate {stats['cache_hit_rate']:.1%}")
+    identical = all(open(path, "rb").read() == open(outputs[0], "rb").read() for path in outputs[1:])
+    print(f"Identical scores: {identical}")
+    print("Labels: " + ", ".join(f"{label} {results[0][label]:,}" for label in LABELS))
+    print(f"Accuracy against the generated sentiments: {sentiment_accuracy(file_path, outputs[0]):.1%}")
+    for path in outputs:
+        os.remove(path)
+    return results
+
+def all_pairs_duplicates(reviews, threshold=THRESHOLD):
+    """
+    Finds the near-duplicates of a sample by comparing all pairs: returns, for every review,
+    whether an earlier review has an exact Jaccard similarity of shingles of at least threshold.
+    """
+    values, first_shingles, has_shingles = MinHasher().shingles(reviews)
+    shingles, columns = np.unique(values, return_inverse=True)
+    owners = np.flatnonzero(has_shingles)[np.searchsorted(first_shingles, np.arange(len(values)), "right") - 1]
+    matrix = np.zeros((len(reviews), len(shingles)), dtype=np.float32)
+    matrix[owners, columns] = 1
+    shared = matrix @ matrix.T
+    sizes = matrix.sum(axis=1)
+    with np.errstate(invalid="ignore"):
+        jaccard = np.tril(shared / (sizes[:, None] + sizes[None, :] - shared), -1)
+    return np.nan_to_num(jaccard).max(axis=1, initial=0) >= threshold
+
+def benchmark_dedup(file_path, reviews=2_000_000, store_dir="data/dedup_store", sample=5_000, shards=20):
+    """
+    Checks the corpus against an empty signature store, then checks its last shard again in a
+    new store that already holds the others, and compares a sample with an all-pairs comparison.
+    """
+    ensure_corpus(file_path, reviews)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    store = SignatureStore(store_dir)
+    found, elapsed = timed(lambda: sum(int((store.check(batch)[0] >= 0).sum()) for batch in review_batches(file_path)))
+    store.commit()
+    print(f"Checked {store.num_reviews:,} reviews in {elapsed:.1f} s ({store.num_reviews / elapsed:,.0f} reviews/s): "
+          f"{found:,} near-duplicates ({found / store.num_reviews:.1%}), store of {directory_size_mb(store_dir):.0f} MB "
+          f"in {len(store.segments)} segments")
+
+    # Incremental check: the last shard against a store of the rest of the corpus
+    offsets = shard_offsets(file_path, shards)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    store = SignatureStore(store_dir)
+    for batch in review_batches(file_path, start=offsets[0], end=offsets[-2]):
+        store.check(batch)
+    store.commit()
+    store = SignatureStore(store_dir)
+    history = store.num_reviews
+    found, elapsed = timed(lambda: sum(int((store.check(batch)[0] >= 0).sum()) for batch in review_batches(file_path, start=offsets[-2])))
+    print(f"Checked {store.num_reviews - history:,} new reviews against {history:,} in {elapsed:.1f} s "
+          f"({(store.num_reviews - history) / elapsed:,.0f} reviews/s): {found:,} near-duplicates")
+
+    # Detection on the first reviews of the corpus, against the exact similarities of all pairs
+    reviews = []
+    for batch in review_batches(file_path):
+        reviews += batch[:sample - len(reviews)]
+        if len(reviews) == sample:
+            break
+    shutil.rmtree(store_dir, ignore_errors=True)
+    detected = SignatureStore(store_dir).check(reviews)[0] >= 0
+    truth, elapsed = timed(all_pairs_duplicates, reviews)
+    print(f"All pairs of {sample:,} reviews compared in {elapsed:.1f} s: {truth.sum():,} near-duplicates, "
+          f"{(truth & detected).sum() / truth.sum():.1%} of them found, "
+          f"{(truth & detected).sum() / detected.sum():.1%} of the {detected.sum():,} found are near-duplicates")
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the review processing.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Legacy processing versus the streaming pipeline")
+    pipeline_parser.add_argument("--file", default="data/reviews.jsonl")
+    pipeline_parser.add_argument("--reviews", type=int, default=2_000_000)
+    pipeline_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+
+    index_parser = subparsers.add_parser("index", help="Index build and term/phrase queries versus a scan")
+    index_parser.add_argument("--file", default="data/reviews.jsonl")
+    index_parser.add_argument("--reviews", type=int, default=2_000_000)
+
+    sentiment_parser = subparsers.add_parser("sentiment", help="Sentiment scoring with and without the score cache")
+    sentiment_parser.add_argument("--file", default="data/reviews.jsonl")
+    sentiment_parser.add_argument("--reviews", type=int, default=2_000_000)
+    sentiment_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+
+    dedup_parser = subparsers.add_parser("dedup", help="Near-duplicate detection with MinHash and LSH")
+    dedup_parser.add_argument("--file", default="data/reviews.jsonl")
+    dedup_parser.add_argument("--reviews", type=int, default=2_000_000)
+
+    measure_parser = subparsers.add_parser("measure-pipeline", help=argparse.SUPPRESS)
+    measure_parser.add_argument("mode", choices=["legacy", "streaming"])
+    measure_parser.add_argument("file")
+    measure_parser.add_argument("output")
+    measure_parser.add_argument("workers", type=int)
+
+    args = parser.parse_args()
+    if args.command == "pipeline":
+        benchmark_pipeline(args.file, args.reviews, args.workers)
+    elif args.command == "index":
+        benchmark_index(args.file, args.reviews)
+    elif args.command == "sentiment":
+        benchmark_sentiment(args.file, args.reviews, args.workers)
+    elif args.command == "dedup":
+        benchmark_dedup(args.file, args.reviews)
+    elif args.command == "measure-pipeline":
+        print(json.dumps(measure_pipeline(args.mode, args.file, args.output, args.workers)))
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,33 @@
-# Let's create the list of reviews with specified escape sequences
-reviews = [
-    "I love this product!\nIt's absolutely wonderful.",
-    "Terrible experience.\nI wouldn't recommend it to anyone.",
-    "Average quality.\nNothing special, but not bad either."
-]
+# Translation table that removes quotation marks and replaces newline characters with spaces,
+# so that every review is cleaned in a single pass over its characters
+REVIEW_TRANSLATION = str.maketrans({'"': None, '\n': ' '})
 
-# Processing the reviews to escape quotation marks and replace newline characters with spaces
-processed_reviews  = []
-for review in reviews:
-    escaped_review = review.replace('"', '').replace('\n', ' ')
-    processed_reviews.append(escaped_review)
+def process_review(review):
+    """
+    Escapes quotation marks and replaces newline characters with spaces.
+    """
+    return review.translate(REVIEW_TRANSLATION)
 
-# Let's concatenate the processed reviews into a single string
-all_reviews = ' '.join(processed_reviews)
+def main():
+    # Let's create the list of reviews with specified escape sequences
+    reviews = [
+        "I love this product!\nIt's absolutely wonderful.",
+        "Terrible experience.\nI wouldn't recommend it to anyone.",
+        "Average quality.\nNothing special, but not bad either."
+    ]
 
-# Printing the processed reviews
-print(all_reviews)
+    # Processing the reviews to escape quotation marks and replace newline characters with spaces
+    processed_reviews = [process_review(review) for review in reviews]
 
-# Writing the processed reviews to a file
-with open("processed_reviews.txt", "w") as file:
-    file.write(all_reviews)
\ No newline at end of file
+    # Let's concatenate the processed reviews into a single string
+    all_reviews = ' '.join(processed_reviews)
+
+    # Printing the processed reviews
+    print(all_reviews)
+
+    # Writing the processed reviews to a file
+    with open("processed_reviews.txt", "w") as file:
+        file.write(all_reviews)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Generator of a synthetic review corpus, to test the review pipeline at scale. Reviews are
+# built from positive, negative and neutral phrases (with newlines and quotation marks, like the
+# sample reviews), and a share of them are exact or near copies of earlier reviews, like the
+# spam and copy-paste duplicates of a real feed.
+
+import argparse
+import csv
+import json
+import os
+import random
+
+PRODUCTS = ["product", "blender", "headset", "jacket", "phone case", "lamp", "backpack", "coffee maker",
+            "keyboard", "water bottle", "desk chair", "charger"]
+
+OPENERS = {
+    "positive": ["I love this {product}!", "Absolutely fantastic {product}.", "Great value for the money.",
+                 "Best {product} I have ever bought.", "Excellent quality.", "Really happy with this {product}."],
+    "negative": ["Terrible experience.", "Very disappointed with this {product}.", "Poor quality.",
+                 "Worst purchase ever.", "The {product} broke after two days.", "Awful customer service."],
+    "neutral": ["Average quality.", "It's an okay {product}.", "The {product} does the job.",
+                "Arrived on time.", "As described.", "Decent {product} for the price."]
+}
+
+DETAILS = {
+    "positive": ["It's absolutely wonderful.", "Works perfectly and looks great.", "I would recommend it to everyone.",
+                 "Fast shipping and a \"premium\" feel.", "My family loves it too.", "Five stars, will buy again."],
+    "negative": ["I wouldn't recommend it to anyone.", "It stopped working and the refund took weeks.",
+                 "Cheap materials and a \"premium\" price.", "Not worth the money at all.",
+                 "Very bad, I returned it.", "Completely useless and frustrating."],
+    "neutral": ["Nothing special, but not bad either.", "Some good points, some bad points.",
+                "It works, I guess.", "The color is a bit different than the photos.",
+                "I have used it for a week so far.", "Packaging was standard."]
+}
+
+RATINGS = {"positive": (4, 5), "negative": (1, 2), "neutral": (3, 3)}
+
+def generate_review(rng):
+    """
+    Returns a new (sentiment, rating, review) triple.
+    """
+    sentiment = rng.choice(("positive", "negative", "neutral"))
+    product = rng.choice(PRODUCTS)
+    sentences = [rng.choice(OPENERS[sentiment]).format(product=product)]
+    sentences += rng.sample(DETAILS[sentiment], rng.randint(1, 3))
+    # Sentences are separated by newlines or spaces, like the sample reviews
+    review = "".join(sentence + rng.choice(("\n", " ")) for sentence in sentences[:-1]) + sentences[-1]
+    return sentiment, rng.randint(*RATINGS[sentiment]), review
+
+def edit_review(review, rng):
+    """
+    Returns a near copy of a review: a word dropped or duplicated, or a change of punctuation or case.
+    """
+    words = review.split(" ")
+    position = rng.randrange(len(words))
+    edit = rng.randrange(3)
+    if edit == 0 and len(words) > 1:
+        del words[position]
+    elif edit == 1:
+        words.insert(position, words[position])
+    else:
+        words[position] = words[position].upper() if rng.random() < 0.5 else words[position] + "!"
+    return " ".join(words)
+
+def generate_reviews(count, duplicate_rate=0.1, near_duplicate_rate=0.05, seed=42, history=10_000):
+    """
+    Yields count review records (dicts with id, sentiment, rating and review). A share of the
+    reviews are exact or near copies of an earlier review, drawn from a sample of up to history reviews.
+    """
+    rng = random.Random(seed)
+    recent = []
+    for review_id in range(count):
+        draw = rng.random()
+        if recent and draw < duplicate_rate:
+            sentiment, rating, review = rng.choice(recent)
+        elif recent and draw < duplicate_rate + near_duplicate_rate:
+            sentiment, rating, review = rng.choice(recent)
+            review = edit_review(review, rng)
+        else:
+            sentiment, rating, review = generate_review(rng)
+            if len(recent) < history:
+                recent.append((sentiment, rating, review))
+            else:
+                recent[rng.randrange(history)] = (sentiment, rating, review)
+        yield {"id": review_id, "sentiment": sentiment, "rating": rating, "review": review}
+
+def write_reviews(records, file_path, file_format="jsonl"):
+    """
+    Writes review records as JSON lines, as CSV, or as plain text (one review per line, so newlines become spaces).
+    Returns the number of reviews written.
+    """
+    count = 0
+    with open(file_path, "w", newline="", buffering=1 << 20) as file:
+        if file_format == "csv":
+            writer = csv.DictWriter(file, fieldnames=["id", "sentiment", "rating", "review"])
+            writer.writeheader()
+        for record in records:
+            if file_format == "jsonl":
+                file.write(json.dumps(record) + "\n")
+            elif file_format == "csv":
+                writer.writerow(record)
+            else:
+                file.write(record["review"].replace("\n", " ") + "\n")
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic customer review corpus.")
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--output", default="data/reviews.jsonl")
+    parser.add_argument("--format", choices=["jsonl", "csv", "txt"], default=None,
+                        help="file format (default: from the output extension)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--near-duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    file_format = args.format or args.output.rsplit(".", 1)[-1]
+    if file_format not in ("jsonl", "csv", "txt"):
+        parser.error(f"cannot tell the format of {args.output!r}; use --format")
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    records = generate_reviews(args.reviews, args.duplicate_rate, args.near_duplicate_rate, args.seed)
+    count = write_reviews(records, args.output, file_format)
+    print(f"{count} reviews written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# Deduplication stage of the review processing: spam and copy-paste reviews are found with
+# MinHash and locality-sensitive hashing. Every review gets a signature of the minimum hashes of
+# its shingles (runs of consecutive words of its cleaned lowercase text) under many hash
+# functions, computed for a whole batch at once with NumPy; two signatures agree in about the
+# share of shingles the reviews have in common (their Jaccard similarity). Signatures are cut
+# into bands, and every band is hashed into a bucket key, so that a review is only compared with
+# the earlier reviews that share a bucket with it instead of with all of them. The bucket keys
+# and signatures are kept in a store on disk, so that new batches are checked against every
+# review seen before.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from review_index import TOKEN_PATTERN
+from review_pipeline import clean_batch, review_batches
+
+# Words per shingle, hash functions per signature, and bands of the signatures
+SHINGLE_SIZE = 2
+NUM_PERM = 64
+BANDS = 16
+SEED = 1
+# Share of equal signature values above which a review is a near-duplicate
+THRESHOLD = 0.8
+# Reviews kept in every bucket
+BUCKET_SIZE = 4
+# Reviews buffered before a segment of the store is written
+SEGMENT_REVIEWS = 1 << 18
+MANIFEST = "manifest.json"
+# Hash of the newline that ends a review, out of the range of the 32-bit token hashes
+BREAK = 1 << 32
+MIX = np.uint64(0x9E3779B97F4A7C15)
+SHIFT = np.uint64(32)
+
+class TokenHashes(dict):
+    """
+    Memoized CRC-32 hashes of tokens. The hash of a string built into Python changes from one
+    process to the next, so it cannot be used for signatures kept on disk.
+    """
+
+    def __missing__(self, token):
+        value = self[token] = BREAK if token == "\n" else zlib.crc32(token.encode("utf-8"))
+        return value
+
+class MinHasher:
+    """
+    Computes the MinHash signatures of batches of reviews, with num_perm hash functions of the
+    form (a * x + b) >> 32 on 64-bit shingle values.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE, seed=SEED):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.offsets = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64)
+        self.band_multipliers = rng.integers(0, 2**64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.token_hashes = TokenHashes()
+
+    def shingles(self, reviews):
+        """
+        Returns the shingle values of a batch of raw reviews in review order, the index of the
+        first shingle of every review that has any, and the mask of those reviews. A review
+        shorter than a shingle has one shingle of all its words; an empty review has none.
+        """
+        text = clean_batch(reviews, "\n").lower() + "\n"
+        tokens = TOKEN_PATTERN.findall(text)
+        hashes = np.fromiter(map(self.token_hashes.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+        is_break = hashes == BREAK
+        # Tokens of every review, and the position of its first token
+        breaks = np.flatnonzero(is_break)
+        lengths = np.diff(np.r_[-1, breaks]) - 1
+        firsts = breaks - lengths
+
+        # prefixes[t][j] mixes the hashes of the t + 1 tokens from j (past the end, the hashes are 0)
+        k = self.shingle_size
+        padded = np.r_[hashes, np.zeros(k, dtype=np.uint64)]
+        prefixes = [padded[:len(hashes)]]
+        for t in range(1, k):
+            prefixes.append(prefixes[-1] * MIX + padded[t:t + len(hashes)])
+        # A shingle starts at every token followed by k - 1 tokens of the same review
+        broken = np.cumsum(np.r_[0, is_break, np.zeros(k, dtype=bool)])
+        starts = (broken[k:k + len(hashes)] == broken[:len(hashes)])
+        values = prefixes[-1].copy()
+        # Reviews shorter than a shingle get one shingle of all their tokens
+        short = np.flatnonzero((lengths > 0) & (lengths < k))
+        for length in np.unique(lengths[short]):
+            positions = firsts[short[lengths[short] == length]]
+            starts[positions] = True
+            values[positions] = prefixes[length - 1][positions]
+
+        positions = np.flatnonzero(starts)
+        has_shingles = lengths > 0
+        # The first shingle of a review is the first one at or after its first token
+        first_shingles = np.searchsorted(positions, firsts[has_shingles])
+        return values[positions], first_shingles, has_shingles
+
+    def signatures(self, reviews):
+        """
+        Returns the signatures (uint32 array of one row per review) of a batch of raw reviews,
+        and the mask of the reviews that have shingles (the others have no signature).
+        """
+        values, first_shingles, has_shingles = self.shingles(reviews)
+        signatures = np.full((len(reviews), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        if len(values):
+            # Common shingles are hashed once per batch
+            unique, inverse = np.unique(values, return_inverse=True)
+            hashed = ((unique[:, None] * self.multipliers + self.offsets) >> SHIFT).astype(np.uint32)
+            signatures[has_shingles] = np.minimum.reduceat(hashed[inverse], first_shingles, axis=0)
+        return signatures, has_shingles
+
+    def band_keys(self, signatures):
+        """
+        Returns the bucket keys of signatures: one 64-bit hash of every band of rows.
+        """
+        products = signatures.astype(np.uint64) * self.band_multipliers
+        return products.reshape(len(signatures), self.bands, -1).sum(axis=2, dtype=np.uint64)
+
+def group_ranks(values):
+    """
+    Returns the stable order that sorts an array, and the rank of every element among the equal
+    elements before it.
+    """
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    index = np.arange(len(values))
+    group_starts = np.maximum.accumulate(np.where(np.r_[True, sorted_values[1:] != sorted_values[:-1]], index, 0)) if len(values) else index
+    ranks = np.empty(len(values), dtype=np.int64)
+    ranks[order] = index - group_starts
+    return order, ranks
+
+def merge_buckets(runs, bucket_size=BUCKET_SIZE):
+    """
+    Merges runs of (keys, reviews), oldest first, into one run sorted by key that keeps the
+    first bucket_size reviews of every key.
+    """
+    keys = np.concatenate([keys for keys, _ in runs])
+    reviews = np.concatenate([reviews for _, reviews in runs])
+    order, ranks = group_ranks(keys)
+    order = order[ranks[order] < bucket_size]
+    return keys[order], reviews[order]
+
+class SignatureStore:
+    """
+    An on-disk store of the signatures of reviews and of their buckets, made of append-only
+    segments. Reviews are numbered from 0 in the order they were checked. A bucket keeps the
+    first bucket_size reviews with its key that were not near-duplicates themselves, and later
+    reviews are compared with those.
+    """
+
+    def __init__(self, directory, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE, seed=SEED, bucket_size=BUCKET_SIZE):
+        self.directory = directory
+        manifest_path = os.path.join(directory, MANIFEST)
+        parameters = {"num_perm": num_perm, "bands": bands, "shingle_size": shingle_size, "seed": seed}
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                self.manifest = json.load(file)
+            # The signatures on disk fix the parameters of the store
+            parameters = {name: self.manifest[name] for name in parameters}
+            bucket_size = self.manifest["bucket_size"]
+        else:
+            self.manifest = {**parameters, "bucket_size": bucket_size, "num_reviews": 0, "segments": []}
+        self.hasher = MinHasher(**parameters)
+        self.bucket_size = bucket_size
+        self.segments = [self._load_segment(entry) for entry in self.manifest["segments"]]
+        # Reviews checked since the last segment: their signatures, and runs of buckets merged
+        # as they grow (each run is at least twice as large as the next one)
+        self.pending = np.empty((0, self.hasher.num_perm), dtype=np.uint16)
+        self.num_pending = 0
+        self.runs = []
+
+    @property
+    def num_reviews(self):
+        return self.manifest["num_reviews"] + self.num_pending
+
+    def _load_segment(self, entry):
+        path = os.path.join(self.directory, entry["name"])
+        return {**entry, **{name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+                            for name in ("keys", "reviews", "signatures")}}
+
+    def _buckets(self, keys):
+        """
+        Returns the reviews in the buckets of distinct keys (one row per key, padded with -1)
+        and the number of reviews of every bucket.
+        """
+        members = np.full((len(keys), self.bucket_size), -1, dtype=np.int64)
+        counts = np.zeros(len(keys), dtype=np.int64)
+        for bucket_keys, bucket_reviews in [(s["keys"], s["reviews"]) for s in self.segments] + self.runs:
+            lefts = np.searchsorted(bucket_keys, keys, "left")
+            rights = np.searchsorted(bucket_keys, keys, "right")
+            for offset in range(self.bucket_size):
+                rows = np.flatnonzero((lefts + offset < rights) & (counts < self.bucket_size))
+                if len(rows) == 0:
+                    break
+                members[rows, counts[rows]] = bucket_reviews[lefts[rows] + offset]
+                counts[rows] += 1
+        return members, counts
+
+    def _stored_signatures(self, reviews):
+        """
+        Returns the stored signatures of review numbers.
+        """
+        rows = np.empty((len(reviews), self.hasher.num_perm), dtype=np.uint16)
+        for segment in self.segments:
+            inside = np.flatnonzero((reviews >= segment["first_review"]) & (reviews < segment["first_review"] + segment["num_reviews"]))
+            if len(inside):
+                rows[inside] = segment["signatures"][reviews[inside] - segment["first_review"]]
+        inside = np.flatnonzero(reviews >= self.manifest["num_reviews"])
+        rows[inside] = self.pending[reviews[inside] - self.manifest["num_reviews"]]
+        return rows
+
+    def _batch_members(self, inverse, owners, counts, is_original):
+        """
+        Returns the bucket keys of a batch that get a place in their bucket (the first originals
+        with every key, while the bucket has free places), and the reviews of the batch in the
+        bucket of every distinct key (one row per key, padded with -1).
+        """
+        rows = np.flatnonzero(is_original)
+        _, ranks = group_ranks(inverse[rows])
+        places = counts[inverse[rows]] + ranks
+        inside = places < self.bucket_size
+        rows, places = rows[inside], places[inside]
+        batch_members = np.full((len(counts), self.bucket_size), -1, dtype=np.int64)
+        batch_members[inverse[rows], places] = owners[rows]
+        return rows, batch_members
+
+    def _match(self, reviews, candidates, threshold):
+        """
+        Returns, for review numbers and their candidates (an array of one row of candidates per
+        bucket key of every review, the key of the whole signature last), the candidate every
+        review is a near-duplicate of (-1 if none) and the estimated similarity.
+        """
+        duplicate_of = np.full(len(reviews), -1, dtype=np.int64)
+        similarity = np.zeros(len(reviews))
+        # A review with the signature of an earlier one (the first review in the bucket of its
+        # whole signature) is a duplicate of it, without comparing it with the other candidates
+        exact = candidates[:, -1]
+        exact = exact[np.arange(len(reviews)), np.argmax(exact >= 0, axis=1)]
+        rows = np.flatnonzero(exact >= 0)
+        rows = rows[(self._stored_signatures(reviews[rows]) == self._stored_signatures(exact[rows])).all(axis=1)]
+        duplicate_of[rows] = exact[rows]
+        similarity[rows] = 1.0
+
+        # Every other review is compared once with each distinct earlier review it shares a bucket with
+        rows = np.flatnonzero(duplicate_of < 0)
+        row_candidates = candidates[rows].reshape(len(rows), candidates.shape[1] * candidates.shape[2])
+        pair_owners = np.repeat(reviews[rows], row_candidates.shape[1])
+        row_candidates = row_candidates.ravel()
+        valid = (row_candidates >= 0) & (row_candidates < pair_owners)
+        # Pairs are coded as one integer, so that duplicates are removed by a plain sort
+        first, scale = reviews[0], self.num_reviews
+        codes = np.sort((pair_owners[valid] - first) * scale + row_candidates[valid])
+        codes = codes[np.r_[True, codes[1:] != codes[:-1]]] if len(codes) else codes
+        pairs = np.stack([codes // scale + first, codes % scale], axis=1)
+        if len(pairs):
+            pair_similarity = (self._stored_signatures(pairs[:, 0]) == self._stored_signatures(pairs[:, 1])).mean(axis=1)
+            keep = pair_similarity >= threshold
+            pairs, pair_similarity = pairs[keep], pair_similarity[keep]
+            # The most similar earlier review (the first one on ties) wins
+            order = np.lexsort((pairs[:, 1], -pair_similarity, pairs[:, 0]))
+            best = order[np.r_[True, pairs[order[1:], 0] != pairs[order[:-1], 0]]] if len(order) else order
+            positions = np.searchsorted(reviews, pairs[best, 0])
+            duplicate_of[positions] = pairs[best, 1]
+            similarity[positions] = pair_similarity[best]
+        return duplicate_of, similarity
+
+    def check(self, reviews, threshold=THRESHOLD, segment_reviews=SEGMENT_REVIEWS):
+        """
+        Checks a batch of raw reviews against the store and the earlier reviews of the batch,
+        then adds them to the store. Returns, for every review, the number of the review it is a
+        near-duplicate of (-1 if none) and the estimated similarity.
+        """
+        first = self.num_reviews
+        signatures, has_shingles = self.hasher.signatures(reviews)
+        # Only the low 16 bits of every value are stored: two different minimum hashes still
+        # differ there 65,535 times out of 65,536 (b-bit minwise hashing)
+        if self.num_pending + len(reviews) > len(self.pending):
+            grown = np.empty((max(2 * len(self.pending), self.num_pending + len(reviews)), self.hasher.num_perm), dtype=np.uint16)
+            grown[:self.num_pending] = self.pending[:self.num_pending]
+            self.pending = grown
+        self.pending[self.num_pending:self.num_pending + len(reviews)] = signatures.astype(np.uint16)
+        self.num_pending += len(reviews)
+
+        duplicate_of = np.full(len(reviews), -1, dtype=np.int64)
+        similarity = np.zeros(len(reviews))
+        checked = np.flatnonzero(has_shingles)
+        if len(checked):
+            band_keys = self.hasher.band_keys(signatures[checked])
+            # One more key of the whole signature, so that exact copies always share a bucket
+            keys = np.c_[band_keys, band_keys.sum(axis=1, dtype=np.uint64)].ravel()
+            owners = np.repeat(first + checked, self.hasher.bands + 1)
+            unique_keys, inverse = np.unique(keys, return_inverse=True)
+            members, counts = self._buckets(unique_keys)
+
+            # The earlier reviews of the batch are candidates when they entered the bucket, as
+            # they would have if they had been checked one batch earlier: only originals enter,
+            # while the bucket has free places. Which reviews are originals depends on the
+            # earlier ones, so the decisions are repeated until they do not change; a review
+            # only depends on earlier reviews, so this ends with the decisions of checking the
+            # reviews one by one, whatever the size of the batches.
+            # Only the reviews whose candidates changed are compared again.
+            is_original = np.ones(len(checked), dtype=bool)
+            matches = np.full(len(checked), -1, dtype=np.int64)
+            match_similarity = np.zeros(len(checked))
+            previous = None
+            while True:
+                added, batch_members = self._batch_members(inverse, owners, counts, np.repeat(is_original, self.hasher.bands + 1))
+                batch_candidates = batch_members[inverse]
+                batch_candidates[batch_candidates >= owners[:, None]] = -1
+                candidates = np.concatenate([members[inverse], batch_candidates], axis=1).reshape(len(checked), self.hasher.bands + 1, -1)
+                changed = np.arange(len(checked)) if previous is None else np.flatnonzero((candidates != previous).any(axis=(1, 2)))
+                if len(changed):
+                    matches[changed], match_similarity[changed] = self._match(first + checked[changed], candidates[changed], threshold)
+                previous = candidates
+                if np.array_equal(matches < 0, is_original):
+                    break
+                is_original = matches < 0
+            duplicate_of[checked] = matches
+            similarity[checked] = match_similarity
+
+            # The reviews that are not near-duplicates fill the free places of their buckets, in order
+            self.runs.append(merge_buckets([(keys[added], owners[added])], self.bucket_size))
+            while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+                self.runs[-2:] = [merge_buckets(self.runs[-2:], self.bucket_size)]
+        if self.num_pending >= segment_reviews:
+            self.commit()
+        return duplicate_of, similarity
+
+    def commit(self):
+        """
+        Writes the reviews checked since the last segment as a new segment, then replaces the
+        manifest atomically. The segment is written to a temporary directory that is renamed
+        when complete; a segment left by a commit that stopped before the manifest was replaced
+        is not in the manifest, and is replaced.
+        """
+        if not self.num_pending:
+            return
+        name = f"segment_{len(self.manifest['segments']):05d}"
+        path = os.path.join(self.directory, name)
+        temporary_dir = path + ".tmp"
+        for leftover in (path, temporary_dir):
+            if os.path.exists(leftover):
+                shutil.rmtree(leftover)
+        os.makedirs(temporary_dir)
+        keys, reviews = merge_buckets(self.runs, self.bucket_size) if self.runs else (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64))
+        np.save(os.path.join(temporary_dir, "keys.npy"), keys)
+        np.save(os.path.join(temporary_dir, "reviews.npy"), reviews)
+        np.save(os.path.join(temporary_dir, "signatures.npy"), self.pending[:self.num_pending])
+        os.rename(temporary_dir, path)
+        entry = {"name": name, "first_review": self.manifest["num_reviews"], "num_reviews": self.num_pending, "num_keys": len(keys)}
+        self.manifest["segments"].append(entry)
+        self.manifest["num_reviews"] += self.num_pending
+        temporary_path = os.path.join(self.directory, MANIFEST + ".tmp")
+        with open(temporary_path, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(temporary_path, os.path.join(self.directory, MANIFEST))
+        self.segments.append(self._load_segment(entry))
+        self.pending = np.empty((0, self.hasher.num_perm), dtype=np.uint16)
+        self.num_pending = 0
+        self.runs = []
+
+def dedup_file(file_path, store_dir, output=None, duplicates=None, input_format=None, field="review", threshold=THRESHOLD):
+    """
+    Checks the reviews of a file (or "-" for standard input) against a signature store and adds
+    them to it. The cleaned reviews that are not near-duplicates are written to the output file,
+    one per line, and the near-duplicates to a CSV file of (review, duplicate_of, similarity)
+    review numbers of the store, if given. Returns the counts and the throughput.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(store_dir, exist_ok=True)
+    store = SignatureStore(store_dir)
+    first = store.num_reviews
+    found = 0
+    for path in (output, duplicates):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    unique_file = open(output, "w", encoding="utf-8", buffering=1 << 20) if output else None
+    duplicates_file = open(duplicates, "w", buffering=1 << 20) if duplicates else None
+    try:
+        if duplicates_file:
+            duplicates_file.write("review,duplicate_of,similarity\n")
+        for reviews in review_batches(file_path, input_format, field):
+            batch_first = store.num_reviews
+            duplicate_of, similarity = store.check(reviews, threshold)
+            is_duplicate = duplicate_of >= 0
+            found += int(is_duplicate.sum())
+            if unique_file:
+                kept = [review for review, duplicate in zip(reviews, is_duplicate) if not duplicate]
+                if kept:
+                    unique_file.write(clean_batch(kept) + "\n")
+            if duplicates_file:
+                rows = np.flatnonzero(is_duplicate)
+                duplicates_file.writelines(f"{batch_first + row},{duplicate_of[row]},{similarity[row]:.3f}\n" for row in rows)
+        store.commit()
+    finally:
+        for file in (unique_file, duplicates_file):
+            if file:
+                file.close()
+    reviews = store.num_reviews - first
+    elapsed = time.perf_counter() - start_time
+    return {
+        "reviews": reviews,
+        "duplicates": found,
+        "store_reviews": store.num_reviews,
+        "seconds": elapsed,
+        "reviews_per_second": reviews / elapsed if elapsed else float("inf")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate customer reviews with MinHash and LSH.")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="input files ('-' or nothing for standard input)")
+    parser.add_argument("--store", default="data/dedup_store", help="signature store directory (checked and updated)")
+    parser.add_argument("-o", "--output", default=None, help="file of the cleaned reviews that are not near-duplicates (one input only)")
+    parser.add_argument("--duplicates", default=None, help="CSV file of the near-duplicates found (one input only)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "txt"], default=None)
+    parser.add_argument("--field", default="review")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="estimated similarity of near-duplicates")
+    args = parser.parse_args()
+    if (args.output or args.duplicates) and len(args.inputs) > 1:
+        parser.error("--output and --duplicates need a single input")
+
+    for file_path in args.inputs:
+        stats = dedup_file(file_path, args.store, args.output, args.duplicates, args.format, args.field, args.threshold)
+        print(f"{file_path}: {stats['duplicates']} near-duplicates in {stats['reviews']} reviews, in {stats['seconds']:.2f} s "
+              f"({stats['reviews_per_second']:,.0f} reviews/s), {stats['store_reviews']} reviews in the store", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
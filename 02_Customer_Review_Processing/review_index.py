@@ -0,0 +1,384 @@
+# Indexing stage of the review processing: cleaned reviews are tokenized with a precompiled
+# regular expression and added to an on-disk inverted index that answers term and phrase
+# queries. The index is a directory of segments; every segment stores, for each term of its
+# sorted vocabulary, the reviews that contain it, the number of occurrences in each review and
+# their positions, as delta-encoded varints (7 bits per byte). Posting lists are memory-mapped
+# and decoded with NumPy at query time. Appending reviews writes new segments; existing
+# segments are never rewritten.
+
+import argparse
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+from review_pipeline import clean_batch, review_batches
+
+# Words (letters and digits, with inner apostrophes as in "wouldn't"), or the newline that ends a review
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*|\n")
+# Phrases are written between double quotation marks in queries
+PHRASE_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+# Tokens buffered before a segment is written
+SEGMENT_TOKENS = 1 << 22
+STREAMS = ("docs", "freqs", "positions")
+MANIFEST = "manifest.json"
+
+def tokenize(text):
+    """
+    Returns the lowercase word tokens of a text.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token != "\n"]
+
+def encode_varints(values):
+    """
+    Encodes non-negative integers as varints: 7 bits per byte, low bits first, the high bit of
+    every byte but the last one set. Returns the bytes (uint8 array) and the length of every varint.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    max_value = int(values.max(initial=0))
+    if max_value < 0x80:
+        # Every value fits in one byte (the common case for deltas)
+        return values.astype(np.uint8), lengths
+    for shift in range(7, max_value.bit_length(), 7):
+        lengths += values >= (1 << shift)
+    starts = np.cumsum(lengths) - lengths
+    encoded = np.empty(int(lengths[-1] + starts[-1]), dtype=np.uint8)
+    encoded[starts] = (values & 0x7F) | ((lengths > 1).astype(np.uint64) << np.uint64(7))
+    for k in range(1, int(lengths.max())):
+        has_byte = np.flatnonzero(lengths > k)
+        byte = (values[has_byte] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (lengths[has_byte] > k + 1).astype(np.uint64) << np.uint64(7)
+        encoded[starts[has_byte] + k] = byte | more
+    return encoded, lengths
+
+def decode_varints(encoded):
+    """
+    Decodes a uint8 array of varints into an int64 array.
+    """
+    encoded = np.asarray(encoded, dtype=np.uint8)
+    ends = np.flatnonzero(encoded < 0x80)
+    if len(ends) == len(encoded):
+        # Every value fits in one byte (the common case for deltas)
+        return encoded.astype(np.int64)
+    starts = np.r_[0, ends[:-1] + 1]
+    shifts = (np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1)) * 7
+    parts = (encoded & 0x7F).astype(np.int64) << shifts
+    return np.add.reduceat(parts, starts)
+
+class SegmentWriter:
+    """
+    Buffers the tokens of consecutive reviews and writes them as one index segment.
+    """
+
+    def __init__(self, first_doc):
+        self.first_doc = first_doc
+        self.num_docs = 0
+        self.num_tokens = 0
+        # The newline token ends a review; real terms get ids from 0
+        self.vocabulary = {"\n": -1}
+        self.term_ids = []
+        self.texts = []
+
+    def add_block(self, reviews):
+        """
+        Cleans and tokenizes a batch of raw reviews (one regular expression pass over the whole batch).
+        """
+        text = clean_batch(reviews, "\n")
+        tokens = TOKEN_PATTERN.findall(text.lower() + "\n")
+        new_terms = set(tokens).difference(self.vocabulary)
+        for term in new_terms:
+            self.vocabulary[term] = len(self.vocabulary) - 1
+        self.term_ids.append(np.fromiter(map(self.vocabulary.__getitem__, tokens), dtype=np.int32, count=len(tokens)))
+        self.texts.append(text)
+        self.num_docs += len(reviews)
+        self.num_tokens += len(tokens)
+
+    def write(self, directory):
+        """
+        Writes the segment into a new directory and returns its manifest entry. The files are
+        written to a temporary directory that is renamed when complete.
+        """
+        temporary_dir = directory + ".tmp"
+        os.makedirs(temporary_dir)
+        ids = np.concatenate(self.term_ids) if self.term_ids else np.empty(0, dtype=np.int32)
+        # Every newline token ends a review: a token belongs to the review of the newlines before
+        # it, and its position counts the tokens since the last newline
+        is_break = ids < 0
+        index = np.arange(len(ids))
+        last_break = np.maximum.accumulate(np.where(is_break, index, -1))
+        docs = np.cumsum(is_break)[~is_break]
+        positions = (index - last_break - 1)[~is_break]
+        ids = ids[~is_break]
+
+        # Sort the terms alphabetically and the postings by (term, review, position); the tokens
+        # are already in (review, position) order, so a stable sort by term is enough
+        terms = sorted(term for term in self.vocabulary if term != "\n")
+        rank = np.empty(len(terms), dtype=np.int64)
+        rank[[self.vocabulary[term] for term in terms]] = np.arange(len(terms))
+        ids = rank[ids]
+        # Small vocabularies sort as 16-bit keys, which NumPy radix-sorts
+        order = np.argsort(ids.astype(np.uint16) if len(terms) <= 1 << 16 else ids, kind="stable")
+        ids, docs, positions = ids[order], docs[order], positions[order]
+
+        # One posting per (term, review): the review, and the positions of its occurrences
+        new_posting = np.r_[True, (ids[1:] != ids[:-1]) | (docs[1:] != docs[:-1])] if len(ids) else np.empty(0, dtype=bool)
+        posting_starts = np.flatnonzero(new_posting)
+        posting_terms = ids[posting_starts]
+        posting_docs = docs[posting_starts]
+        freqs = np.diff(np.r_[posting_starts, len(ids)])
+        new_term = np.r_[True, posting_terms[1:] != posting_terms[:-1]] if len(posting_terms) else np.empty(0, dtype=bool)
+        doc_deltas = np.where(new_term, posting_docs, posting_docs - np.r_[0, posting_docs[:-1]])
+        position_deltas = np.where(new_posting, positions, positions - np.r_[0, positions[:-1]])
+
+        # Byte offsets of every term in the three streams
+        offsets = np.zeros((len(terms) + 1, len(STREAMS)), dtype=np.int64)
+        counts = np.zeros((len(terms), 2), dtype=np.int64)
+        counts[:, 0] = np.bincount(posting_terms, minlength=len(terms))
+        counts[:, 1] = np.bincount(ids, minlength=len(terms))
+        for column, (name, values, term_of_value) in enumerate(zip(
+                STREAMS, (doc_deltas, freqs, position_deltas), (posting_terms, posting_terms, ids))):
+            encoded, lengths = encode_varints(values)
+            encoded.tofile(os.path.join(temporary_dir, name + ".bin"))
+            offsets[1:, column] = np.cumsum(np.bincount(term_of_value, weights=lengths, minlength=len(terms))).astype(np.int64)
+        np.save(os.path.join(temporary_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(temporary_dir, "counts.npy"), counts)
+        with open(os.path.join(temporary_dir, "terms.json"), "w") as file:
+            json.dump(terms, file)
+
+        # The cleaned reviews, one per line, with the byte offset of every line
+        with open(os.path.join(temporary_dir, "texts.bin"), "wb") as file:
+            line_ends = []
+            written = 0
+            for text in self.texts:
+                data = (text + "\n").encode("utf-8")
+                file.write(data)
+                line_ends.append(np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10) + written + 1)
+                written += len(data)
+        np.save(os.path.join(temporary_dir, "text_offsets.npy"), np.r_[0, np.concatenate(line_ends) if line_ends else []].astype(np.int64))
+        os.rename(temporary_dir, directory)
+        return {"name": os.path.basename(directory), "first_doc": self.first_doc, "num_docs": self.num_docs,
+                "num_tokens": int(len(ids)), "num_terms": len(terms)}
+
+class Segment:
+    """
+    A read-only index segment, memory-mapped.
+    """
+
+    def __init__(self, directory, first_doc, num_docs):
+        self.first_doc = first_doc
+        self.num_docs = num_docs
+        with open(os.path.join(directory, "terms.json")) as file:
+            self.terms = {term: i for i, term in enumerate(json.load(file))}
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.counts = np.load(os.path.join(directory, "counts.npy"), mmap_mode="r")
+        self.streams = {}
+        for name in STREAMS:
+            path = os.path.join(directory, name + ".bin")
+            self.streams[name] = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else np.empty(0, dtype=np.uint8)
+        self.text_offsets = np.load(os.path.join(directory, "text_offsets.npy"), mmap_mode="r")
+        self.text_path = os.path.join(directory, "texts.bin")
+
+    def _stream(self, name, term):
+        column = STREAMS.index(name)
+        return decode_varints(self.streams[name][self.offsets[term, column]:self.offsets[term + 1, column]])
+
+    def docs(self, term):
+        """
+        Returns the sorted local review numbers that contain a term.
+        """
+        term = self.terms.get(term)
+        if term is None:
+            return np.empty(0, dtype=np.int64)
+        return np.cumsum(self._stream("docs", term))
+
+    def positions(self, term):
+        """
+        Returns the (review, position) pairs of every occurrence of a term, as two arrays.
+        """
+        term = self.terms.get(term)
+        if term is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        docs = np.cumsum(self._stream("docs", term))
+        freqs = self._stream("freqs", term)
+        deltas = self._stream("positions", term)
+        # Positions restart at every review: undo the delta encoding within each posting
+        totals = np.cumsum(deltas)
+        starts = np.cumsum(freqs) - freqs
+        positions = totals - np.repeat(totals[starts] - deltas[starts], freqs)
+        return np.repeat(docs, freqs), positions
+
+    def phrase_docs(self, terms):
+        """
+        Returns the sorted local review numbers that contain the terms next to each other, in order.
+        """
+        # A phrase occurrence is a (review, start position) key shared by all of its terms; the
+        # keys of a term are sorted, since postings are in (review, position) order. Start from
+        # the rarest term and keep the keys that every other term also has.
+        if any(term not in self.terms for term in terms):
+            return np.empty(0, dtype=np.int64)
+        order = sorted(range(len(terms)), key=lambda offset: self.counts[self.terms[terms[offset]], 1])
+        keys = None
+        for offset in order:
+            docs, positions = self.positions(terms[offset])
+            term_keys = (docs << 32) | (positions - offset + (1 << 31))
+            if keys is None:
+                keys = term_keys
+            else:
+                found = np.searchsorted(term_keys, keys)
+                found[found == len(term_keys)] = 0
+                keys = keys[term_keys[found] == keys] if len(term_keys) else term_keys
+            if len(keys) == 0:
+                break
+        docs = keys >> 32
+        return docs[np.r_[True, docs[1:] != docs[:-1]]] if len(docs) else docs
+
+    def review(self, doc):
+        """
+        Returns the cleaned text of a local review number.
+        """
+        start, end = int(self.text_offsets[doc]), int(self.text_offsets[doc + 1])
+        with open(self.text_path, "rb") as file:
+            file.seek(start)
+            return file.read(end - start).decode("utf-8").rstrip("\n")
+
+def parse_query(query):
+    """
+    Splits a query into clauses: every word is a term, and every text between double quotation
+    marks is a phrase. Returns a list of token lists (one token for a term).
+    """
+    clauses = []
+    for phrase, word in PHRASE_PATTERN.findall(query):
+        tokens = tokenize(phrase if phrase else word)
+        if tokens:
+            clauses.append(tokens) if phrase else clauses.extend([token] for token in tokens)
+    return clauses
+
+class ReviewIndex:
+    """
+    An on-disk inverted index of reviews, made of append-only segments. Reviews are numbered
+    from 0 in the order they were added.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        manifest_path = os.path.join(directory, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {"segments": [], "num_docs": 0}
+        self.segments = [Segment(os.path.join(directory, entry["name"]), entry["first_doc"], entry["num_docs"])
+                         for entry in self.manifest["segments"]]
+
+    @property
+    def num_docs(self):
+        return self.manifest["num_docs"]
+
+    def add(self, batches, segment_tokens=SEGMENT_TOKENS):
+        """
+        Indexes batches of raw reviews (see review_pipeline.review_batches) after the existing
+        reviews, as new segments of about segment_tokens tokens. Returns the number of reviews added.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        added = 0
+        writer = SegmentWriter(self.num_docs)
+        for reviews in batches:
+            writer.add_block(reviews)
+            if writer.num_tokens >= segment_tokens:
+                added += self._commit(writer)
+                writer = SegmentWriter(self.num_docs)
+        if writer.num_docs:
+            added += self._commit(writer)
+        return added
+
+    def _commit(self, writer):
+        # The manifest is replaced atomically after the segment is complete; a segment left by an
+        # add that stopped before the manifest was replaced is not in the manifest, and is replaced
+        name = f"segment_{len(self.manifest['segments']):05d}"
+        path = os.path.join(self.directory, name)
+        for leftover in (path, path + ".tmp"):
+            if os.path.exists(leftover):
+                shutil.rmtree(leftover)
+        entry = writer.write(path)
+        self.manifest["segments"].append(entry)
+        self.manifest["num_docs"] += entry["num_docs"]
+        temporary_path = os.path.join(self.directory, MANIFEST + ".tmp")
+        with open(temporary_path, "w") as file:
+            json.dump(self.manifest, file, indent=2)
+        os.replace(temporary_path, os.path.join(self.directory, MANIFEST))
+        self.segments.append(Segment(path, entry["first_doc"], entry["num_docs"]))
+        return entry["num_docs"]
+
+    def docs(self, term):
+        """
+        Returns the sorted review numbers that contain a term.
+        """
+        return np.concatenate([segment.docs(term) + segment.first_doc for segment in self.segments] or [np.empty(0, dtype=np.int64)])
+
+    def search(self, query):
+        """
+        Returns the sorted review numbers that match every term and phrase of the query.
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return np.empty(0, dtype=np.int64)
+        results = []
+        for segment in self.segments:
+            # Rarest clauses first, so that the intersection shrinks quickly
+            sizes = [min(int(segment.counts[segment.terms[t], 0]) if t in segment.terms else 0 for t in clause)
+                     for clause in clauses]
+            matches = None
+            for _, clause in sorted(zip(sizes, clauses), key=lambda pair: pair[0]):
+                docs = segment.docs(clause[0]) if len(clause) == 1 else segment.phrase_docs(clause)
+                matches = docs if matches is None else np.intersect1d(matches, docs, assume_unique=True)
+                if len(matches) == 0:
+                    break
+            results.append(matches + segment.first_doc)
+        return np.concatenate(results) if results else np.empty(0, dtype=np.int64)
+
+    def review(self, doc):
+        """
+        Returns the cleaned text of a review number.
+        """
+        for segment in self.segments:
+            if segment.first_doc <= doc < segment.first_doc + segment.num_docs:
+                return segment.review(doc - segment.first_doc)
+        raise IndexError(f"review {doc} is not in the index ({self.num_docs} reviews)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query an inverted index of customer reviews.")
+    parser.add_argument("--index", default="data/review_index", help="index directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="index the reviews of files (or standard input) as new segments")
+    add_parser.add_argument("inputs", nargs="*", default=["-"])
+    add_parser.add_argument("--format", choices=["jsonl", "csv", "txt"], default=None)
+    add_parser.add_argument("--field", default="review")
+
+    search_parser = subparsers.add_parser("search", help='find the reviews that match words and "quoted phrases"')
+    search_parser.add_argument("query")
+    search_parser.add_argument("--show", type=int, default=5, help="number of matching reviews to print")
+
+    args = parser.parse_args()
+    index = ReviewIndex(args.index)
+    if args.command == "add":
+        for file_path in args.inputs:
+            start = time.perf_counter()
+            added = index.add(review_batches(file_path, args.format, args.field))
+            elapsed = time.perf_counter() - start
+            print(f"{file_path}: {added} reviews indexed in {elapsed:.2f} s "
+                  f"({added / elapsed if elapsed else float('inf'):,.0f} reviews/s), {index.num_docs} in the index")
+    else:
+        start = time.perf_counter()
+        matches = index.search(args.query)
+        elapsed = time.perf_counter() - start
+        print(f"{len(matches)} of {index.num_docs} reviews match {args.query!r} ({elapsed * 1000:.1f} ms)")
+        for doc in matches[:args.show]:
+            print(f" - [{doc}] {index.review(int(doc))}")
+
+if __name__ == "__main__":
+    main()
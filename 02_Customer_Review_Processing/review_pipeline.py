@@ -0,0 +1,266 @@
+# Streaming version of the review processing: reviews are read from JSON lines, CSV or plain
+# text files (or standard input) in blocks of about one megabyte that end at a record boundary,
+# every block is cleaned with a single pass of the translation table of process_review, and
+# the result is written out through a large write buffer. Nothing but the current block is held
+# in memory, so memory use does not grow with the corpus. Large files can be split into shards
+# at byte offsets and processed by a pool of workers.
+
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from functools import lru_cache
+from multiprocessing import Pool
+
+from customer_review_processing import REVIEW_TRANSLATION, process_review
+
+# Size of the blocks read at a time, and of the write buffer
+BUFFER_SIZE = 1 << 20
+INPUT_FORMATS = ("jsonl", "csv", "txt")
+# Placeholder that joins the reviews of a block, so that the block is translated in one call
+JOINER = "\x00"
+
+def detect_format(file_path):
+    """
+    Returns the input format of a file from its extension (plain text by default).
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    return {".jsonl": "jsonl", ".json": "jsonl", ".ndjson": "jsonl", ".csv": "csv"}.get(extension, "txt")
+
+def record_end(block, quoted=False):
+    """
+    Returns the offset just after the last complete record of a block of bytes that starts at a
+    record boundary: after its last newline or, in a CSV block (quoted=True), after its last
+    newline that follows an even number of quotation marks (quotes inside fields are doubled).
+    """
+    end = block.rfind(b"\n") + 1
+    if quoted:
+        quotes = block.count(b'"', 0, end)
+        while quotes % 2 and end:
+            previous = block.rfind(b"\n", 0, end - 1) + 1
+            quotes -= block.count(b'"', previous, end)
+            end = previous
+    return end
+
+def read_blocks(file, size=None, quoted=False, block_size=BUFFER_SIZE):
+    """
+    Yields the decoded text of an open binary file, from its position and for size bytes (to
+    the end by default), in blocks of whole records.
+    """
+    carry = b""
+    while True:
+        length = block_size if size is None else min(block_size, size)
+        block = file.read(length) if length else b""
+        if not block:
+            if carry:
+                yield carry.decode("utf-8")
+            return
+        if size is not None:
+            size -= len(block)
+        block = carry + block
+        end = record_end(block, quoted)
+        carry = block[end:]
+        if end:
+            yield block[:end].decode("utf-8")
+
+def parse_block(text, input_format="jsonl", field="review", column=0):
+    """
+    Returns the raw review texts of a block of records: the field of every JSON object (or the
+    JSON string itself), the column of every CSV record, or every line of plain text.
+    """
+    if input_format == "jsonl":
+        lines = [line for line in text.split("\n") if line.strip()]
+        try:
+            # One call parses the whole block
+            records = json.loads("[" + ",".join(lines) + "]")
+        except json.JSONDecodeError:
+            # Parse line by line to report the malformed record
+            records = [json.loads(line) for line in lines]
+        return [record if isinstance(record, str) else record.get(field, "") for record in records]
+    if input_format == "csv":
+        return [row[column] for row in csv.reader(io.StringIO(text, newline="")) if row]
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return [line.rstrip("\r") for line in lines] if "\r" in text else lines
+
+@lru_cache(maxsize=None)
+def block_translation(separator):
+    """
+    Returns the translation table of process_review that also turns the joiner into the separator.
+    """
+    return {**REVIEW_TRANSLATION, ord(JOINER): separator}
+
+def clean_batch(reviews, separator="\n"):
+    """
+    Cleans a batch of reviews and returns them joined by the separator. The batch is joined and
+    translated in one pass, which is much faster than translating every short review on its own;
+    a batch that already contains the joiner character is cleaned review by review.
+    """
+    text = JOINER.join(reviews)
+    if text.count(JOINER) != len(reviews) - 1:
+        return separator.join(process_review(review) for review in reviews)
+    return text.translate(block_translation(separator))
+
+def write_reviews(batches, file, separator="\n"):
+    """
+    Cleans batches of raw reviews and writes them to an open file, joined by the separator.
+    Returns the number of reviews written.
+    """
+    count = 0
+    for reviews in batches:
+        if reviews:
+            file.write((separator if count else "") + clean_batch(reviews, separator))
+            count += len(reviews)
+    return count
+
+def csv_header(file, field):
+    """
+    Reads the header line of a CSV file and returns the index of the review column.
+    """
+    columns = next(csv.reader([file.readline().decode("utf-8")]), [])
+    if field in columns:
+        return columns.index(field)
+    if len(columns) == 1:
+        return 0
+    raise ValueError(f"no {field!r} column in the CSV header (columns: {columns})")
+
+def review_batches(file_path, input_format=None, field="review", start=None, end=None):
+    """
+    Yields the raw reviews of a file (or "-" for standard input) in batches, one per block.
+    Without a start offset, reading starts after the CSV header; otherwise it reads the bytes
+    between the start and end offsets (see shard_offsets).
+    """
+    input_format = input_format or ("txt" if file_path == "-" else detect_format(file_path))
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"input_format must be one of {INPUT_FORMATS}, got {input_format!r}")
+    file = sys.stdin.buffer if file_path == "-" else open(file_path, "rb")
+    try:
+        column = csv_header(file, field) if input_format == "csv" else 0
+        if start is not None:
+            file.seek(start)
+        size = None if end is None else end - file.tell()
+        for text in read_blocks(file, size, quoted=input_format == "csv"):
+            yield parse_block(text, input_format, field, column)
+    finally:
+        if file is not sys.stdin.buffer:
+            file.close()
+
+def shard_offsets(file_path, shards, input_format=None, block_size=1 << 24):
+    """
+    Splits the records of a file into shards of about equal size and returns the shards + 1
+    byte offsets of their bounds, each moved forward to the end of a record. In a CSV file a
+    newline only ends a record after an even number of quotation marks, so records with
+    newlines are never split.
+    """
+    quoted = (input_format or detect_format(file_path)) == "csv"
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as file:
+        if quoted:
+            file.readline()
+        start = position = file.tell()
+        offsets = [start]
+        quotes = 0
+        for shard in range(1, shards):
+            target = start + (size - start) * shard // shards
+            if position < target:
+                if quoted:
+                    while position < target:
+                        block = file.read(min(block_size, target - position))
+                        quotes += block.count(b'"')
+                        position += len(block)
+                else:
+                    file.seek(target)
+                    position = target
+                # Move forward to the end of the current record
+                while True:
+                    line = file.readline()
+                    position += len(line)
+                    quotes += line.count(b'"') if quoted else 0
+                    if not line or quotes % 2 == 0:
+                        break
+            offsets.append(position)
+    offsets.append(size)
+    return offsets
+
+def process_shard(file_path, start, end, output_path, input_format, field, separator):
+    """
+    Processes the reviews between two byte offsets of a file into a part file (run in a worker process).
+    """
+    with open(output_path, "w", encoding="utf-8", buffering=BUFFER_SIZE) as output:
+        return write_reviews(review_batches(file_path, input_format, field, start, end), output, separator)
+
+def process_file(file_path, output, input_format=None, field="review", separator="\n", workers=1):
+    """
+    Processes the reviews of a file (or "-" for standard input) into an output file (or "-" for
+    standard output), joined by the separator (one review per line by default). With several
+    workers, the file is split into one shard per worker and the part files are concatenated in
+    order. Returns the number of reviews and the throughput.
+    """
+    start_time = time.perf_counter()
+    input_format = input_format or ("txt" if file_path == "-" else detect_format(file_path))
+    to_stdout = output == "-"
+    if not to_stdout:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    out = sys.stdout if to_stdout else open(output, "w", encoding="utf-8", buffering=BUFFER_SIZE)
+    try:
+        if file_path != "-" and workers > 1:
+            offsets = shard_offsets(file_path, workers, input_format)
+            directory = "." if to_stdout else os.path.dirname(output) or "."
+            parts = [os.path.join(directory, f".{os.path.basename(file_path)}.part{i}") for i in range(workers)]
+            tasks = [(file_path, offsets[i], offsets[i + 1], parts[i], input_format, field, separator)
+                     for i in range(workers)]
+            with Pool(workers) as pool:
+                counts = pool.starmap(process_shard, tasks)
+            count = 0
+            for part, part_count in zip(parts, counts):
+                if part_count:
+                    out.write(separator if count else "")
+                    out.flush()
+                    with open(part, "rb") as part_file:
+                        shutil.copyfileobj(part_file, out.buffer, BUFFER_SIZE)
+                    count += part_count
+                os.remove(part)
+        else:
+            count = write_reviews(review_batches(file_path, input_format, field), out, separator)
+        if count and separator == "\n":
+            out.write("\n")
+    finally:
+        if to_stdout:
+            out.flush()
+        else:
+            out.close()
+    elapsed = time.perf_counter() - start_time
+    input_bytes = None if file_path == "-" else os.path.getsize(file_path)
+    return {
+        "reviews": count,
+        "seconds": elapsed,
+        "reviews_per_second": count / elapsed if elapsed else float("inf"),
+        "megabytes_per_second": input_bytes / 2**20 / elapsed if input_bytes and elapsed else None
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean customer reviews from JSON lines, CSV or text files in a stream.")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="input files ('-' or nothing for standard input)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file, or directory when there are several inputs ('-' for standard output)")
+    parser.add_argument("--format", choices=INPUT_FORMATS, default=None, help="input format (default: from the extension)")
+    parser.add_argument("--field", default="review", help="JSON field or CSV column of the review text")
+    parser.add_argument("--separator", default="\n", help="separator of the cleaned reviews (default: one per line)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each processing a shard of every file")
+    args = parser.parse_args()
+
+    for file_path in args.inputs:
+        output = args.output
+        if len(args.inputs) > 1 and output != "-":
+            output = os.path.join(output, os.path.splitext(os.path.basename(file_path))[0] + ".txt")
+        stats = process_file(file_path, output, args.format, args.field, args.separator, args.workers)
+        print(f"{file_path}: {stats['reviews']} reviews in {stats['seconds']:.2f} s "
+              f"({stats['reviews_per_second']:,.0f} reviews/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
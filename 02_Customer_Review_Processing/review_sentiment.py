@@ -0,0 +1,314 @@
+# Sentiment stage of the review processing: every review gets a score between -1 (negative) and
+# 1 (positive) from a lexicon of word and phrase weights, with negations ("not", "wouldn't")
+# flipping and intensifiers ("very", "absolutely") scaling the words that follow them. The
+# lexicon is compiled into a hash of token ids and a trie of phrases stored as sorted arrays, so
+# that a whole batch of reviews is scored with NumPy operations over all of its tokens at once.
+# Duplicate reviews are common in a feed, so scores are cached by normalized text (LRU).
+
+import argparse
+import os
+import shutil
+import time
+from collections import OrderedDict
+from itertools import repeat
+from multiprocessing import Pool
+
+import numpy as np
+
+from review_index import TOKEN_PATTERN
+from review_pipeline import clean_batch, review_batches, shard_offsets
+
+# Word weights, from -4 (most negative) to 4 (most positive)
+WORDS = {
+    "love": 3.2, "loves": 3.0, "wonderful": 2.7, "fantastic": 3.0, "great": 3.1, "excellent": 3.2, "best": 3.2,
+    "perfect": 2.9, "perfectly": 2.7, "happy": 2.7, "recommend": 1.5, "good": 1.9, "nice": 1.8, "amazing": 2.8,
+    "fast": 1.0, "premium": 0.8, "beautiful": 2.9, "awesome": 3.1, "satisfied": 1.8, "quality": 0.4,
+    "terrible": -2.5, "awful": -2.0, "worst": -3.1, "poor": -2.1, "disappointed": -1.9, "bad": -2.5,
+    "broke": -1.7, "broken": -2.1, "useless": -1.8, "frustrating": -2.0, "cheap": -0.8, "returned": -1.0,
+    "refund": -0.7, "stopped": -0.9, "horrible": -2.5, "waste": -1.8, "hate": -2.7, "defective": -2.2,
+    "okay": 0.6, "ok": 0.6, "decent": 0.9, "average": 0.2, "standard": 0.2, "fine": 0.8, "special": 1.7
+}
+
+# Phrase weights; a phrase replaces the weights of its words
+PHRASES = {
+    "not bad": 1.0, "not worth": -2.0, "waste of money": -3.0, "five stars": 3.0, "will buy again": 2.5,
+    "does the job": 1.2, "broke after": -2.2, "as described": 0.8, "value for the money": 2.0,
+    "some good points some bad points": 0.0, "nothing special": -0.3, "arrived on time": 0.6
+}
+
+NEGATIONS = {"not", "no", "never", "nothing", "none", "nor", "cannot", "don't", "doesn't", "didn't", "isn't", "wasn't",
+             "aren't", "weren't", "won't", "wouldn't", "can't", "couldn't", "shouldn't", "hasn't", "haven't"}
+
+INTENSIFIERS = {"very": 1.3, "really": 1.3, "absolutely": 1.5, "extremely": 1.5, "completely": 1.3, "so": 1.2,
+                "totally": 1.3, "super": 1.3, "incredibly": 1.5, "highly": 1.3}
+
+# Contrastive words end the scope of a negation ("nothing special, but not bad")
+CONTRASTS = {"but", "however", "although", "though", "yet"}
+# A negation flips the words up to NEGATION_WINDOW tokens after it, scaled by NEGATION_SCALE
+NEGATION_WINDOW = 3
+NEGATION_SCALE = -0.74
+# Normalization of the summed weights into (-1, 1): score / sqrt(score ** 2 + NORMALIZATION)
+NORMALIZATION = 15
+# Scores at or above POSITIVE_THRESHOLD are positive, at or below -POSITIVE_THRESHOLD negative;
+# a single mild word ("okay", "decent") stays within the neutral band
+POSITIVE_THRESHOLD = 0.35
+LABELS = ("negative", "neutral", "positive")
+# The token that ends a review, and unknown tokens
+BREAK, UNKNOWN = 0, 1
+
+class SentimentLexicon:
+    """
+    A lexicon compiled for batch scoring: token ids from a hash, per-id weights, negation and
+    intensifier arrays, and a trie of the phrases as sorted (node, token) transition keys.
+    """
+
+    def __init__(self, words=WORDS, phrases=PHRASES, negations=NEGATIONS, intensifiers=INTENSIFIERS, contrasts=CONTRASTS):
+        phrase_tokens = {phrase: TOKEN_PATTERN.findall(phrase.lower()) for phrase in phrases}
+        vocabulary = {"\n": BREAK}
+        for token in [*words, *negations, *intensifiers, *contrasts, *(token for tokens in phrase_tokens.values() for token in tokens)]:
+            vocabulary.setdefault(token, len(vocabulary) + 1)
+        self.vocabulary = vocabulary
+        size = len(vocabulary) + 1
+
+        self.weights = np.zeros(size)
+        self.weights[[vocabulary[word] for word in words]] = list(words.values())
+        self.is_negation = np.zeros(size, dtype=bool)
+        self.is_negation[[vocabulary[word] for word in negations]] = True
+        self.is_contrast = np.zeros(size, dtype=bool)
+        self.is_contrast[[vocabulary[word] for word in contrasts]] = True
+        self.boosts = np.ones(size)
+        self.boosts[[vocabulary[word] for word in intensifiers]] = list(intensifiers.values())
+
+        # Trie: node 0 is the root; a transition (node, token) is stored as the key node * size + token
+        transitions = {}
+        terminal = {}
+        for phrase, tokens in phrase_tokens.items():
+            node = 0
+            for token in tokens:
+                node = transitions.setdefault((node, vocabulary[token]), len(transitions) + 1)
+            terminal[node] = phrases[phrase]
+        keys = np.array([node * size + token for node, token in transitions], dtype=np.int64)
+        order = np.argsort(keys)
+        self.trie_keys = keys[order]
+        self.trie_children = np.array(list(transitions.values()), dtype=np.int64)[order]
+        self.node_weights = np.zeros(len(transitions) + 1)
+        self.is_terminal = np.zeros(len(transitions) + 1, dtype=bool)
+        self.node_weights[list(terminal)] = list(terminal.values())
+        self.is_terminal[list(terminal)] = True
+        self.max_phrase = max((len(tokens) for tokens in phrase_tokens.values()), default=0)
+        self.size = size
+
+    def token_ids(self, tokens):
+        """
+        Returns the ids of a list of tokens (UNKNOWN for the tokens that are not in the lexicon).
+        """
+        return np.fromiter(map(self.vocabulary.get, tokens, repeat(UNKNOWN)), dtype=np.int64, count=len(tokens))
+
+    def phrase_matches(self, ids, docs):
+        """
+        Walks the trie from every token at once and returns the start, length and weight of the
+        longest phrase that starts at each token where one does.
+        """
+        starts = np.arange(len(ids))
+        nodes = np.zeros(len(ids), dtype=np.int64)
+        lengths = np.zeros(len(ids), dtype=np.int64)
+        weights = np.zeros(len(ids))
+        for depth in range(self.max_phrase):
+            positions = starts + depth
+            inside = positions < len(ids)
+            starts, nodes, positions = starts[inside], nodes[inside], positions[inside]
+            # Phrases do not cross the end of a review
+            same_review = docs[positions] == docs[starts]
+            starts, nodes, positions = starts[same_review], nodes[same_review], positions[same_review]
+            keys = nodes * self.size + ids[positions]
+            found = np.searchsorted(self.trie_keys, keys)
+            found[found == len(self.trie_keys)] = 0
+            matched = self.trie_keys[found] == keys if len(self.trie_keys) else np.zeros(len(keys), dtype=bool)
+            starts, nodes = starts[matched], self.trie_children[found[matched]]
+            if len(starts) == 0:
+                break
+            ends = self.is_terminal[nodes]
+            lengths[starts[ends]] = depth + 1
+            weights[starts[ends]] = self.node_weights[nodes[ends]]
+        matched = np.flatnonzero(lengths)
+        return matched, lengths[matched], weights[matched]
+
+    def score_tokens(self, ids, docs, num_reviews):
+        """
+        Returns the scores of num_reviews reviews from the ids of their tokens and the review of
+        every token.
+        """
+        weights = self.weights[ids]
+        count = len(ids)
+        if count:
+            # Phrases replace the weights of their words
+            starts, lengths, phrase_weights = self.phrase_matches(ids, docs)
+            covered = np.zeros(count + 1, dtype=np.int64)
+            np.add.at(covered, starts, 1)
+            np.add.at(covered, starts + lengths, -1)
+            weights[np.cumsum(covered[:-1]) > 0] = 0
+            weights[starts] = phrase_weights
+
+            index = np.arange(count)
+            # Intensifiers scale the next word
+            previous_boost = np.r_[1.0, self.boosts[ids[:-1]]]
+            previous_boost[np.r_[True, docs[1:] != docs[:-1]]] = 1.0
+            weights *= previous_boost
+            # Negations flip the next NEGATION_WINDOW words of the same review, up to a contrastive word
+            last_negation = np.maximum.accumulate(np.where(self.is_negation[ids], index, -count - NEGATION_WINDOW))
+            previous_negation = np.r_[-count - NEGATION_WINDOW, last_negation[:-1]]
+            last_contrast = np.maximum.accumulate(np.where(self.is_contrast[ids], index, -1))
+            negated = ((index - previous_negation <= NEGATION_WINDOW) & (previous_negation > last_contrast)
+                       & (docs[np.maximum(previous_negation, 0)] == docs))
+            weights[negated] *= NEGATION_SCALE
+        totals = np.bincount(docs, weights=weights, minlength=num_reviews)
+        return totals / np.sqrt(totals * totals + NORMALIZATION)
+
+    def score_texts(self, texts):
+        """
+        Returns the scores of a list of cleaned, lowercase review texts (one regular expression
+        pass over the whole batch).
+        """
+        tokens = TOKEN_PATTERN.findall("\n".join(texts) + "\n")
+        ids = self.token_ids(tokens)
+        is_break = ids == BREAK
+        docs = np.cumsum(is_break)[~is_break]
+        return self.score_tokens(ids[~is_break], docs, len(texts))
+
+def labels(scores):
+    """
+    Returns the label index (see LABELS) of every score.
+    """
+    return (scores >= POSITIVE_THRESHOLD).astype(np.int8) - (scores <= -POSITIVE_THRESHOLD) + 1
+
+class SentimentScorer:
+    """
+    Scores batches of raw reviews with a lexicon, caching the scores of the most recently seen
+    normalized texts (the cleaned, lowercase review). A hit is a review that was not scored: its
+    text was in the cache or earlier in the same batch.
+    """
+
+    def __init__(self, lexicon=None, cache_size=100_000):
+        self.lexicon = lexicon or SentimentLexicon()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.lookups = 0
+
+    def score_batch(self, reviews):
+        """
+        Returns the scores of a batch of raw reviews.
+        """
+        texts = clean_batch(reviews, "\n").lower().split("\n")
+        if not self.cache_size:
+            return self.lexicon.score_texts(texts)
+        cache = self.cache
+        scores = np.fromiter(map(cache.get, texts, repeat(np.nan)), dtype=np.float64, count=len(texts))
+        missing = np.flatnonzero(np.isnan(scores))
+        self.lookups += len(texts)
+        self.hits += len(texts) - len(missing)
+        if len(missing) < len(texts):
+            for text in {texts[i] for i in np.flatnonzero(~np.isnan(scores))}:
+                cache.move_to_end(text)
+        if len(missing):
+            # Duplicates within the batch are scored once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            self.hits += len(missing) - len(unique_texts)
+            unique_scores = self.lexicon.score_texts(unique_texts)
+            cache.update(zip(unique_texts, unique_scores.tolist()))
+            lookup = dict(zip(unique_texts, unique_scores.tolist()))
+            scores[missing] = [lookup[texts[i]] for i in missing]
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return scores
+
+def score_reviews(batches, output=None, cache_size=100_000):
+    """
+    Scores batches of raw reviews and writes a "score,label" line per review to an open output
+    file (if any). Returns the counts of every label, the sum of the scores and the cache hits.
+    """
+    scorer = SentimentScorer(cache_size=cache_size)
+    counts = np.zeros(len(LABELS), dtype=np.int64)
+    total = 0.0
+    for reviews in batches:
+        if not reviews:
+            continue
+        scores = scorer.score_batch(reviews)
+        review_labels = labels(scores)
+        counts += np.bincount(review_labels, minlength=len(LABELS))
+        total += float(scores.sum())
+        if output is not None:
+            names = np.array(LABELS)[review_labels]
+            output.write("".join(f"{score:.4f},{name}\n" for score, name in zip(scores.tolist(), names.tolist())))
+    return {"counts": counts.tolist(), "score_sum": total, "hits": scorer.hits, "lookups": scorer.lookups}
+
+def score_shard(file_path, start, end, output_path, input_format, field, cache_size):
+    """
+    Scores the reviews between two byte offsets of a file (run in a worker process).
+    """
+    with open(output_path, "w", buffering=1 << 20) if output_path else open(os.devnull, "w") as output:
+        return score_reviews(review_batches(file_path, input_format, field, start, end),
+                             output if output_path else None, cache_size)
+
+def score_file(file_path, output=None, input_format=None, field="review", workers=1, cache_size=100_000):
+    """
+    Scores the reviews of a file (or "-" for standard input). Per-review scores are written to
+    the output CSV file (one "score,label" line per review, in order), if any. With several
+    workers, the file is split into shards scored in parallel, each with its own cache.
+    Returns the aggregate counts and the throughput.
+    """
+    start_time = time.perf_counter()
+    shards = workers if file_path != "-" and workers > 1 else 1
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    if shards > 1:
+        offsets = shard_offsets(file_path, shards, input_format)
+        parts = [f"{output}.part{i}" if output else None for i in range(shards)]
+        tasks = [(file_path, offsets[i], offsets[i + 1], parts[i], input_format, field, cache_size) for i in range(shards)]
+        with Pool(shards) as pool:
+            results = pool.starmap(score_shard, tasks)
+        if output:
+            with open(output, "wb") as file:
+                file.write(b"score,label\n")
+                for part in parts:
+                    with open(part, "rb") as part_file:
+                        shutil.copyfileobj(part_file, file, 1 << 20)
+                    os.remove(part)
+    else:
+        with open(output, "w", buffering=1 << 20) if output else open(os.devnull, "w") as file:
+            file.write("score,label\n")
+            results = [score_reviews(review_batches(file_path, input_format, field), file if output else None, cache_size)]
+
+    counts = np.sum([result["counts"] for result in results], axis=0)
+    reviews = int(counts.sum())
+    lookups = sum(result["lookups"] for result in results)
+    elapsed = time.perf_counter() - start_time
+    return {
+        "reviews": reviews,
+        **dict(zip(LABELS, counts.tolist())),
+        "mean_score": sum(result["score_sum"] for result in results) / reviews if reviews else 0.0,
+        "cache_hit_rate": sum(result["hits"] for result in results) / lookups if lookups else 0.0,
+        "seconds": elapsed,
+        "reviews_per_second": reviews / elapsed if elapsed else float("inf")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the sentiment of customer reviews with a lexicon.")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="input files ('-' or nothing for standard input)")
+    parser.add_argument("-o", "--output", default=None, help="CSV file of the per-review scores (one input only)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "txt"], default=None)
+    parser.add_argument("--field", default="review")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--cache-size", type=int, default=100_000, help="normalized texts kept in the score cache (0: no cache)")
+    args = parser.parse_args()
+    if args.output and len(args.inputs) > 1:
+        parser.error("--output needs a single input")
+
+    for file_path in args.inputs:
+        stats = score_file(file_path, args.output, args.format, args.field, args.workers, args.cache_size)
+        print(f"{file_path}: {stats['reviews']} reviews in {stats['seconds']:.2f} s ({stats['reviews_per_second']:,.0f} reviews/s)")
+        print(f" - positive: {stats['positive']}, neutral: {stats['neutral']}, negative: {stats['negative']}")
+        print(f" - mean score: {stats['mean_score']:.3f}, cache hit rate: {stats['cache_hit_rate']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Importing the necessary libraries
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from nyc_schools_analysis import COMBINED_COLUMN, SchoolsAnalysis, clean_schools, generate_schools, school_names
+
+# Benchmark of the schools analysis: every step of the original script (per-element data
+# generation, column-by-column casts, full sorts, and a grouped pass per statistic) against
+# the analysis API, on the same data.
+
+def timed(function, *args, **kwargs):
+    """
+    Run a function and return its result and the elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def legacy_generate(num_schools):
+    """
+    Generate the dataset like the original script, one random draw per element.
+    """
+    return pd.DataFrame({
+        "school_name": school_names(num_schools),
+        "borough": np.resize(["Manhattan", "Bronx", "Brooklyn", "Queens", "Staten Island"], num_schools),
+        "average_math": [np.random.randint(400, 800) for _ in range(num_schools)],
+        "average_reading": [np.random.randint(400, 800) for _ in range(num_schools)],
+        "average_writing": [np.random.randint(400, 800) for _ in range(num_schools)]
+    })
+
+def legacy_clean(schools_df):
+    """
+    Clean the dataset like the original script.
+    """
+    if schools_df.isnull().values.any():
+        schools_df.dropna(inplace = True)
+    for column in ["average_math", "average_reading", "average_writing"]:
+        if schools_df.dtypes[column] != "int64":
+            schools_df[column] = schools_df[column].astype("int64")
+    for column in ["borough", "school_name"]:
+        if schools_df.dtypes[column] != "object":
+            schools_df[column] = schools_df[column].astype("object")
+    if schools_df.duplicated().any():
+        schools_df.drop_duplicates(inplace = True)
+    return schools_df
+
+def legacy_best_math(schools_df):
+    best_math_schools = schools_df[schools_df["average_math"] >= 0.8 * 800]
+    return best_math_schools[["school_name", "average_math"]].sort_values(by = "average_math", ascending = False)
+
+def legacy_top_10(schools_df):
+    schools_df[COMBINED_COLUMN] = schools_df["average_math"] + schools_df["average_reading"] + schools_df["average_writing"]
+    return schools_df[["school_name", COMBINED_COLUMN]].sort_values(by = COMBINED_COLUMN, ascending = False).head(10)
+
+def legacy_borough_stats(schools_df):
+    return schools_df.groupby("borough").agg(
+        num_schools = ("school_name", "count"),
+        avg_combined_SAT = (COMBINED_COLUMN, "mean"),
+        std_combined_SAT = (COMBINED_COLUMN, "std")
+    )
+
+def benchmark_analysis(num_schools = 1_000_000, repeat = 5):
+    """
+    Time every step of the original script and of the analysis API on num_schools schools,
+    and check that both give the same results.
+    """
+    legacy_df, legacy_generate_seconds = timed(legacy_generate, num_schools)
+    generated, generate_seconds = timed(generate_schools, num_schools, seed = 1)
+    print(f"Generating {num_schools:,} schools: {legacy_generate_seconds:.2f} s -> {generate_seconds:.2f} s")
+
+    # Both sides analyze the same data from here on
+    legacy_df = generated.astype({"borough": "object"})
+    legacy_df, legacy_seconds = timed(legacy_clean, legacy_df)
+    df, seconds = timed(clean_schools, generated)
+    print(f"{'cleaning':>20}: {legacy_seconds * 1000:8.1f} ms -> {seconds * 1000:8.1f} ms")
+    analysis = SchoolsAnalysis(df)
+    _, seconds = timed(lambda: analysis.combined_scores)
+    print(f"{'combined scores':>20}: {'':>11}    {seconds * 1000:8.1f} ms (computed once)")
+
+    steps = [
+        ("best math schools", legacy_best_math, analysis.above_threshold, ["average_math"]),
+        ("top 10 schools", legacy_top_10, analysis.top_schools, [COMBINED_COLUMN]),
+        ("borough statistics", legacy_borough_stats, analysis.group_stats, None)
+    ]
+    results = {}
+    for name, legacy_step, step, columns in steps:
+        legacy_result, _ = timed(legacy_step, legacy_df)
+        legacy_seconds = min(timed(legacy_step, legacy_df)[1] for _ in range(repeat))
+        result, _ = timed(step)
+        seconds = min(timed(step)[1] for _ in range(repeat))
+        # Scores must match in order (names can differ among equal scores)
+        if columns:
+            same = np.array_equal(legacy_result[columns].to_numpy(), result[columns].to_numpy())
+        else:
+            same = np.allclose(legacy_result.to_numpy(dtype = float), result.to_numpy(dtype = float), equal_nan = True)
+        results[name] = (legacy_seconds, seconds)
+        print(f"{name:>20}: {legacy_seconds * 1000:8.1f} ms -> {seconds * 1000:8.1f} ms ({legacy_seconds / seconds:5.1f}x), same results: {same}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark of the schools analysis.")
+    parser.add_argument("--schools", type = int, default = 1_000_000)
+    args = parser.parse_args()
+    benchmark_analysis(args.schools)
+
+if __name__ == "__main__":
+    main()
@@ -1,124 +1,273 @@
 # Importing the necessary libraries
-import pandas as pd
+import argparse
+import os
+import sys
+from functools import cached_property
+
 import numpy as np
-import matplotlib.pyplot as plt
-
-# Preparing the dataset with more variation
-data = {
-    'school_name': [
-        f'School {chr(65 + i // 10)}{i % 10}' for i in range(100)
-    ],
-    'borough': [
-        'Manhattan', 'Bronx', 'Brooklyn', 'Queens', 'Staten Island'
-    ] * 20,
-    'average_math': [
-        np.random.randint(400, 800) for _ in range(100)
-    ],
-    'average_reading': [
-        np.random.randint(400, 800) for _ in range(100)
-    ],
-    'average_writing': [
-        np.random.randint(400, 800) for _ in range(100)
+import pandas as pd
+
+# The chart rendering service is shared by the projects of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.chart_rendering import bar_chart, box_plot, histogram, render_charts
+
+BOROUGHS = ["Manhattan", "Bronx", "Brooklyn", "Queens", "Staten Island"]
+SCORE_COLUMNS = ["average_math", "average_reading", "average_writing"]
+COMBINED_COLUMN = "combined_SAT_scores"
+MAX_SCORE = 800
+# Column types of the cleaned data: boroughs are few, so they are stored as a categorical,
+# which also makes grouping by borough much faster. School names keep the string type of the loader.
+SCHOOL_DTYPES = {"borough": "category", **{column: "int64" for column in SCORE_COLUMNS}}
+
+# Function 1: Prepare the dataset
+def school_names(count):
+    """
+    Return the names of count schools: "School A0" to "School Z9", then "School 260" onwards.
+    """
+    return [f"School {chr(65 + i // 10)}{i % 10}" if i < 260 else f"School {i}" for i in range(count)]
+
+def generate_schools(num_schools = 100, years = None, seed = None):
+    """
+    Generate a dataset of schools with random average SAT scores between 400 and 799.
+
+    Parameters:
+    - num_schools (int): The number of schools; boroughs are assigned in turn.
+    - years (iterable of int, optional): With years, every school has one row per year, and a "year" column.
+    - seed (int, optional): The seed of the random generator.
+
+    Returns:
+    - df (DataFrame): The generated dataset.
+    """
+    rng = np.random.default_rng(seed)
+    years = list(years) if years is not None else None
+    repeats = len(years) if years else 1
+    schools = np.tile(np.arange(num_schools), repeats)
+    # One call draws the scores of every school and year
+    scores = rng.integers(400, 800, size = (len(schools), len(SCORE_COLUMNS)))
+    data = {}
+    if years:
+        data["year"] = np.repeat(np.asarray(years, dtype = np.int64), num_schools)
+    data["school_name"] = np.asarray(school_names(num_schools), dtype = object)[schools]
+    # Categories in alphabetical order, like those of astype("category")
+    categories = sorted(BOROUGHS)
+    codes = np.array([categories.index(borough) for borough in BOROUGHS])
+    data["borough"] = pd.Categorical.from_codes(codes[schools % len(BOROUGHS)], categories)
+    data.update({column: scores[:, i] for i, column in enumerate(SCORE_COLUMNS)})
+    return pd.DataFrame(data)
+
+def load_schools(file_path, columns = None):
+    """
+    Load a dataset of schools from a CSV file (clean_schools gives the columns their types).
+
+    Parameters:
+    - file_path (str): The path to the CSV file.
+    - columns (dict, optional): Names of the file's columns to rename to the names of this
+      analysis (for example {"SAT Math Avg. Score": "average_math"}).
+
+    Returns:
+    - df (DataFrame): The loaded data.
+    """
+    df = pd.read_csv(file_path)
+    if columns:
+        df = df.rename(columns = columns)
+    return df
+
+# Function 2: Clean the data
+def clean_schools(df):
+    """
+    Clean a dataset of schools: drop the rows with missing values, give the columns their types
+    (in a single astype call) and drop the duplicate rows.
+
+    Parameters:
+    - df (DataFrame): The dataset.
+
+    Returns:
+    - df (DataFrame): The cleaned dataset (a new DataFrame when anything changed).
+    """
+    if df.isna().to_numpy().any():
+        df = df.dropna()
+    changes = {column: dtype for column, dtype in SCHOOL_DTYPES.items() if column in df and df[column].dtype != dtype}
+    if changes:
+        df = df.astype(changes)
+    duplicated = df.duplicated()
+    if duplicated.any():
+        df = df[~duplicated]
+    return df
+
+# Function 3: Analyze the data
+class SchoolsAnalysis:
+    """
+    Analysis of the SAT scores of a cleaned dataset of schools (see clean_schools). The
+    combined scores are computed on first use and kept as a Series; the DataFrame, which may
+    be the caller's own, is not modified.
+    """
+
+    def __init__(self, df):
+        self.df = df
+
+    @cached_property
+    def combined_scores(self):
+        """
+        The combined SAT scores (the sum of the three averages) of every row.
+        """
+        # Column additions; a row-wise sum(axis = 1) is many times slower
+        return sum(self.df[column] for column in SCORE_COLUMNS).rename(COMBINED_COLUMN)
+
+    def scores(self, column):
+        """
+        Return a score column as a Series (the combined scores included).
+        """
+        return self.combined_scores if column == COMBINED_COLUMN else self.df[column]
+
+    def values(self, column):
+        """
+        Return the values of a score column as a NumPy array.
+        """
+        return self.scores(column).to_numpy()
+
+    def ranked(self, rows, column):
+        """
+        Return the school names and scores of the given row positions (in increasing order),
+        sorted by descending score; rows with equal scores stay in the order of the data.
+        """
+        keys = -self.values(column)[rows]
+        # Scores are small integers: a stable sort of 16-bit keys is a radix sort
+        if keys.dtype.kind == "i" and len(keys) and -2**15 <= keys.min() and keys.max() < 2**15:
+            keys = keys.astype(np.int16)
+        order = rows[np.argsort(keys, kind = "stable")]
+        names = self.df["school_name"].iloc[order]
+        return pd.DataFrame({"school_name": names.to_numpy(), column: self.values(column)[order]}, index = names.index)
+
+    def top_schools(self, n = 10, column = COMBINED_COLUMN):
+        """
+        Return the n schools with the best scores of a column, best first.
+
+        The n best rows are selected with a partial sort (np.argpartition), in linear time, and
+        only they are sorted. Among equal scores at the cut, the choice is arbitrary, as with a full sort.
+        With n <= 0, no school is returned.
+        """
+        values = self.values(column)
+        if n <= 0:
+            rows = np.empty(0, dtype = np.int64)
+        elif n < len(values):
+            rows = np.sort(np.argpartition(values, len(values) - n)[len(values) - n:])
+        else:
+            rows = np.arange(len(values))
+        return self.ranked(rows, column)
+
+    def above_threshold(self, column = "average_math", fraction = 0.8, max_score = MAX_SCORE, limit = None):
+        """
+        Return the schools whose score of a column is at least a fraction of the maximum score,
+        best first. With a limit, only the best limit of them are selected and sorted.
+        """
+        values = self.values(column)
+        rows = np.flatnonzero(values >= fraction * max_score)
+        if limit is not None and limit <= 0:
+            rows = rows[:0]
+        elif limit is not None and limit < len(rows):
+            rows = np.sort(rows[np.argpartition(values[rows], len(rows) - limit)[len(rows) - limit:]])
+        return self.ranked(rows, column)
+
+    def group_stats(self, by = "borough", column = COMBINED_COLUMN):
+        """
+        Return the number of rows, and the mean and standard deviation of a score column, per
+        group (per borough by default; "by" can also be a list such as ["year", "borough"]).
+        The three statistics come from a single grouped pass.
+        """
+        stats = self.scores(column).groupby([self.df[key] for key in np.atleast_1d(by)], observed = True).agg(["count", "mean", "std"])
+        name = "combined_SAT" if column == COMBINED_COLUMN else column
+        stats.columns = ["num_schools", f"avg_{name}", f"std_{name}"]
+        return stats
+
+    def largest_std(self, by = "borough", column = COMBINED_COLUMN):
+        """
+        Return the group(s) with the largest standard deviation of a score column, with their statistics.
+        """
+        stats = self.group_stats(by, column)
+        std = stats.iloc[:, 2]
+        return stats[std == std.max()]
+
+# Function 4: Visualize the data
+def plot_results(analysis, best_math_schools, top_schools, output_dir = "."):
+    """
+    Save the charts of the analysis. They are declared as chart specs and rendered in worker
+    processes; a chart whose data has not changed since the last run is not rendered again.
+    Bar charts only show the first 50 schools, so that large results stay readable.
+
+    Returns:
+    - results (dict): "rendered" or "unchanged" for every chart file.
+    """
+    combined_scores = analysis.combined_scores
+    specs = [
+        bar_chart(os.path.join(output_dir, "best_math_schools.png"), best_math_schools["school_name"], best_math_schools["average_math"],
+                  title = "Best Math Schools", xlabel = "School Name", ylabel = "Average Math Scores",
+                  figsize = (10, 6), rotation = 90, color = "lightgreen"),
+        bar_chart(os.path.join(output_dir, "top_10_schools_combined_SAT.png"), top_schools["school_name"], top_schools[COMBINED_COLUMN],
+                  title = "Top 10 Schools Based on Combined SAT Scores", xlabel = "School Name", ylabel = "Combined SAT Scores",
+                  figsize = (10, 6), rotation = 45, color = "skyblue"),
+        histogram(os.path.join(output_dir, "histogram_combined_SAT_scores.png"), combined_scores, bins = 10,
+                  title = "Histogram of Combined SAT Scores", xlabel = "Combined SAT Scores", ylabel = "Frequency",
+                  figsize = (10, 6), color = "salmon"),
+        box_plot(os.path.join(output_dir, "boxplot_combined_SAT_scores_by_borough.png"),
+                 {borough: scores.to_numpy() for borough, scores in combined_scores.groupby(analysis.df["borough"], observed = True)},
+                 title = "Box Plot of Combined SAT Scores by Borough", xlabel = "Borough", ylabel = "Combined SAT Scores",
+                 figsize = (10, 6))
     ]
-}
-
-# Creating DataFrame
-schools_df = pd.DataFrame(data)
-
-# Alternatively, you can load the data from a CSV file using the code below
-# schools_df = pd.read_csv("your file path here")
-
-# Data Cleaning Steps
-# Handling any missing values
-if schools_df.isnull().values.any():
-    schools_df.dropna(inplace=True)
-
-# Let's ensure the data types are correct
-if schools_df.dtypes["average_math"] != "int64":
-    schools_df["average_math"] = schools_df["average_math"].astype("int64")
-if schools_df.dtypes["average_reading"] != "int64":
-    schools_df["average_reading"] = schools_df["average_reading"].astype("int64")
-if schools_df.dtypes["average_writing"] != "int64":
-    schools_df["average_writing"] = schools_df["average_writing"].astype("int64")
-if schools_df.dtypes["borough"] != "object":
-    schools_df["borough"] = schools_df["borough"].astype("object")
-if schools_df.dtypes["school_name"] != "object":
-    schools_df["school_name"] = schools_df["school_name"].astype("object")
-
-# Let's handle any duplicates
-if schools_df.duplicated().any():
-    schools_df.drop_duplicates(inplace=True)
-
-# DATA ANALYSIS:
-# Let's identify schools with the best math results (at least 80% of the maximum possible score)
-max_math_score = 800
-threshold = 0.8 * max_math_score
-best_math_schools = schools_df[schools_df["average_math"] >= threshold]
-best_math_schools = best_math_schools[["school_name", "average_math"]].sort_values(by="average_math", ascending=False)
-print("Best Math Schools:")
-print(best_math_schools)
-best_math_schools.to_csv("best_math_schools.csv", index=False)  # This saves the best math schools to a CSV file
-
-# Let's determine the top 10 performing schools based on combined SAT scores.
-combined_SAT_scores = schools_df["average_math"] + schools_df["average_reading"] + schools_df["average_writing"]
-schools_df["combined_SAT_scores"] = combined_SAT_scores  # Adding a new column to the DataFrame
-top_10_schools_combined_SAT = schools_df[["school_name", "combined_SAT_scores"]].sort_values(by="combined_SAT_scores", ascending=False).head(10)
-print("Top 10 Performing Schools Based on Combined SAT Scores:")
-print(top_10_schools_combined_SAT)
-top_10_schools_combined_SAT.to_csv("top_10_schools_combined_SAT.csv", index=False)  # This saves the top 10 schools based on combined SAT scores to a CSV file
-
-# Let's find the borough with the largest standard deviation in combined SAT scores.
-borough_stats = schools_df.groupby("borough").agg(
-    num_schools=("school_name", "count"),  # Count the number of schools in each borough
-    avg_combined_SAT=("combined_SAT_scores", "mean"),  # Compute the mean of combined SAT scores for each borough
-    std_combined_SAT=("combined_SAT_scores", "std")  # Compute the standard deviation of combined SAT scores for each borough
-)
-
-largest_std_combined_SAT_borough = borough_stats[borough_stats["std_combined_SAT"] == borough_stats["std_combined_SAT"].max()]  # This finds the borough with the largest standard deviation in combined SAT scores
-print("Borough with the Largest Standard Deviation in Combined SAT Scores:")
-print(largest_std_combined_SAT_borough)
-largest_std_combined_SAT_borough.to_csv("largest_std_combined_SAT_borough.csv")  # This saves the borough with the largest standard deviation in combined SAT scores to a CSV file
-
-# DATA VISUALIZATION:
-# Bar chart of best math schools
-plt.figure(figsize=(10, 6))
-plt.bar(best_math_schools["school_name"], best_math_schools["average_math"], color="lightgreen")
-plt.xlabel("School Name")
-plt.ylabel("Average Math Scores")
-plt.title("Best Math Schools")
-plt.xticks(rotation = 90)
-plt.tight_layout()
-plt.savefig("best_math_schools.png")
-plt.show()
-
-# Bar chart of top 10 schools based on combined SAT scores
-plt.figure(figsize=(10, 6))
-plt.bar(top_10_schools_combined_SAT["school_name"], top_10_schools_combined_SAT["combined_SAT_scores"], color="skyblue")
-plt.xlabel("School Name")
-plt.ylabel("Combined SAT Scores")
-plt.title("Top 10 Schools Based on Combined SAT Scores")
-plt.xticks(rotation = 45)
-plt.tight_layout()
-plt.savefig("top_10_schools_combined_SAT.png")
-plt.show()
-
-# Histogram of combined SAT scores
-plt.figure(figsize=(10, 6))
-plt.hist(schools_df["combined_SAT_scores"], bins=10, color="salmon")
-plt.xlabel("Combined SAT Scores")
-plt.ylabel("Frequency")
-plt.title("Histogram of Combined SAT Scores")
-plt.tight_layout()
-plt.savefig("histogram_combined_SAT_scores.png")
-plt.show()
-
-# Box plot of combined SAT scores by borough
-plt.figure(figsize=(10, 6))
-schools_df.boxplot(column="combined_SAT_scores", by="borough")
-plt.xlabel("Borough")
-plt.ylabel("Combined SAT Scores")
-plt.title("Box Plot of Combined SAT Scores by Borough")
-plt.tight_layout()
-plt.savefig("boxplot_combined_SAT_scores_by_borough.png")
-plt.show()
+    return render_charts(specs)
+
+# Function 5: Run the analysis
+def run_analysis(df, output_dir = ".", top = 10, fraction = 0.8, plots = True):
+    """
+    Run the whole analysis on a dataset: clean it, find the best math schools, the top schools
+    by combined SAT scores and the borough with the largest standard deviation of combined
+    scores, print and save the results as CSV files, and save the charts.
+
+    Returns:
+    - results (dict): The three result DataFrames.
+    """
+    os.makedirs(output_dir, exist_ok = True)
+    analysis = SchoolsAnalysis(clean_schools(df))
+
+    # Schools with the best math results (at least 80% of the maximum possible score)
+    best_math_schools = analysis.above_threshold("average_math", fraction)
+    print("Best Math Schools:")
+    print(best_math_schools)
+    best_math_schools.to_csv(os.path.join(output_dir, "best_math_schools.csv"), index = False)
+
+    # Top performing schools based on combined SAT scores
+    top_schools = analysis.top_schools(top)
+    print(f"Top {top} Performing Schools Based on Combined SAT Scores:")
+    print(top_schools)
+    top_schools.to_csv(os.path.join(output_dir, "top_10_schools_combined_SAT.csv"), index = False)
+
+    # Borough with the largest standard deviation in combined SAT scores
+    largest_std_borough = analysis.largest_std()
+    print("Borough with the Largest Standard Deviation in Combined SAT Scores:")
+    print(largest_std_borough)
+    largest_std_borough.to_csv(os.path.join(output_dir, "largest_std_combined_SAT_borough.csv"))
+
+    if plots:
+        plot_results(analysis, best_math_schools, top_schools, output_dir)
+    return {"best_math_schools": best_math_schools, "top_schools": top_schools, "largest_std_borough": largest_std_borough}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Analyze the SAT scores of NYC schools.")
+    parser.add_argument("--csv", default = None, help = "CSV file of schools (default: a generated dataset)")
+    parser.add_argument("--schools", type = int, default = 100, help = "number of generated schools")
+    parser.add_argument("--years", type = int, nargs = 2, metavar = ("FIRST", "LAST"), default = None,
+                        help = "generate one row per school and year, for these years")
+    parser.add_argument("--seed", type = int, default = None)
+    parser.add_argument("--output-dir", default = ".")
+    parser.add_argument("--top", type = int, default = 10)
+    parser.add_argument("--no-plots", action = "store_true", help = "skip the charts")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        schools_df = load_schools(args.csv)
+    else:
+        years = range(args.years[0], args.years[1] + 1) if args.years else None
+        schools_df = generate_schools(args.schools, years, args.seed)
+    run_analysis(schools_df, args.output_dir, args.top, plots = not args.no_plots)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# Importing the necessary libraries
+import argparse
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from price_cleaning import PRICE_SENTINELS, interpolate_missing
+
+# Batch mode of the stock price analysis for a universe of symbols. The prices of all symbols are
+# laid out as one wide (date x symbol) matrix, so cleaning, daily returns and statistics run as
+# vectorized column operations instead of one pipeline per symbol. Large universes are split
+# into blocks of symbols that are processed in a process pool.
+
+def read_symbol_file(file_path):
+    """
+    Read the prices of one symbol from a CSV file with "date" and "stock_price" columns.
+
+    Parameters:
+    - file_path (str): Path of the CSV file; the file name (without extension) is the symbol.
+
+    Returns:
+    - df (DataFrame): Long-format prices with "symbol", "date" and "price" columns.
+    """
+    df = pd.read_csv(file_path, na_values = PRICE_SENTINELS, dtype = {"stock_price": "float64"}, parse_dates = ["date"])
+    df = df.rename(columns = {"stock_price": "price"})
+    df.insert(0, "symbol", os.path.splitext(os.path.basename(file_path))[0])
+    return df
+
+def read_long_file(file_path):
+    """
+    Read a long-format CSV file of (symbol, date, price) rows.
+
+    Parameters:
+    - file_path (str): Path of the CSV file; the price column may be named "price" or "stock_price".
+
+    Returns:
+    - df (DataFrame): Long-format prices with "symbol", "date" and "price" columns.
+    """
+    df = pd.read_csv(file_path, na_values = PRICE_SENTINELS, parse_dates = ["date"])
+    df = df.rename(columns = {"stock_price": "price"})
+    df["price"] = df["price"].astype("float64")
+    return df[["symbol", "date", "price"]]
+
+def to_wide(long_df):
+    """
+    Pivot long-format prices into a (date x symbol) matrix.
+
+    Returns:
+    - prices (DataFrame): Prices with one column per symbol; dates a symbol has no row for are NaN.
+    - present (DataFrame): True on the dates every symbol has a row for.
+    """
+    duplicated = long_df.duplicated(subset = ["symbol", "date"])
+    if duplicated.any():
+        examples = long_df.loc[duplicated, ["symbol", "date"]].head(3).itertuples(index = False)
+        raise ValueError(f"{int(duplicated.sum())} duplicate (symbol, date) rows, e.g. "
+                         + ", ".join(f"{symbol} {date:%Y-%m-%d}" for symbol, date in examples))
+    prices = long_df.pivot(index = "date", columns = "symbol", values = "price").sort_index()
+    present = long_df.assign(present = True).pivot(index = "date", columns = "symbol", values = "present")
+    present = present.reindex(index = prices.index, columns = prices.columns).notna()
+    return prices, present
+
+def clean_wide(prices, present):
+    """
+    Clean the price matrix like clean_data: linear interpolation of missing prices, per symbol
+    and over the rows of the symbol only, so the dates of other symbols do not add prices.
+    Dates a symbol has no row for stay NaN.
+    """
+    values = prices.to_numpy(dtype = np.float64, copy = True)
+    mask = present.to_numpy()
+    for column in range(values.shape[1]):
+        rows = np.flatnonzero(mask[:, column])
+        values[rows, column] = interpolate_missing(values[rows, column])
+    return pd.DataFrame(values, index = prices.index, columns = prices.columns)
+
+def calculate_wide_returns(prices, present):
+    """
+    Calculate the daily returns (%) of every symbol like calculate_daily_returns: between
+    consecutive rows of the symbol, and NaN on its first row and the dates it has no row for.
+    """
+    values = prices.to_numpy()
+    mask = present.to_numpy()
+    returns = np.full(values.shape, np.nan)
+    for column in range(values.shape[1]):
+        rows = np.flatnonzero(mask[:, column])
+        series = values[rows, column]
+        returns[rows[1:], column] = (series[1:] / series[:-1] - 1) * 100
+    return pd.DataFrame(returns, index = prices.index, columns = prices.columns)
+
+def wide_statistics(prices, returns):
+    """
+    Compute the statistics of perform_statistical_analysis for every symbol at once.
+
+    Returns:
+    - stats (DataFrame): One row per symbol with the mean, median and std of daily returns,
+      the high-return threshold, the number of days above it and the date range.
+    """
+    values = returns.to_numpy()
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis = 0)
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        mean = np.nansum(values, axis = 0) / counts
+        std = np.sqrt(np.nansum((values - mean) ** 2, axis = 0) / (counts - 1))
+    median = np.full(values.shape[1], np.nan)
+    has_returns = counts > 0
+    if has_returns.any():
+        median[has_returns] = np.nanmedian(values[:, has_returns], axis = 0)
+    threshold = mean + std
+    with np.errstate(invalid = "ignore"):
+        high_return_days = (values > threshold).sum(axis = 0)
+    dates = prices.index.to_numpy()
+    observed = prices.notna().to_numpy()
+    first = np.where(observed.any(axis = 0), observed.argmax(axis = 0), -1)
+    last = np.where(observed.any(axis = 0), len(dates) - 1 - observed[::-1].argmax(axis = 0), -1)
+    return pd.DataFrame({
+        "first_date": np.where(first >= 0, dates[first], np.datetime64("NaT")),
+        "last_date": np.where(last >= 0, dates[last], np.datetime64("NaT")),
+        "num_returns": counts,
+        "mean": mean,
+        "median": median,
+        "std": std,
+        "threshold": threshold,
+        "high_return_days": high_return_days
+    }, index = prices.columns)
+
+def analyze_long_frame(long_df):
+    """
+    Run cleaning, daily returns and statistics on long-format prices of several symbols.
+    """
+    prices, present = to_wide(long_df)
+    prices = clean_wide(prices, present)
+    returns = calculate_wide_returns(prices, present)
+    return wide_statistics(prices, returns)
+
+def analyze_symbol_files(file_paths):
+    """
+    Run the batch analysis on a block of per-symbol CSV files.
+    """
+    return analyze_long_frame(pd.concat([read_symbol_file(file_path) for file_path in file_paths], ignore_index = True))
+
+def run_batch_analysis(path, output_path = None, workers = 1, block_size = 250):
+    """
+    Run the stock price analysis for every symbol of a universe and combine the statistics.
+
+    Parameters:
+    - path (str): A directory of per-symbol CSV files (date, stock_price) or a long-format
+      CSV file of (symbol, date, price) rows.
+    - output_path (str): Where to write the combined statistics table (optional).
+    - workers (int): Number of worker processes (1 runs in-process).
+    - block_size (int): Number of symbols per block of work.
+
+    Returns:
+    - stats (DataFrame): One row of statistics per symbol.
+    """
+    if os.path.isdir(path):
+        file_paths = sorted(glob.glob(os.path.join(path, "*.csv")))
+        blocks = [file_paths[i:i + block_size] for i in range(0, len(file_paths), block_size)]
+        task = analyze_symbol_files
+    else:
+        long_df = read_long_file(path)
+        codes, _ = pd.factorize(long_df["symbol"])
+        blocks = [block for _, block in long_df.groupby(codes // block_size)]
+        task = analyze_long_frame
+
+    if workers == 1:
+        results = [task(block) for block in blocks]
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            results = list(executor.map(task, blocks))
+    stats = pd.concat(results).sort_index()
+    stats.index.name = "symbol"
+
+    if output_path:
+        stats.to_csv(output_path)
+    return stats
+
+def main():
+    """
+    Main function to execute the batch stock price analysis.
+    """
+    parser = argparse.ArgumentParser(description = "Run the stock price analysis over many symbols.")
+    parser.add_argument("path", help = "directory of per-symbol CSV files or long-format (symbol, date, price) CSV file")
+    parser.add_argument("--output", default = "data/batch_stats.csv")
+    parser.add_argument("--workers", type = int, default = os.cpu_count())
+    parser.add_argument("--block-size", type = int, default = 250)
+    args = parser.parse_args()
+
+    stats = run_batch_analysis(args.path, args.output, args.workers, args.block_size)
+    print(f"Statistics of {len(stats)} symbols saved to '{args.output}'.")
+    print(stats.describe())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# Importing the necessary libraries
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_analysis import run_batch_analysis
+from monte_carlo import run_monte_carlo
+from rolling_indicators import RollingIndicatorState, rolling_indicators
+from stock_price_analysis import clean_data, load_clean_data, load_data
+
+# Benchmarks for the stock price analysis
+
+def benchmark_monte_carlo(num_paths = 1_000_000, num_days = 252, workers = 1, batch_size = 20_000):
+    """
+    Measure the throughput of the Monte Carlo engine.
+
+    Parameters:
+    - num_paths (int): Number of simulated paths.
+    - num_days (int): Number of days per path.
+    - workers (int): Number of worker processes.
+    - batch_size (int): Paths per batch.
+
+    Returns:
+    - summary (dict): The Monte Carlo summary, including "paths_per_second".
+    """
+    summary = run_monte_carlo(100.0, 0.05, 2.0, num_paths = num_paths, num_days = num_days,
+                              batch_size = batch_size, workers = workers)
+    print(f"Monte Carlo {num_paths} x {num_days}, {workers} worker(s): {summary['elapsed_seconds']:.2f} s, "
+          f"{summary['paths_per_second']:,.0f} paths/s")
+    return summary
+
+def pandas_rolling_indicators(prices, windows = (5, 20, 60), include_median = True):
+    """
+    Reference implementation of rolling_indicators as a chain of pandas rolling/ewm calls.
+
+    Parameters:
+    - prices (DataFrame): One column of prices per series.
+    - windows (tuple): Window sizes in days.
+    - include_median (bool): Whether to compute the rolling median.
+
+    Returns:
+    - indicators (dict): Name -> DataFrame of indicator values.
+    """
+    returns = prices.pct_change() * 100
+    indicators = {"drawdown": prices / prices.cummax() - 1}
+    for window in windows:
+        rolling = prices.rolling(window)
+        indicators[f"sma_{window}"] = rolling.mean()
+        indicators[f"volatility_{window}"] = returns.rolling(window).std()
+        indicators[f"zscore_{window}"] = (prices - rolling.mean()) / rolling.std()
+        indicators[f"ewma_{window}"] = prices.ewm(span = window, adjust = False).mean()
+        if include_median:
+            indicators[f"median_{window}"] = rolling.median()
+    return indicators
+
+def benchmark_rolling(num_series = 1_000, num_days = 5_000, windows = (5, 20, 60)):
+    """
+    Compare rolling_indicators with the equivalent pandas rolling chains on random price series.
+
+    Parameters:
+    - num_series (int): Number of price series (tickers).
+    - num_days (int): Number of days per series.
+    - windows (tuple): Window sizes in days.
+
+    Returns:
+    - timings (dict): Seconds taken by each implementation, and the incremental update rate.
+    """
+    rng = np.random.default_rng(42)
+    prices = 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, size = (num_days, num_series)), axis = 0)
+
+    print(f"Rolling indicators, {num_series} series x {num_days} days, windows {list(windows)}:")
+    timings = {}
+    for include_median in (True, False):
+        label = "all indicators" if include_median else "without the median"
+        start = time.perf_counter()
+        rolling_indicators(prices, windows, include_median)
+        vectorized = time.perf_counter() - start
+        start = time.perf_counter()
+        pandas_rolling_indicators(pd.DataFrame(prices), windows, include_median)
+        chained = time.perf_counter() - start
+        timings[label] = {"rolling_indicators": vectorized, "pandas": chained}
+        print(f"  {label}: rolling_indicators {vectorized:.2f} s, pandas rolling chains {chained:.2f} s "
+              f"({chained / vectorized:.1f}x)")
+
+    # Incremental updates: one tick for every series at a time
+    state = RollingIndicatorState(num_series, windows)
+    ticks = min(num_days, 1_000)
+    start = time.perf_counter()
+    for day in range(ticks):
+        state.update(prices[day])
+    incremental = time.perf_counter() - start
+    timings["incremental_ticks_per_second"] = ticks / incremental
+    print(f"  RollingIndicatorState: {ticks / incremental:,.0f} ticks/s for {num_series} series "
+          f"({ticks * num_series / incremental:,.0f} series updates/s)")
+    return timings
+
+def generate_universe(file_path, num_symbols = 500, num_days = 7_300, seed = 42):
+    """
+    Write a long-format (symbol, date, price) CSV file of random prices with sentinel anomalies.
+
+    Parameters:
+    - file_path (str): Output CSV file.
+    - num_symbols (int): Number of symbols.
+    - num_days (int): Number of days per symbol.
+    - seed (int): Seed of the random generator.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2000-01-01", periods = num_days, freq = "D")
+    for i in range(num_symbols):
+        prices = 100 * np.cumprod(rng.lognormal(0.0005, 0.02, size = num_days)).astype(object)
+        anomalies = rng.choice(num_days, size = num_days // 20, replace = False)
+        prices[anomalies] = rng.choice(["missing", "error", ""], size = len(anomalies))
+        pd.DataFrame({"symbol": f"SYM{i:05d}", "date": dates, "price": prices}).to_csv(
+            file_path, mode = "w" if i == 0 else "a", header = i == 0, index = False)
+
+def benchmark_batch(file_path, num_symbols = 500, num_days = 7_300, workers = 1):
+    """
+    Measure the throughput of the multi-symbol batch analysis.
+
+    Parameters:
+    - file_path (str): Long-format CSV file of the universe (generated if it does not exist).
+    - num_symbols (int): Number of symbols to generate.
+    - num_days (int): Number of days per symbol to generate.
+    - workers (int): Number of worker processes.
+
+    Returns:
+    - elapsed (float): Seconds taken by run_batch_analysis.
+    """
+    if not os.path.exists(file_path):
+        generate_universe(file_path, num_symbols, num_days)
+    start = time.perf_counter()
+    stats = run_batch_analysis(file_path, workers = workers)
+    elapsed = time.perf_counter() - start
+    print(f"Batch analysis of {len(stats)} symbols with {workers} worker(s): {elapsed:.2f} s "
+          f"({len(stats) / elapsed:,.0f} symbols/s)")
+    return elapsed
+
+def legacy_load_and_clean(file_path):
+    """
+    The original loading path: an object "stock_price" column, then replace, astype and interpolate.
+    """
+    df = pd.read_csv(file_path)
+    df["date"] = pd.to_datetime(df["date"])
+    df["stock_price"] = df["stock_price"].replace(["missing", "error", None], np.nan)
+    df["stock_price"] = df["stock_price"].astype(float)
+    df["stock_price"] = df["stock_price"].interpolate(method = "linear")
+    return df
+
+def benchmark_ingestion(data_dir, num_files = 20, num_days = 50_000, seed = 42):
+    """
+    Compare the original loading path with the typed ingestion and with the memory-mapped cache.
+
+    Parameters:
+    - data_dir (str): Directory of the per-symbol CSV files (generated if it does not exist).
+    - num_files (int): Number of symbol files to generate.
+    - num_days (int): Number of days per file to generate.
+    - seed (int): Seed of the random generator.
+
+    Returns:
+    - timings (dict): Seconds taken by each loading path for all files.
+    """
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+        rng = np.random.default_rng(seed)
+        dates = pd.date_range("1900-01-01", periods = num_days, freq = "D").strftime("%Y-%m-%d")
+        for i in range(num_files):
+            prices = (100 * np.cumprod(rng.lognormal(0.0002, 0.02, size = num_days))).astype(str).astype(object)
+            anomalies = rng.choice(num_days, size = num_days // 20, replace = False)
+            prices[anomalies] = rng.choice(["missing", "error", ""], size = len(anomalies))
+            pd.DataFrame({"date": dates, "stock_price": prices}).to_csv(
+                os.path.join(data_dir, f"SYM{i:05d}.csv"), index = False)
+    file_paths = sorted(os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.endswith(".csv"))
+    cache_dir = os.path.join(data_dir, "cache")
+    # Build the cache once so that the timed run measures warm loads
+    for file_path in file_paths:
+        load_clean_data(file_path, cache_dir)
+
+    loaders = {
+        "original": legacy_load_and_clean,
+        "typed ingestion": lambda file_path: clean_data(load_data(file_path)),
+        "memory-mapped cache": lambda file_path: load_clean_data(file_path, cache_dir)
+    }
+    rows = 0
+    timings = {}
+    for label, loader in loaders.items():
+        start = time.perf_counter()
+        rows = sum(len(loader(file_path)) for file_path in file_paths)
+        timings[label] = time.perf_counter() - start
+    print(f"Loading and cleaning {len(file_paths)} files, {rows} rows:")
+    for label, elapsed in timings.items():
+        print(f"  {label}: {elapsed:.3f} s ({timings['original'] / elapsed:.1f}x)")
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks for the stock price analysis.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    monte_carlo_parser = subparsers.add_parser("monte-carlo", help = "Throughput of the Monte Carlo engine")
+    monte_carlo_parser.add_argument("--paths", type = int, default = 1_000_000)
+    monte_carlo_parser.add_argument("--days", type = int, default = 252)
+    monte_carlo_parser.add_argument("--workers", type = int, default = 1)
+    monte_carlo_parser.add_argument("--batch-size", type = int, default = 20_000)
+
+    rolling_parser = subparsers.add_parser("rolling", help = "Rolling indicators versus pandas rolling chains")
+    rolling_parser.add_argument("--series", type = int, default = 1_000)
+    rolling_parser.add_argument("--days", type = int, default = 5_000)
+    rolling_parser.add_argument("--windows", type = int, nargs = "+", default = [5, 20, 60])
+
+    batch_parser = subparsers.add_parser("batch", help = "Throughput of the multi-symbol batch analysis")
+    batch_parser.add_argument("--file", default = "data/universe.csv")
+    batch_parser.add_argument("--symbols", type = int, default = 500)
+    batch_parser.add_argument("--days", type = int, default = 7_300)
+    batch_parser.add_argument("--workers", type = int, default = 1)
+
+    ingestion_parser = subparsers.add_parser("ingestion", help = "Loading and cleaning paths of the price CSV files")
+    ingestion_parser.add_argument("--dir", default = "data/ingestion")
+    ingestion_parser.add_argument("--files", type = int, default = 20)
+    ingestion_parser.add_argument("--days", type = int, default = 50_000)
+
+    args = parser.parse_args()
+    if args.command == "monte-carlo":
+        benchmark_monte_carlo(args.paths, args.days, args.workers, args.batch_size)
+    elif args.command == "rolling":
+        benchmark_rolling(args.series, args.days, tuple(args.windows))
+    elif args.command == "batch":
+        benchmark_batch(args.file, args.symbols, args.days, args.workers)
+    elif args.command == "ingestion":
+        benchmark_ingestion(args.dir, args.files, args.days)
+
+if __name__ == "__main__":
+    main()
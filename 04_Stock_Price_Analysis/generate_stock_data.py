@@ -1,39 +1,58 @@
 # generate_stock_data.py
 
+import argparse
 import numpy as np
 import pandas as pd
 import os
 
-# Generate date range for 20 years (2000-01-01 to 2019-12-31)
-date_range = pd.date_range(start='2000-01-01', end='2019-12-31', freq='D')
-
-# Generate random stock prices using a log-normal distribution
-np.random.seed(42)  # For reproducibility
-prices = np.random.lognormal(mean=0.0005, sigma=0.02, size=len(date_range)).cumprod() * 100
-
-# Convert prices to a Pandas Series
-prices_with_anomalies = pd.Series(prices)
-
-# Introduce anomalies and missing values
-num_anomalies = int(0.05 * len(prices_with_anomalies))  # 5% anomalies
-anomalies_indices = np.random.choice(len(prices_with_anomalies), size=num_anomalies, replace=False)
-
-for idx in anomalies_indices:
-    anomaly_type = np.random.choice(['missing', 'error', None])
-    prices_with_anomalies.iloc[idx] = anomaly_type
-
-# Create DataFrame
-data = {
-    'date': date_range,
-    'stock_price': prices_with_anomalies
-}
-
-df = pd.DataFrame(data)
-
-# Ensure the 'data' directory exists
-os.makedirs('data', exist_ok=True)
-
-# Save DataFrame to CSV
-df.to_csv('data/stock_data.csv', index=False)
-
-print("Dataset generated and saved to 'data/stock_data.csv'")
\ No newline at end of file
+def generate_stock_data(start='2000-01-01', end='2019-12-31', num_days=None, seed=42):
+    """
+    Generate daily stock prices with a log-normal random walk, and replace 5% of them with the
+    'missing' and 'error' anomalies or an empty value. With num_days, the dates are the num_days
+    days from start, and end is not used.
+    """
+    # Generate the date range (by default 20 years, 2000-01-01 to 2019-12-31); dates at a
+    # resolution of seconds go well past the year 2262, the limit of nanosecond timestamps
+    if num_days is None:
+        date_range = pd.date_range(start=start, end=end, freq='D', unit='s')
+    else:
+        date_range = pd.date_range(start=start, periods=num_days, freq='D', unit='s')
+
+    # Generate random stock prices using a log-normal distribution
+    rng = np.random.RandomState(seed)  # For reproducibility
+    prices = rng.lognormal(mean=0.0005, sigma=0.02, size=len(date_range)).cumprod() * 100
+
+    # Prices are kept as their shortest exact text, in an object Series that can also hold the anomalies
+    prices_with_anomalies = pd.Series(prices.astype(str), dtype=object)
+
+    # Introduce anomalies and missing values, drawn in one call (the same draws as one call per anomaly)
+    num_anomalies = int(0.05 * len(prices_with_anomalies))  # 5% anomalies
+    anomalies_indices = rng.choice(len(prices_with_anomalies), size=num_anomalies, replace=False)
+    anomaly_types = rng.choice(np.array(['missing', 'error', None], dtype=object), size=num_anomalies)
+    prices_with_anomalies.iloc[anomalies_indices] = anomaly_types
+
+    # Create DataFrame
+    return pd.DataFrame({
+        'date': date_range,
+        'stock_price': prices_with_anomalies
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the synthetic stock price dataset.')
+    parser.add_argument('--days', type=int, default=None, help='number of days (default: 2000-01-01 to 2019-12-31)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='data/stock_data.csv')
+    args = parser.parse_args()
+
+    df = generate_stock_data(num_days=args.days, seed=args.seed)
+
+    # Ensure the output directory exists
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+
+    # Save DataFrame to CSV
+    df.to_csv(args.output, index=False)
+
+    print(f"Dataset generated and saved to '{args.output}'")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+# Importing the necessary libraries
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Monte Carlo engine for the random walk model of simulate_stock_prices. Paths are generated in
+# memory-bounded batches (optionally in a process pool); each batch is reduced to its terminal
+# prices and to per-day histograms, so the full N x T matrix of paths is never stored.
+
+def simulate_paths(starting_price, mean, std, num_paths, num_days, rng):
+    """
+    Simulate a batch of price paths with the random walk model.
+
+    Parameters:
+    - starting_price (float): The last known stock price.
+    - mean (float): Mean of daily returns (%).
+    - std (float): Standard deviation of daily returns (%).
+    - num_paths (int): Number of paths in the batch.
+    - num_days (int): Number of days to simulate.
+    - rng (Generator): The random number generator of the batch.
+
+    Returns:
+    - paths (ndarray): A (num_paths, num_days) array of simulated prices.
+    """
+    growth = 1 + rng.normal(loc = mean, scale = std, size = (num_paths, num_days)) / 100
+    # A daily return of -100% or less leaves nothing: the price stays at 0 from then on
+    np.maximum(growth, 0, out = growth)
+    np.cumprod(growth, axis = 1, out = growth)
+    growth *= starting_price
+    return growth
+
+def band_edges(mean, std, num_days, num_bins, width = 8):
+    """
+    Histogram bin edges of the log price ratio for every day, centred on its expected value.
+
+    Returns:
+    - lower (ndarray): Lower edge of the first bin for every day.
+    - bin_width (ndarray): Bin width for every day.
+    """
+    days = np.arange(1, num_days + 1)
+    drift = days * np.log1p(mean / 100)
+    spread = np.sqrt(days) * std / 100 * width
+    return drift - spread, 2 * spread / num_bins
+
+def simulate_batch_summary(batch_index, batch_size, starting_price, mean, std, num_days, seed, num_bins):
+    """
+    Simulate one batch and reduce it to its terminal prices and per-day histograms.
+
+    Parameters:
+    - batch_index (int): Index of the batch; its random stream is derived from (seed, batch_index).
+    - batch_size (int): Number of paths in the batch.
+
+    Returns:
+    - terminal_prices (ndarray): The last price of every path.
+    - histograms (ndarray): A (num_days, num_bins) array of counts of the log price ratio.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (batch_index,)))
+    paths = simulate_paths(starting_price, mean, std, batch_size, num_days, rng)
+    terminal_prices = paths[:, -1].copy()
+
+    lower, bin_width = band_edges(mean, std, num_days, num_bins)
+    paths /= starting_price
+    # Paths that reached 0 have a log ratio of -inf and fall in the first bin
+    with np.errstate(divide = "ignore"):
+        np.log(paths, out = paths)
+    paths -= lower
+    paths /= bin_width
+    np.nan_to_num(paths, copy = False, nan = 0, posinf = num_bins - 1, neginf = 0)
+    bins = np.clip(paths, 0, num_bins - 1).astype(np.int64)
+    bins += np.arange(num_days) * num_bins
+    histograms = np.bincount(bins.ravel(), minlength = num_days * num_bins).reshape(num_days, num_bins)
+    return terminal_prices, histograms
+
+def histogram_percentiles(histograms, lower, bin_width, percentiles, starting_price):
+    """
+    Estimate per-day price percentiles from the merged histograms (linear within a bin).
+
+    Returns:
+    - bands (dict): Percentile -> array of prices for every day.
+    """
+    cumulative = np.cumsum(histograms, axis = 1)
+    total = cumulative[:, -1:]
+    bands = {}
+    for p in percentiles:
+        target = total[:, 0] * p / 100
+        index = np.minimum((cumulative < target[:, None]).sum(axis = 1), histograms.shape[1] - 1)
+        before = np.where(index > 0, cumulative[np.arange(len(index)), np.maximum(index - 1, 0)], 0)
+        in_bin = histograms[np.arange(len(index)), index]
+        fraction = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0)
+        bands[p] = starting_price * np.exp(lower + (index + fraction) * bin_width)
+    return bands
+
+def run_monte_carlo(starting_price, mean, std, num_paths = 1_000_000, num_days = 252, batch_size = 20_000,
+                    workers = 1, seed = 42, confidence_levels = (0.95, 0.99), percentiles = (5, 25, 50, 75, 95),
+                    num_bins = 2_000):
+    """
+    Run a Monte Carlo simulation of the random walk model and summarize it.
+
+    Parameters:
+    - starting_price (float): The last known stock price.
+    - mean (float): Mean of daily returns (%).
+    - std (float): Standard deviation of daily returns (%).
+    - num_paths (int): Number of simulated paths.
+    - num_days (int): Number of days per path.
+    - batch_size (int): Paths per batch; memory use is about 8 * batch_size * num_days bytes per worker.
+    - workers (int): Number of worker processes (1 runs in-process).
+    - seed (int): Base seed; every batch gets an independent stream, so results do not depend on workers.
+    - confidence_levels (tuple): Confidence levels of the VaR and expected shortfall.
+    - percentiles (tuple): Percentiles of the per-day price bands.
+    - num_bins (int): Histogram bins per day used to estimate the bands.
+
+    Returns:
+    - summary (dict): Terminal price statistics, VaR, expected shortfall, percentile bands and throughput.
+    """
+    start = time.perf_counter()
+    batch_sizes = [min(batch_size, num_paths - offset) for offset in range(0, num_paths, batch_size)]
+    args = [(i, size, starting_price, mean, std, num_days, seed, num_bins) for i, size in enumerate(batch_sizes)]
+    terminal_prices = []
+    histograms = np.zeros((num_days, num_bins), dtype = np.int64)
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        results = executor.map(simulate_batch_summary, *zip(*args)) if executor else (simulate_batch_summary(*arg) for arg in args)
+        for batch_terminal_prices, batch_histograms in results:
+            terminal_prices.append(batch_terminal_prices)
+            histograms += batch_histograms
+    finally:
+        if executor:
+            executor.shutdown()
+    terminal_prices = np.concatenate(terminal_prices)
+    elapsed = time.perf_counter() - start
+
+    # Losses are measured relative to the starting price at the end of the horizon
+    losses = starting_price - terminal_prices
+    value_at_risk = {}
+    expected_shortfall = {}
+    for level in confidence_levels:
+        var = np.quantile(losses, level)
+        value_at_risk[level] = var
+        expected_shortfall[level] = losses[losses >= var].mean()
+
+    lower, bin_width = band_edges(mean, std, num_days, num_bins)
+    return {
+        "num_paths": num_paths,
+        "num_days": num_days,
+        "terminal_mean": terminal_prices.mean(),
+        "terminal_median": np.median(terminal_prices),
+        "terminal_std": terminal_prices.std(ddof = 1),
+        "value_at_risk": value_at_risk,
+        "expected_shortfall": expected_shortfall,
+        "percentile_bands": histogram_percentiles(histograms, lower, bin_width, percentiles, starting_price),
+        "elapsed_seconds": elapsed,
+        "paths_per_second": num_paths / elapsed
+    }
@@ -0,0 +1,282 @@
+# Importing the necessary libraries
+import argparse
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from price_cleaning import interpolate_missing
+from stock_price_analysis import calculate_daily_returns, clean_data, load_data, perform_statistical_analysis
+
+# Online version of perform_statistical_analysis for live price feeds. Prices arrive one at a
+# time or in micro-batches; missing prices are interpolated once the next valid price arrives,
+# the mean and standard deviation of daily returns use Welford's algorithm (Chan's formula for
+# micro-batches), the median uses the P-square estimator, and days above the threshold are
+# flagged as they arrive. Memory stays bounded by the longest gap and the alert buffer.
+
+class P2Quantile:
+    """
+    P-square estimator of one quantile (Jain and Chlamtac, 1985): five markers are adjusted with
+    piecewise-parabolic interpolation as values arrive, so memory and time per value are O(1).
+    """
+
+    def __init__(self, p = 0.5):
+        self.p = p
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+        self.count = 0
+
+    def update(self, x):
+        """
+        Add one value.
+        """
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        # Find the cell of the new value, extending the extreme markers if needed
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """
+        Return the current estimate (exact while fewer than six values have been seen).
+        """
+        if self.count == 0:
+            return np.nan
+        if self.count <= 5:
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+class OnlineReturnStatistics:
+    """
+    Online statistics of the daily returns of a price feed.
+
+    Parameters:
+    - max_alerts (int): Number of most recent high-return days kept in memory.
+
+    The statistics match perform_statistical_analysis on the cleaned history: mean and std up
+    to floating-point rounding, the median up to the error of the P-square estimator. A day is
+    flagged as a high-return day when its return is above the threshold (mean + std) of the
+    returns seen before it; the batch analysis uses the threshold of the whole history instead.
+    """
+
+    def __init__(self, max_alerts = 1_000):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.median = P2Quantile(0.5)
+        self.alerts = deque(maxlen = max_alerts)
+        self.last_price = None
+        self.pending_dates = []
+
+    def threshold(self):
+        """
+        Return the current high-return threshold: mean + std of the returns seen so far.
+        """
+        return self.mean + self.std() if self.count > 1 else np.nan
+
+    def std(self):
+        """
+        Return the sample standard deviation (ddof = 1) of the returns seen so far.
+        """
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def _add_return(self, date, daily_return):
+        threshold = self.threshold()
+        if daily_return > threshold:
+            self.alerts.append((date, daily_return))
+        self.count += 1
+        delta = daily_return - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (daily_return - self.mean)
+        self.median.update(daily_return)
+
+    def update(self, date, price):
+        """
+        Add the price of one day; a NaN price is interpolated when the next valid price arrives.
+        """
+        if price is None or price != price:
+            if self.last_price is not None:
+                self.pending_dates.append(date)
+            return
+        previous = self.last_price
+        if previous is not None:
+            # Fill the gap linearly, like clean_data, then add the returns of the gap days in order
+            gap = len(self.pending_dates) + 1
+            for i, gap_date in enumerate(self.pending_dates, start = 1):
+                gap_price = self.last_price + (price - self.last_price) * i / gap
+                self._add_return(gap_date, (gap_price / previous - 1) * 100)
+                previous = gap_price
+            self._add_return(date, (price / previous - 1) * 100)
+        self.pending_dates = []
+        self.last_price = price
+
+    def update_batch(self, dates, prices):
+        """
+        Add the prices of several consecutive days at once.
+
+        The mean and variance of the batch are combined with the running ones (Chan et al.), and
+        the batch is checked against the threshold from before the batch.
+        """
+        dates = pd.DatetimeIndex(dates)
+        prices = np.asarray(prices, dtype = np.float64)
+        if self.last_price is None:
+            # Leading missing prices have no previous price and no return
+            valid = np.flatnonzero(~np.isnan(prices))
+            if len(valid) == 0:
+                return
+            self.last_price = prices[valid[0]]
+            dates, prices = dates[valid[0] + 1:], prices[valid[0] + 1:]
+
+        # Prepend the last valid price and the pending gap, and keep a trailing gap pending
+        valid = np.flatnonzero(~np.isnan(prices))
+        if len(valid) == 0:
+            self.pending_dates.extend(dates)
+            return
+        end = valid[-1] + 1
+        series = np.concatenate([[self.last_price], np.full(len(self.pending_dates), np.nan), prices[:end]])
+        interpolate_missing(series)
+        returns = (series[1:] / series[:-1] - 1) * 100
+        return_dates = list(self.pending_dates) + list(dates[:end])
+
+        threshold = self.threshold()
+        for index in np.flatnonzero(returns > threshold):
+            self.alerts.append((return_dates[index], returns[index]))
+        batch_count = len(returns)
+        batch_mean = returns.mean()
+        batch_m2 = ((returns - batch_mean) ** 2).sum()
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean += delta * batch_count / total
+        self.m2 += batch_m2 + delta * delta * self.count * batch_count / total
+        self.count = total
+        for daily_return in returns:
+            self.median.update(daily_return)
+
+        self.last_price = series[-1]
+        self.pending_dates = list(dates[end:])
+
+    def finalize(self):
+        """
+        Close a trailing gap: clean_data carries the last valid price forward, so those days
+        have a return of 0.
+        """
+        for date in self.pending_dates:
+            self._add_return(date, 0.0)
+        self.pending_dates = []
+
+    def result(self):
+        """
+        Return the statistics like perform_statistical_analysis.
+
+        Returns:
+        - stats (dict): Mean, median, std and threshold of the daily returns seen so far.
+        - high_return_days (list): The most recent flagged days, as "%Y-%m-%d" strings.
+        """
+        stats = {
+            "mean": self.mean if self.count else np.nan,
+            "median": self.median.value(),
+            "std": self.std(),
+            "threshold": self.threshold()
+        }
+        return stats, [pd.Timestamp(date).strftime("%Y-%m-%d") for date, _ in self.alerts]
+
+def compare_with_batch(file_path, batch_size = None):
+    """
+    Stream a price file through OnlineReturnStatistics and compare it with the batch analysis.
+
+    Parameters:
+    - file_path (str): The path to the CSV file containing stock data.
+    - batch_size (int): Micro-batch size (None feeds the prices one at a time).
+
+    Returns:
+    - errors (dict): Absolute and relative error of every statistic, the rank error of the median
+      (how far its quantile in the batch returns is from 0.5), and the overlap of the flagged days
+      with the batch high-return days.
+    """
+    raw = load_data(file_path)
+    df = calculate_daily_returns(clean_data(raw.copy()))
+    batch_stats, batch_days = perform_statistical_analysis(df)
+
+    online = OnlineReturnStatistics(max_alerts = len(raw))
+    dates, prices = raw["date"], raw["stock_price"].to_numpy()
+    if batch_size is None:
+        for date, price in zip(dates, prices):
+            online.update(date, price)
+    else:
+        for start in range(0, len(raw), batch_size):
+            online.update_batch(dates[start:start + batch_size], prices[start:start + batch_size])
+    online.finalize()
+    online_stats, online_days = online.result()
+
+    errors = {}
+    for key, value in batch_stats.items():
+        error = abs(online_stats[key] - value)
+        errors[key] = {"batch": value, "online": online_stats[key], "abs_error": error, "rel_error": error / abs(value)}
+    returns = df["daily_return"].dropna().to_numpy()
+    errors["median"]["rank_error"] = abs((returns < online_stats["median"]).mean() - 0.5)
+    errors["high_return_days"] = {
+        "batch": len(batch_days),
+        "online": len(online_days),
+        "common": len(set(batch_days) & set(online_days))
+    }
+    return errors
+
+def main():
+    """
+    Main function to check the online statistics against the batch analysis.
+    """
+    parser = argparse.ArgumentParser(description = "Compare the online statistics of daily returns with the batch analysis.")
+    parser.add_argument("--file", default = "data/stock_data.csv")
+    parser.add_argument("--batch-size", type = int, default = None, help = "micro-batch size (default: one price at a time)")
+    args = parser.parse_args()
+
+    errors = compare_with_batch(args.file, args.batch_size)
+    for key in ["mean", "median", "std", "threshold"]:
+        error = errors[key]
+        print(f"{key:>9}: batch {error['batch']:.6f}, online {error['online']:.6f}, "
+              f"absolute error {error['abs_error']:.2e}, relative error {error['rel_error']:.2e}")
+    print(f"median rank error: {errors['median']['rank_error']:.4f}")
+    days = errors["high_return_days"]
+    print(f"high-return days: {days['batch']} in batch, {days['online']} flagged online, {days['common']} in both")
+
+if __name__ == "__main__":
+    main()
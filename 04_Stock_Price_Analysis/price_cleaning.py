@@ -0,0 +1,25 @@
+# Importing the necessary libraries
+import numpy as np
+
+# Cleaning helpers shared by the single-symbol pipeline (stock_price_analysis.py), its online
+# version (online_statistics.py) and the batch mode (batch_analysis.py).
+
+# Values of the price column that mean "no price"
+PRICE_SENTINELS = ["missing", "error"]
+
+def interpolate_missing(values):
+    """
+    Linearly interpolate the NaN values of a 1D float array in place, by position, like
+    Series.interpolate(method = "linear"): leading NaNs stay NaN, trailing NaNs take the last value.
+
+    Parameters:
+    - values (ndarray): A writable float array.
+
+    Returns:
+    - values (ndarray): The same array, interpolated.
+    """
+    missing = np.isnan(values)
+    if missing.any() and not missing.all():
+        known = np.flatnonzero(~missing)
+        values[missing] = np.interp(np.flatnonzero(missing), known, values[known], left = np.nan)
+    return values
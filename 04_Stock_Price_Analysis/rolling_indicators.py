@@ -0,0 +1,224 @@
+# Importing the necessary libraries
+import numpy as np
+import pandas as pd
+
+# Rolling-window indicators for one or many price series. The batch functions work on a
+# (num_days, num_series) array and use cumulative sums, so every window size costs O(1) per
+# day and per series once the prefix sums are built (the rolling median, which has no such
+# trick, costs O(log window));
+# RollingIndicatorState updates the same indicators tick by tick.
+
+def as_2d(values):
+    """
+    View a 1D series as a single-column 2D array.
+    """
+    values = np.asarray(values, dtype = np.float64)
+    return values[:, None] if values.ndim == 1 else values
+
+def prefix_sums(values):
+    """
+    Prefix sums shared by all window sizes: of the values, of their squares and of the NaN count.
+
+    Parameters:
+    - values (ndarray): A (num_days, num_series) array; NaN marks missing values.
+
+    Returns:
+    - prefix (dict): "sums" and "squares" of (value - reference), "missing" (None without NaN),
+      each with a leading row of zeros, and the per-series "reference".
+    """
+    missing = np.isnan(values)
+    has_missing = missing.any()
+    # Centre every series on its mean to limit cancellation in the sums of squares
+    with np.errstate(invalid = "ignore"):
+        reference = np.nanmean(values, axis = 0) if has_missing else values.mean(axis = 0)
+    reference = np.where(np.isnan(reference), 0, reference)
+    centred = values - reference
+    if has_missing:
+        centred[missing] = 0
+
+    shape = (len(values) + 1, values.shape[1])
+    sums = np.zeros(shape)
+    squares = np.zeros(shape)
+    np.cumsum(centred, axis = 0, out = sums[1:])
+    np.multiply(centred, centred, out = centred)
+    np.cumsum(centred, axis = 0, out = squares[1:])
+    missing_counts = None
+    if has_missing:
+        missing_counts = np.zeros(shape, dtype = np.int64)
+        np.cumsum(missing, axis = 0, out = missing_counts[1:])
+    return {"sums": sums, "squares": squares, "missing": missing_counts, "reference": reference}
+
+def rolling_mean_std(prefix, window):
+    """
+    Rolling mean and sample standard deviation (ddof = 1) from the prefix sums, like pandas
+    rolling(window).mean()/std(): NaN until the window is full or when it contains a NaN.
+    """
+    shape = (len(prefix["sums"]) - 1, prefix["sums"].shape[1])
+    mean = np.full(shape, np.nan)
+    std = np.full(shape, np.nan)
+    if window > shape[0]:
+        return mean, std
+    sums = prefix["sums"][window:] - prefix["sums"][:-window]
+    squares = prefix["squares"][window:] - prefix["squares"][:-window]
+    if prefix["missing"] is not None:
+        incomplete = prefix["missing"][window:] - prefix["missing"][:-window] > 0
+        sums[incomplete] = np.nan
+    window_mean = sums / window
+    mean[window - 1:] = window_mean + prefix["reference"]
+    if window > 1:
+        squares -= sums * window_mean
+        np.maximum(squares, 0, out = squares)
+        std[window - 1:] = np.sqrt(squares / (window - 1))
+    return mean, std
+
+def rolling_median(values, window):
+    """
+    Rolling median over a window. This has no cumulative-sum form, so it uses pandas' skiplist
+    implementation (O(log window) per day and per series).
+    """
+    return pd.DataFrame(values).rolling(window).median().to_numpy()
+
+def ewma(values, span):
+    """
+    Exponentially weighted moving average, like pandas ewm(span = span, adjust = False).mean().
+    The recursion runs over days and is vectorized over series; NaN inputs keep the previous average.
+    """
+    alpha = 2 / (span + 1)
+    result = np.empty(values.shape)
+    current = values[0].copy()
+    result[0] = current
+    for t in range(1, len(values)):
+        row = values[t]
+        current = np.where(np.isnan(current), row, np.where(np.isnan(row), current, current + alpha * (row - current)))
+        result[t] = current
+    return result
+
+def drawdown(values):
+    """
+    Drawdown from the running maximum, as a fraction (0 at a new high, negative below it).
+    """
+    return values / np.fmax.accumulate(values, axis = 0) - 1
+
+def daily_returns(values):
+    """
+    Daily returns in %, like pct_change() * 100, with NaN on the first day.
+    """
+    returns = np.full(values.shape, np.nan)
+    returns[1:] = (values[1:] / values[:-1] - 1) * 100
+    return returns
+
+def rolling_indicators(prices, windows = (5, 20, 60), include_median = True):
+    """
+    Compute the rolling indicators of one or many price series for several window sizes.
+
+    Parameters:
+    - prices (ndarray): A (num_days,) or (num_days, num_series) array of prices.
+    - windows (tuple): Window sizes in days.
+    - include_median (bool): Whether to compute the rolling median, the most expensive indicator.
+
+    Returns:
+    - indicators (dict): Name -> array with the same shape as the 2D prices:
+      "drawdown", and for every window w "sma_w", "volatility_w" (rolling std of daily returns),
+      "zscore_w" (price relative to its rolling mean and std), "ewma_w" (span w) and "median_w".
+    """
+    prices = as_2d(prices)
+    price_prefix = prefix_sums(prices)
+    return_prefix = prefix_sums(daily_returns(prices))
+    indicators = {"drawdown": drawdown(prices)}
+    for window in windows:
+        sma, price_std = rolling_mean_std(price_prefix, window)
+        indicators[f"sma_{window}"] = sma
+        indicators[f"volatility_{window}"] = rolling_mean_std(return_prefix, window)[1]
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            indicators[f"zscore_{window}"] = (prices - sma) / price_std
+        indicators[f"ewma_{window}"] = ewma(prices, window)
+        if include_median:
+            indicators[f"median_{window}"] = rolling_median(prices, window)
+    return indicators
+
+class RollingIndicatorState:
+    """
+    Incremental version of rolling_indicators for live prices of many series.
+
+    Every call to update() takes one price per series. The rolling mean and variance of every
+    window are updated in O(1) per series (add the new value, remove the one leaving the window);
+    the EWMA and drawdown are O(1) as well. The rolling median needs the window contents and costs
+    O(window) per update. Prices are expected to be cleaned (no NaN).
+    """
+
+    def __init__(self, num_series = 1, windows = (5, 20, 60)):
+        self.windows = tuple(windows)
+        self.num_series = num_series
+        self.capacity = max(self.windows) + 1
+        self.prices = np.full((self.capacity, num_series), np.nan)
+        self.returns = np.full((self.capacity, num_series), np.nan)
+        self.count = 0
+        self.running_max = np.full(num_series, -np.inf)
+        self.ewma = {window: np.full(num_series, np.nan) for window in self.windows}
+        # Running mean and sum of squared deviations of prices and returns for every window
+        self.moments = {
+            (name, window): [np.zeros(num_series), np.zeros(num_series)]
+            for name in ("price", "return") for window in self.windows
+        }
+
+    def _slide(self, name, window, new, old, count):
+        # Welford-style update of one window: add the new value and remove the one leaving it
+        mean, m2 = self.moments[(name, window)]
+        if count <= window:
+            delta = new - mean
+            mean += delta / count
+            m2 += delta * (new - mean)
+        else:
+            new_mean = mean + (new - old) / window
+            m2 += (new - old) * (new - new_mean + old - mean)
+            mean[:] = new_mean
+        return mean, m2
+
+    def update(self, prices):
+        """
+        Add one price per series and return the latest value of every indicator.
+
+        Parameters:
+        - prices (array-like): The new price of every series.
+
+        Returns:
+        - indicators (dict): Name -> array of the latest values (same names as rolling_indicators).
+        """
+        prices = np.broadcast_to(np.asarray(prices, dtype = np.float64), (self.num_series,))
+        position = self.count % self.capacity
+        previous = self.prices[(self.count - 1) % self.capacity] if self.count else np.full(self.num_series, np.nan)
+        self.count += 1
+        self.prices[position] = prices
+        self.returns[position] = (prices / previous - 1) * 100
+        self.running_max = np.fmax(self.running_max, prices)
+
+        indicators = {"drawdown": prices / self.running_max - 1}
+        for window in self.windows:
+            old = self.prices[(self.count - 1 - window) % self.capacity]
+            mean, m2 = self._slide("price", window, prices, old, self.count)
+            full = self.count >= window
+            std = np.sqrt(np.maximum(m2, 0) / (window - 1)) if window > 1 else np.full(self.num_series, np.nan)
+            indicators[f"sma_{window}"] = mean.copy() if full else np.full(self.num_series, np.nan)
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                indicators[f"zscore_{window}"] = (prices - mean) / std if full else np.full(self.num_series, np.nan)
+
+            # Returns start on the second price, so their windows lag by one update
+            if self.count > 1:
+                old_return = self.returns[(self.count - 1 - window) % self.capacity]
+                _, return_m2 = self._slide("return", window, self.returns[position], old_return, self.count - 1)
+            full_returns = self.count - 1 >= window
+            indicators[f"volatility_{window}"] = (
+                np.sqrt(np.maximum(return_m2, 0) / (window - 1)) if full_returns and window > 1 else np.full(self.num_series, np.nan)
+            )
+
+            alpha = 2 / (window + 1)
+            current = self.ewma[window]
+            self.ewma[window] = np.where(np.isnan(current), prices, current + alpha * (prices - current))
+            indicators[f"ewma_{window}"] = self.ewma[window].copy()
+
+            if full:
+                rows = (self.count - 1 - np.arange(window)) % self.capacity
+                indicators[f"median_{window}"] = np.median(self.prices[rows], axis = 0)
+            else:
+                indicators[f"median_{window}"] = np.full(self.num_series, np.nan)
+        return indicators
@@ -1,25 +1,54 @@
 # Importing the necessary libraries
+import functools
+import hashlib
+import inspect
+import os
+import re
+import sys
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-def load_data(file_path):
+import price_cleaning
+from price_cleaning import PRICE_SENTINELS, interpolate_missing
+from monte_carlo import run_monte_carlo
+from rolling_indicators import rolling_indicators
+
+# The chart rendering service is shared by the projects of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.chart_rendering import histogram, line_chart, render_charts
+from shared.instrumentation import instrumented, profile_run
+from shared.task_runner import TaskRunner, file_input, status_summary, task
+
+@instrumented
+def load_data(file_path, date_index = False):
     """
     Load stock data from a CSV file.
 
+    The "missing" and "error" sentinels are read as NaN by the CSV parser, so the "stock_price"
+    column comes in as float64 directly, and the dates are parsed with their known format.
+
     Parameters:
     - file_path (str): The path to the CSV file containing stock data.
+    - date_index (bool): Whether to also use the dates as the index of the DataFrame.
 
     Returns:
     - df (DataFrame): The loaded data as a Pandas DataFrame.
     """
-    # Reading the data from CSV file
-    df = pd.read_csv(file_path)
-    # Cobvert the "date" column to datetime
-    df["date"] = pd.to_datetime(df["date"])
+    # Reading the data from CSV file, with typed columns; "round_trip" parses the prices to the
+    # same floats as float() on the strings
+    df = pd.read_csv(
+        file_path,
+        na_values = PRICE_SENTINELS,
+        dtype = {"stock_price": "float64"},
+        float_precision = "round_trip",
+        parse_dates = ["date"],
+        date_format = "%Y-%m-%d"
+    )
+    if date_index:
+        df.index = pd.DatetimeIndex(df["date"], name = None)
     return df
 
+@instrumented
 def clean_data(df):
     """
     Clean the stock data.
@@ -30,14 +59,89 @@ def clean_data(df):
     Returns:
     - df (DataFrame): The cleaned stock data as a Pandas DataFrame
     """
-    # Replacing Invalid Entries with np.nan
-    df["stock_price"] = df["stock_price"].replace(["missing", "error", None], np.nan)
-    # Converting the "stock_price" column to float
-    df["stock_price"] = df["stock_price"].astype(float)
-    # Check and handle missing value
-    df["stock_price"] = df["stock_price"].interpolate(method="linear") # Interpolate missing values
+    if not pd.api.types.is_float_dtype(df["stock_price"]):
+        # Replacing Invalid Entries with np.nan (data not read by load_data)
+        df["stock_price"] = df["stock_price"].replace(PRICE_SENTINELS + [None], np.nan)
+        # Converting the "stock_price" column to float
+        df["stock_price"] = df["stock_price"].astype(float)
+    # Check and handle missing value: one pass over a float copy of the column
+    df["stock_price"] = interpolate_missing(df["stock_price"].to_numpy(dtype = np.float64, copy = True))
     return df
 
+@functools.lru_cache(maxsize = None)
+def cleaning_code_hash():
+    """
+    Return a hash of the source of the code that loads and cleans the prices.
+    """
+    digest = hashlib.sha256()
+    for code in (load_data, clean_data, price_cleaning):
+        digest.update(inspect.getsource(code).encode())
+    return digest.hexdigest()
+
+def price_cache_key(file_path):
+    """
+    Return the key of the cleaned arrays of a CSV file: a hash of the size and modification time
+    of the file, and of the code that loads and cleans it, so that editing the cleaning rebuilds them.
+    """
+    stat = os.stat(file_path)
+    key = f"{stat.st_size}:{stat.st_mtime_ns}:{cleaning_code_hash()}"
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+def price_cache_paths(file_path, cache_dir):
+    """
+    Return the paths of the memory-mappable date and price arrays cached for a CSV file.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    key = price_cache_key(file_path)
+    return os.path.join(cache_dir, f"{name}.{key}.dates.npy"), os.path.join(cache_dir, f"{name}.{key}.prices.npy")
+
+def save_array_atomically(path, array):
+    """
+    Save an array to a .npy file through a temporary file, so that an interrupted save leaves no file to reuse.
+    """
+    temporary_path = path + ".tmp.npy"
+    np.save(temporary_path, array)
+    os.replace(temporary_path, path)
+
+@instrumented
+def load_clean_data(file_path, cache_dir = None, date_index = False):
+    """
+    Load and clean the stock data, optionally through a cache of memory-mapped NumPy arrays.
+
+    On the first run the cleaned dates and prices are saved as .npy files in cache_dir; later runs
+    memory-map them instead of parsing the CSV again, until the CSV file or the cleaning code changes
+    (see price_cache_key). Outdated arrays of the file are removed when new ones are saved.
+
+    Parameters:
+    - file_path (str): The path to the CSV file containing stock data.
+    - cache_dir (str): Directory of the cached arrays (None disables the cache).
+    - date_index (bool): Whether to also use the dates as the index of the DataFrame.
+
+    Returns:
+    - df (DataFrame): The cleaned stock data; with the cache, its "stock_price" column is read-only.
+    """
+    if cache_dir is None:
+        return clean_data(load_data(file_path, date_index))
+
+    dates_path, prices_path = price_cache_paths(file_path, cache_dir)
+    if not (os.path.exists(dates_path) and os.path.exists(prices_path)):
+        df = clean_data(load_data(file_path))
+        os.makedirs(cache_dir, exist_ok = True)
+        save_array_atomically(dates_path, df["date"].to_numpy())
+        save_array_atomically(prices_path, df["stock_price"].to_numpy())
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        for other in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, other)
+            if re.fullmatch(re.escape(name) + r"(\.[0-9a-f]{16})?\.(dates|prices)\.npy", other) and path not in (dates_path, prices_path):
+                os.remove(path)
+
+    dates = np.load(dates_path, mmap_mode = "r")
+    df = pd.DataFrame({"date": dates, "stock_price": np.load(prices_path, mmap_mode = "r")}, copy = False)
+    if date_index:
+        df.index = pd.DatetimeIndex(df["date"], name = None)
+    return df
+
+@instrumented
 def calculate_daily_returns(df):
     """
     Calculate the daily returns of the stock.
@@ -50,9 +154,28 @@ def calculate_daily_returns(df):
     """
     # Calculate the daily returns
     df["daily_return"] = df["stock_price"].pct_change() * 100
-    df.loc[0, "daily_return"] = np.nan  # Set first day's return to NaN
+    df.iloc[0, df.columns.get_loc("daily_return")] = np.nan  # Set first day's return to NaN
+    return df
+
+@instrumented
+def calculate_rolling_indicators(df, windows = (5, 20, 60)):
+    """
+    Add rolling indicators of the stock price as new columns.
+
+    Parameters:
+    - df (DataFrame): The stock data with daily returns.
+    - windows (tuple): Window sizes in days.
+
+    Returns:
+    - df (DataFrame): The stock data with "drawdown" and, for every window w, "sma_w",
+      "volatility_w", "zscore_w", "ewma_w" and "median_w" columns.
+    """
+    indicators = rolling_indicators(df["stock_price"].to_numpy(), windows)
+    for name, values in indicators.items():
+        df[name] = values[:, 0]
     return df
 
+@instrumented
 def perform_statistical_analysis(df):
     """
    Perform statistical analysis on daily returns.
@@ -80,6 +203,7 @@ def perform_statistical_analysis(df):
     }
     return stats, high_return_days
 
+@instrumented
 def simulate_stock_prices(df, stats, num_days = 30):
     """Simulate future stock prices using a random walk model.
 
@@ -101,80 +225,71 @@ def simulate_stock_prices(df, stats, num_days = 30):
         scale = stats["std"],
         size = num_days
     )
-    # Calculae simulated stock prices
-    simulated_prices = [starting_price]
-    for r in simulated_returns:
-        next_price = simulated_prices[-1] * (1 + r / 100)
-        simulated_prices.append(next_price)
+    # Calculae simulated stock prices: the cumulative product starts from the starting price,
+    # so the multiplications happen in the same order as a day-by-day loop
+    growth = np.concatenate([[starting_price], 1 + simulated_returns / 100])
     # Remove the starting price to match the number of days
-    simulated_prices = simulated_prices[1: ]
+    simulated_prices = np.cumprod(growth)[1: ].tolist()
     return simulated_prices
 
-def visualize_data(df, simulated_prices):
+@instrumented
+def visualize_data(df, simulated_prices, renderer = None):
     """
     Create and save plots of stock prices, daily returns, and simulated prices.
 
+    The plots are declared as chart specs and rendered in worker processes. The price series is
+    downsampled to the points that keep its shape (LTTB), the histogram is sent as its bin counts,
+    and a plot whose data has not changed since the last run is not rendered again.
+
     Parameters:
     - df (DataFrame): The stock data with daily returns.
     - simulated_prices (list): The simulated future stock prices.
+    - renderer (ChartRenderer, optional): A renderer to submit the plots to, without waiting for
+      them; by default, the plots are rendered before the function returns.
     """
-    # Set the style for Seaborn
-    sns.set_theme(style = "darkgrid")
-
-    # Plot the stock prices over time
-    plt.figure(figsize = (12, 6))
-    sns.lineplot(data = df, x = "date", y = "stock_price", marker = "o")
-    plt.title("Stock Prices Over Time")
-    plt.xlabel("Date")
-    plt.ylabel("Stock Price")
-    plt.xticks(rotation = 45)
-    plt.tight_layout()
-    plt.savefig("visualizations/stock_prices_over_time.png")
-    plt.close()
-
-    # Plot the histogram of daily returns
-    plt.figure(figsize = (12, 6))
-    sns.histplot(df["daily_return"].dropna(), bins = 50, kde = True)
-    plt.title("Histogram of Daily Returns")
-    plt.xlabel("Daily Return (%)")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig("visualizations/histogram_of_daily_returns.png")
-    plt.close()
-
-    # Plot simulated stock prices
-    plt.figure(figsize = (12, 6))
-    sns.lineplot(x = range(1, len(simulated_prices) + 1), y = simulated_prices, color = "green", marker = "o")
-    plt.title("Simulated Stock Price Path for the Next 30 Days")
-    plt.xlabel("Day")
-    plt.ylabel("Stock Price")
-    plt.tight_layout()
-    plt.savefig("visualizations/simulated_stock_price.png")
-    plt.close()
+    specs = [
+        # Plot the stock prices over time (the markers are only drawn on short series)
+        line_chart("visualizations/stock_prices_over_time.png", df["date"].to_numpy(), df["stock_price"].to_numpy(), marker = "o",
+                   title = "Stock Prices Over Time", xlabel = "Date", ylabel = "Stock Price", rotation = 45, style = "darkgrid"),
+        # Plot the histogram of daily returns
+        histogram("visualizations/histogram_of_daily_returns.png", df["daily_return"].to_numpy(), bins = 50, kde = True,
+                  title = "Histogram of Daily Returns", xlabel = "Daily Return (%)", ylabel = "Frequency", style = "darkgrid", alpha = 0.75),
+        # Plot simulated stock prices
+        line_chart("visualizations/simulated_stock_price.png", np.arange(1, len(simulated_prices) + 1), simulated_prices, marker = "o",
+                   title = "Simulated Stock Price Path for the Next 30 Days", xlabel = "Day", ylabel = "Stock Price",
+                   style = "darkgrid", color = "green")
+    ]
+    if renderer is None:
+        render_charts(specs)
+    else:
+        for spec in specs:
+            renderer.submit(spec)
 
-def main():
+@instrumented
+def estimate_risk(df, stats, num_paths = 100_000, num_days = 30):
     """
-    Main function to execute the stock price analysis and simulation.
-    """
-    # step 1: Load the data
-    df = load_data("data/stock_data.csv")
-
-    # step 2: Clean the data
-    df = clean_data(df)
-
-    # step 3: Calculate daily returns
-    df = calculate_daily_returns(df)
+    Estimate the risk of the stock over the simulated horizon from many paths (see monte_carlo.py).
 
-    # step 4: Perform statistical analysis
-    stats, high_return_days = perform_statistical_analysis(df)
+    Parameters:
+    - df (DataFrame): The stock data with daily returns.
+    - stats (dict): Statistical measures of daily returns.
+    - num_paths (int): Number of simulated paths.
+    - num_days (int): Number of days to simulate.
 
-    # step 5: Simulate future stock prices
-    simulated_prices = simulate_stock_prices(df, stats, num_days = 30)
+    Returns:
+    - risk (dict): The value at risk, expected shortfall and percentile bands of the paths.
+    """
+    return run_monte_carlo(df["stock_price"].iloc[-1], stats["mean"], stats["std"], num_paths = num_paths, num_days = num_days)
 
-    # step 6: Visualize the data
-    visualize_data(df, simulated_prices)
+def report_insights(stats, high_return_days, risk):
+    """
+    Print the insights and the interpretation of the simulation.
 
-    # step 7: Print insights and interpretation
+    Parameters:
+    - stats (dict): Statistical measures of daily returns.
+    - high_return_days (list): A list of dates with high daily returns.
+    - risk (dict): The Monte Carlo risk estimates.
+    """
     print("Statistical Analysis of Daily Returns:")
     print(f"mean of daily returns: {stats['mean']:.2f}%")
     print(f"median of daily returns: {stats['median']:.2f}%")
@@ -183,10 +298,49 @@ def main():
     print("Days when the daily return was above one standard deviation from the mean:")
     for day in high_return_days:
         print(day)
-    
+
+    print("\nMonte Carlo Risk Estimates over 30 Days:")
+    for level in risk["value_at_risk"]:
+        print(f"{level:.0%} value at risk: {risk['value_at_risk'][level]:.2f}, expected shortfall: {risk['expected_shortfall'][level]:.2f}")
+    print(f"5th-95th percentile band of the price on day 30: {risk['percentile_bands'][5][-1]:.2f} - {risk['percentile_bands'][95][-1]:.2f}")
+
     print("\nInterpretation of Simulation:")
     print("Based on historical daily returns, the randomly simulated stock price path over next the 30 days shows an initial rise in the first 10 days, before starting to experience a non-stop decline.")
     print("This provides an estimate but does not guarantee actual future performance due to market volatility and unforeseen factors.")
 
+@profile_run("stock_price_analysis")
+def main():
+    """
+    Main function to execute the stock price analysis and simulation.
+
+    The steps are declared as tasks (see shared/task_runner.py): the results of a step are stored
+    in data/cache/tasks and reused until its code, its parameters, the stock data or a step it
+    depends on changes, and the steps that do not depend on each other (the simulation and the
+    risk estimate) run concurrently.
+    With the PIPELINE_PROFILE_DIR environment variable set, every step is profiled (see shared/instrumentation.py).
+    """
+    tasks = [
+        # step 1 and 2: Load and clean the data (memory-mapped from data/cache on repeated runs)
+        task("data", load_clean_data, params = {"file_path": file_input("data/stock_data.csv"), "cache_dir": "data/cache", "date_index": True},
+             cache = False),
+        # step 3: Calculate daily returns
+        task("returns", calculate_daily_returns, inputs = ["data"]),
+        # step 4: Perform statistical analysis
+        task("statistics", perform_statistical_analysis, inputs = ["returns"], outputs = ["stats", "high_return_days"]),
+        # step 5: Simulate future stock prices
+        task("simulated_prices", simulate_stock_prices, inputs = ["returns", "stats"], params = {"num_days": 30}),
+        # step 6: Estimate the risk of the stock over the simulated horizon from many paths
+        task("risk", estimate_risk, inputs = ["returns", "stats"], params = {"num_paths": 100_000, "num_days": 30}),
+        # step 7: Visualize the data (the plots are rendered in a process pool, started from the main
+        # thread); the step is run again if one of the plots was deleted
+        task("plots", visualize_data, inputs = ["returns", "simulated_prices"], main_thread = True,
+             files = ["visualizations/stock_prices_over_time.png", "visualizations/histogram_of_daily_returns.png",
+                      "visualizations/simulated_stock_price.png"]),
+        # step 8: Print insights and interpretation (on every run)
+        task("insights", report_insights, inputs = ["stats", "high_return_days", "risk"], cache = False)
+    ]
+    statuses = TaskRunner("data/cache/tasks").run(tasks)
+    print(f"\n{status_summary(statuses)}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
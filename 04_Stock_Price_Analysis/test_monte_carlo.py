@@ -0,0 +1,12 @@
+# Importing the necessary libraries
+import numpy as np
+
+from monte_carlo import run_monte_carlo
+
+# Regression test: with a high standard deviation, some daily returns are -100% or less
+
+def test_high_std_paths_stop_at_zero():
+    summary = run_monte_carlo(100.0, 0.0, 50.0, num_paths = 2_000, num_days = 252, batch_size = 500)
+    assert summary["terminal_median"] == 0
+    assert all(np.isfinite(band).all() for band in summary["percentile_bands"].values())
+    assert np.isclose(summary["value_at_risk"][0.95], 100.0)
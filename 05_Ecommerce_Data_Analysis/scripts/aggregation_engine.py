@@ -0,0 +1,159 @@
+# Importing the necessary libraries
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Aggregation engine: every registered group-by/measure pair is computed on row partitions of
+# the dataset (in a process pool when more than one worker is used) and the partial results
+# are merged. Sums and counts are mergeable, so the merged result equals a single-pass groupby.
+
+# Registered aggregations: name -> spec dictionary
+AGGREGATIONS = {}
+
+# Function 1: Register a group-by/measure pair
+def register_aggregation(name, by, value = None, how = "sum", finalize = None):
+    """
+    Register an aggregation computed by run_aggregations.
+
+    - by: a column name, a list of column names, or a module-level function returning the group keys
+    - value: the measured column ("None" counts rows)
+    - how: "sum" or "count"
+    - finalize: optional function applied to the merged result (e.g. top-N, unstack)
+
+    Key and finalize functions must be module-level functions so they can be sent to worker processes.
+    """
+    if how not in ("sum", "count"):
+        raise ValueError(f"Unsupported aggregation '{how}', expected 'sum' or 'count'")
+    if how == "sum" and value is None:
+        raise ValueError("A 'sum' aggregation needs a value column")
+    AGGREGATIONS[name] = {"by": by, "value": value, "how": how, "finalize": finalize}
+
+def unregister_aggregation(name):
+    """
+    Remove a registered aggregation.
+    """
+    AGGREGATIONS.pop(name, None)
+
+# Function 2: Key and finalize functions of the default aggregations
+def transaction_month(df):
+    """
+    Group key: the month of the transaction.
+    """
+    return df["transaction_date"].dt.to_period("M")
+
+def top_10(series):
+    """
+    Keep the ten largest groups.
+    """
+    return series.sort_values(ascending = False).head(10)
+
+def sort_descending(series):
+    """
+    Sort the groups by decreasing value, like value_counts.
+    """
+    return series.sort_values(ascending = False)
+
+def unstack_gender(series):
+    """
+    Turn category/gender sums into the category x gender pivot table.
+    """
+    return series.unstack("gender")
+
+def monthly_series(series):
+    """
+    Turn monthly buckets into the same series as resample("ME").sum(), empty months included.
+    """
+    series.index = series.index.to_timestamp(how = "end").normalize()
+    series.index.name = "transaction_date"
+    return series.resample("ME").sum()
+
+def register_default_aggregations():
+    """
+    Register the aggregations used by aggregated_analysis and visualize_data.
+    """
+    register_aggregation("top_products", "product_id", "price", "sum", top_10)
+    register_aggregation("sales_by_gender", "gender", "price", "sum")
+    register_aggregation("category_gender_pivot", ["category", "gender"], "price", "sum", unstack_gender)
+    register_aggregation("category_counts", "category", None, "count", sort_descending)
+    register_aggregation("monthly_sales", transaction_month, "price", "sum", monthly_series)
+
+# Function 3: Partial aggregates of one partition
+def aggregate_partition(df, specs):
+    """
+    Compute every aggregation on one partition of the rows.
+    """
+    partials = {}
+    for name, spec in specs.items():
+        keys = spec["by"](df) if callable(spec["by"]) else spec["by"]
+        grouped = df.groupby(keys, observed = True)
+        if spec["how"] == "count":
+            partials[name] = grouped.size()
+        else:
+            partials[name] = grouped[spec["value"]].sum()
+    return partials
+
+def merge_partials(partials_list):
+    """
+    Merge the partial aggregates of all partitions.
+    """
+    merged = {}
+    for partials in partials_list:
+        for name, partial in partials.items():
+            merged[name] = partial if name not in merged else merged[name].add(partial, fill_value = 0)
+    return merged
+
+# Partitions are inherited by forked workers instead of being pickled
+_SHARED_FRAME = None
+
+def _aggregate_shared_rows(bounds, specs):
+    start, stop = bounds
+    return aggregate_partition(_SHARED_FRAME.iloc[start:stop], specs)
+
+# Function 4: Run all aggregations
+def run_aggregations(df, workers = None, partition_rows = 1_000_000, names = None):
+    """
+    Compute the registered aggregations in a single pass over row partitions of the dataset.
+
+    Parameters:
+    - df (DataFrame): The dataset.
+    - workers (int): Number of worker processes (default: all cores, 1 runs in-process).
+    - partition_rows (int): Maximum number of rows per partition.
+    - names (list): Aggregations to compute (default: all registered ones).
+
+    Returns:
+    - results (dict): The finalized result of every aggregation.
+    """
+    global _SHARED_FRAME
+    specs = {name: AGGREGATIONS[name] for name in (names or AGGREGATIONS)}
+    workers = workers or os.cpu_count() or 1
+    num_partitions = max(workers, int(np.ceil(len(df) / partition_rows)), 1)
+    edges = np.linspace(0, len(df), num_partitions + 1).astype(int)
+    # An empty dataset is one empty partition, which gives empty results of the right types
+    bounds = [(start, stop) for start, stop in zip(edges[:-1], edges[1:]) if stop > start] or [(0, 0)]
+
+    if workers == 1 or len(bounds) <= 1:
+        partials_list = [aggregate_partition(df.iloc[start:stop], specs) for start, stop in bounds]
+    elif "fork" in mp.get_all_start_methods():
+        _SHARED_FRAME = df
+        try:
+            with ProcessPoolExecutor(workers, mp_context = mp.get_context("fork")) as executor:
+                partials_list = list(executor.map(_aggregate_shared_rows, bounds, [specs] * len(bounds)))
+        finally:
+            _SHARED_FRAME = None
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            partitions = [df.iloc[start:stop] for start, stop in bounds]
+            partials_list = list(executor.map(aggregate_partition, partitions, [specs] * len(bounds)))
+
+    merged = merge_partials(partials_list)
+    results = {}
+    for name, spec in specs.items():
+        result = merged[name].sort_index()
+        if spec["how"] == "count":
+            result = result.astype("int64")
+        results[name] = spec["finalize"](result) if spec["finalize"] else result
+    return results
+
+register_default_aggregations()
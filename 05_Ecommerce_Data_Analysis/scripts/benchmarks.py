@@ -0,0 +1,105 @@
+# Importing the necessary libraries
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+# Benchmarks for the e-commerce analysis. Every measurement runs in a fresh Python process
+# so that the peak RSS of one loading path is not hidden by the other.
+
+def measure_load(mode, filepath):
+    """
+    Load the dataset with the given mode and return the load time and peak RSS.
+    """
+    from data_analysis import load_data
+
+    start = time.perf_counter()
+    df = load_data(filepath, use_cache = mode == "cache")
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is reported in kilobytes on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "mode": mode,
+        "rows": len(df),
+        "load_seconds": round(elapsed, 3),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "memory_usage_mb": round(df.memory_usage(deep = True).sum() / 2**20, 1)
+    }
+
+def run_in_subprocess(*args):
+    """
+    Run one measurement of this script in a fresh interpreter and return its JSON result.
+    """
+    output = subprocess.run(
+        [sys.executable, __file__, *args],
+        check = True, capture_output = True, text = True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def benchmark_cache(filepath, repeat = 3):
+    """
+    Compare loading the CSV with loading the columnar cache.
+    """
+    # Build (or validate) the cache once so that the timed runs measure warm loads
+    run_in_subprocess("measure-load", "cache", filepath)
+    results = []
+    for mode in ["csv", "cache"]:
+        runs = [run_in_subprocess("measure-load", mode, filepath) for _ in range(repeat)]
+        best = min(runs, key = lambda run: run["load_seconds"])
+        results.append(best)
+        print(f"{mode:>5}: {best['load_seconds']:.3f} s, peak RSS {best['peak_rss_mb']:.0f} MB, "
+              f"DataFrame {best['memory_usage_mb']:.0f} MB ({best['rows']} rows)")
+    return results
+
+def benchmark_aggregation(filepath, workers_list = (1, 2, 4, 8, 16)):
+    """
+    Compare the separate aggregation passes with the aggregation engine for several worker counts.
+    """
+    from aggregation_engine import run_aggregations
+    from data_analysis import compute_aggregates, load_data
+
+    df = load_data(filepath, use_cache = True)
+    start = time.perf_counter()
+    compute_aggregates(df)
+    df["category"].value_counts()
+    df.set_index("transaction_date").resample("ME")["price"].sum()
+    baseline = time.perf_counter() - start
+    print(f"separate passes: {baseline:.3f} s ({len(df)} rows)")
+
+    results = {"rows": len(df), "separate_passes_seconds": round(baseline, 3), "engine_seconds": {}}
+    for workers in workers_list:
+        start = time.perf_counter()
+        run_aggregations(df, workers = workers)
+        elapsed = time.perf_counter() - start
+        results["engine_seconds"][workers] = round(elapsed, 3)
+        print(f"engine, {workers:>2} workers: {elapsed:.3f} s (speedup {baseline / elapsed:.2f}x)")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks for the e-commerce data analysis.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    cache_parser = subparsers.add_parser("cache", help = "CSV versus columnar cache load time and peak RSS")
+    cache_parser.add_argument("--csv", default = "../data/ecommerce_data.csv")
+    cache_parser.add_argument("--repeat", type = int, default = 3)
+
+    aggregation_parser = subparsers.add_parser("aggregation", help = "Aggregation engine scaling with the number of workers")
+    aggregation_parser.add_argument("--csv", default = "../data/ecommerce_data.csv")
+    aggregation_parser.add_argument("--workers", type = int, nargs = "+", default = [1, 2, 4, 8, 16])
+
+    measure_parser = subparsers.add_parser("measure-load", help = argparse.SUPPRESS)
+    measure_parser.add_argument("mode", choices = ["csv", "cache"])
+    measure_parser.add_argument("csv")
+
+    args = parser.parse_args()
+    if args.command == "cache":
+        benchmark_cache(args.csv, args.repeat)
+    elif args.command == "aggregation":
+        benchmark_aggregation(args.csv, args.workers)
+    elif args.command == "measure-load":
+        print(json.dumps(measure_load(args.mode, args.csv)))
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,32 @@
 # Importing the necessary libraries
-import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+import sys
+
+from aggregation_engine import run_aggregations
+from data_cache import load_cached_data
+
+# The chart rendering service is shared by the projects of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.chart_rendering import bar_chart, histogram, line_chart, render_charts
+from shared.instrumentation import instrumented, profile_run
+from shared.task_runner import TaskRunner, file_input, status_summary, task
 
 # Defining functions for each step of the data analysis: We will modularize the code by creating functions for each major step
 # Function 1: load's the dataset
-def load_data(filepath):
+@instrumented
+def load_data(filepath, use_cache = False):
     """
     Load the e-commerce dataset from a CSV file.
+    With use_cache, the typed columnar cache of the CSV is used instead (see data_cache.py).
     """
+    if use_cache:
+        return load_cached_data(filepath)
     df = pd.read_csv(filepath, parse_dates = ["transaction_date"])
     return df
 
 # Function 2: Perform intial data exploration
+@instrumented
 def initial_data_exploration(df):
     """
     Perform intial data exploration on the dataset.
@@ -27,6 +39,7 @@ def initial_data_exploration(df):
     print(df.describe(include  = "all"))
 
 # Function 3: Data validation and Summarization
+@instrumented
 def data_validation(df):
     """
     Validate data and check for inconsistencies.
@@ -38,6 +51,7 @@ def data_validation(df):
     print(f"The number of duplicate transactions is: {duplicates}")
 
 #Function 4: Handling Missing Values
+@instrumented
 def handle_missing_values(df):
     """
     Handle missing values in the dataset.
@@ -48,6 +62,7 @@ def handle_missing_values(df):
     return df 
 
 # Function 5: Identifying and handilng outliers
+@instrumented
 def handle_outliers(df):
     """
     Identify and handle outliers in price.
@@ -60,63 +75,50 @@ def handle_outliers(df):
     upper_bound = Q3 + 1.5 * IQR
 
     # Cap price at upper and loweer bounds
-    df["price"] = np.where(df["price"] > upper_bound, upper_bound, df["price"])
-    df["price"] = np.where(df["price"] < lower_bound, lower_bound, df["price"])
+    df["price"] = df["price"].clip(lower = lower_bound, upper = upper_bound)
     return df
 
 # Function 6: Data Visualization
-def visualize_data(df):
+@instrumented
+def visualize_data(df, aggregates = None, renderer = None):
     """
     Create visualizations for data analysis.
-    """
-    sns.set(style = "whitegrid")
-
-    # Total transactions per category
-    plt.figure(figsize = (10, 6))
-    category_counts = df["category"].value_counts()
-    sns.barplot(x=category_counts.index, y=category_counts.values, hue=category_counts.index, palette="viridis", legend=False)
-    plt.title("Total Transactions per Category")
-    plt.xlabel("Category")
-    plt.ylabel("Total Transactions")
-    plt.xticks(rotation = 45)
-    plt.tight_layout()
-    plt.savefig("../visualizations/transactions_per_category.png")
-    plt.close()
-
-    # Sales over time
-    plt.figure(figsize = (12, 6))
-    df.set_index("transaction_date").resample("ME")["price"].sum().plot()
-    plt.title("Sales Over Time")
-    plt.xlabel("Date")
-    plt.ylabel("Total Sales")
-    plt.tight_layout()
-    plt.savefig("../visualizations/sales_over_time.png")
-    plt.close()
-
-    # Age distribution of customers
-    plt.figure(figsize = (10, 6))
-    sns.histplot(df["age"], bins = 50, kde = True, color = "skyblue")
-    plt.title("Age Distribution of Customers")
-    plt.xlabel("Age")
-    plt.ylabel("Frequency")
-    plt.tight_layout()
-    plt.savefig("../visualizations/age_distribution.png")
-    plt.close()
+    Category counts and monthly sales are taken from the aggregation engine results when given.
+    The charts are declared as chart specs and rendered in worker processes (the age histogram
+    is sent as its bin counts); a chart whose data has not changed is not rendered again.
+    With a renderer, the charts are submitted to it without waiting for them.
+    """
+    category_counts = aggregates["category_counts"] if aggregates else df["category"].value_counts()
+    monthly_sales = aggregates["monthly_sales"] if aggregates else df.set_index("transaction_date").resample("ME")["price"].sum()
+    specs = [
+        # Total transactions per category
+        bar_chart("../visualizations/transactions_per_category.png", category_counts.index, category_counts.to_numpy(),
+                  title = "Total Transactions per Category", xlabel = "Category", ylabel = "Total Transactions",
+                  figsize = (10, 6), rotation = 45, style = "whitegrid", palette = "viridis"),
+        # Sales over time
+        line_chart("../visualizations/sales_over_time.png", monthly_sales.index.to_numpy(), monthly_sales.to_numpy(),
+                   title = "Sales Over Time", xlabel = "Date", ylabel = "Total Sales", style = "whitegrid"),
+        # Age distribution of customers
+        histogram("../visualizations/age_distribution.png", df["age"].to_numpy(), bins = 50, kde = True,
+                  title = "Age Distribution of Customers", xlabel = "Age", ylabel = "Frequency",
+                  figsize = (10, 6), style = "whitegrid", color = "skyblue", alpha = 0.75)
+    ]
+    if renderer is None:
+        render_charts(specs)
+    else:
+        for spec in specs:
+            renderer.submit(spec)
 
 # Function 7: Aggregated Analysis
-def aggregated_analysis(df):
+def compute_aggregates(df):
     """
-    Perform aggregated analysis on the dataset.
+    Compute the top products, sales by gender and the category/gender pivot table.
     """
     # Top 10 products by sales
     top_products = df.groupby("product_id")["price"].sum().sort_values(ascending = False).head(10)
-    print(r"n\Top 10 Products by Quantity Sold")
-    print(top_products)
 
     # Sales by gender
     sales_by_gender = df.groupby("gender")["price"].sum()
-    print("\nTotal Sales by Gender")
-    print(sales_by_gender)
 
     # Pivot table of sales by category and gender
     pivot_table = df.pivot_table(
@@ -125,10 +127,32 @@ def aggregated_analysis(df):
         columns = "gender",
         aggfunc = "sum"
     )
+    return top_products, sales_by_gender, pivot_table
+
+def report_aggregates(top_products, sales_by_gender, pivot_table):
+    """
+    Print the results of the aggregated analysis.
+    """
+    print(r"n\Top 10 Products by Quantity Sold")
+    print(top_products)
+    print("\nTotal Sales by Gender")
+    print(sales_by_gender)
     print("\nPivot Table of Sales by Category and Gender")
     print(pivot_table)
 
+@instrumented
+def aggregated_analysis(df, aggregates = None):
+    """
+    Perform aggregated analysis on the dataset.
+    Uses the aggregation engine results when given instead of recomputing them.
+    """
+    if aggregates is None:
+        report_aggregates(*compute_aggregates(df))
+    else:
+        report_aggregates(aggregates["top_products"], aggregates["sales_by_gender"], aggregates["category_gender_pivot"])
+
 # Function 8: Save the cleaned dataset
+@instrumented
 def save_clean_data(df):
     """
     Save the cleaned dataset to a new CSV file.
@@ -137,38 +161,40 @@ def save_clean_data(df):
     print("\nCleaned data saved to 'data/cleaned_ecommerce_data.csv'.")
 
 # Main Function to Excecute the Data Analysis
+# With the PIPELINE_PROFILE_DIR environment variable set, every step is profiled (see shared/instrumentation.py)
+@profile_run("data_analysis")
 def main():
-    # Step 1: Load the dataset
-    print("Loading dataset...")
+    # The steps are declared as tasks (see shared/task_runner.py): the results of a step are stored in
+    # data/cache/tasks and reused until its code, the dataset or a step it depends on changes, and the
+    # steps that do not depend on each other run concurrently (the reports are printed while the
+    # dataset is cleaned). The printed reports run on every run, one after the other.
     filepath = "../data/ecommerce_data.csv"
-    df = load_data(filepath)
-
-    # Step 2: Perform initial data exploration
-    print("\nPerforming initial data exploration...")
-    initial_data_exploration(df)
-
-    # Step 3: Data validation and summarization
-    print("\nPerforming data validation...")
-    data_validation(df)
-
-    # Step 4: Handle missing values
-    print("\nHandling missing values...")
-    df = handle_missing_values(df)
-
-    # Step 5: Handle outliers
-    print("\nHandling outliers...")
-    df = handle_outliers(df)
-
-    # Step 6: Data visualization
-    print("\nCreating visualizations...")
-    visualize_data(df)
-
-    # Step 7: Aggregated analysis
-    print("\nPerforming aggregated analysis...")
-    aggregated_analysis(df)
-
-    # Step 8: Save the cleaned dataset
-    save_clean_data(df)
+    tasks = [
+        # Step 1: Load the dataset
+        task("raw_data", load_data, params = {"filepath": file_input(filepath), "use_cache": True}, cache = False),
+        # Step 2: Perform initial data exploration
+        task("exploration", initial_data_exploration, inputs = ["raw_data"], cache = False),
+        # Step 3: Data validation and summarization
+        task("validation", data_validation, inputs = ["raw_data"], after = ["exploration"], cache = False),
+        # Step 4: Handle missing values (on a copy, as the reports read the loaded dataset concurrently)
+        task("filled_data", handle_missing_values, inputs = ["raw_data"], copy_inputs = True),
+        # Step 5: Handle outliers
+        task("clean_data", handle_outliers, inputs = ["filled_data"]),
+        # Step 6: Compute all aggregates in a single parallel pass (the process pools of this step and
+        # the next one are started from the main thread)
+        task("aggregates", run_aggregations, inputs = ["clean_data"], main_thread = True),
+        # Step 7: Data visualization; the step is run again if one of the charts was deleted
+        task("charts", visualize_data, inputs = ["clean_data", "aggregates"], main_thread = True,
+             files = ["../visualizations/transactions_per_category.png", "../visualizations/sales_over_time.png",
+                      "../visualizations/age_distribution.png"]),
+        # Step 8: Aggregated analysis
+        task("aggregated_report", aggregated_analysis, inputs = ["clean_data", "aggregates"], after = ["validation"], cache = False),
+        # Step 9: Save the cleaned dataset
+        task("saved_data", save_clean_data, inputs = ["clean_data"], after = ["aggregated_report"],
+             files = ["../data/cleaned_ecommerce_data.csv"])
+    ]
+    statuses = TaskRunner("../data/cache/tasks").run(tasks)
+    print(f"\n{status_summary(statuses)}")
 
     print("\nData analysis complete.")
 
@@ -0,0 +1,132 @@
+# Importing the necessary libraries
+import hashlib
+import json
+import os
+import pandas as pd
+
+# Typed schema of the columnar cache: categorical IDs and enums. Prices and quantities stay
+# float64, as read by pd.read_csv, so that the cleaning and the sums give the same results as the CSV
+CACHE_DTYPES = {
+    "transaction_id": "string",
+    "customer_id": "category",
+    "product_id": "category",
+    "gender": "category",
+    "category": "category",
+    "price": "float64",
+    "quantity": "float64"
+}
+
+# Integer columns stored in the smallest integer type that holds all of their values
+NARROW_COLUMNS = ["age"]
+
+# Version of the cache schema, recorded in the metadata: caches written with another schema are rebuilt
+CACHE_SCHEMA_VERSION = 3
+
+CACHE_FORMATS = {
+    "parquet": ".parquet",
+    "feather": ".feather"
+}
+
+# Function 1: Fingerprint of the source CSV
+def file_fingerprint(filepath):
+    """
+    Return the size and modification time of a file.
+    """
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def file_hash(filepath, block_size = 1 << 20):
+    """
+    Compute the SHA-256 hash of a file without loading it in memory.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Function 2: Paths of the cache files
+def cache_paths(filepath, cache_dir = None, fmt = "parquet"):
+    """
+    Return the paths of the columnar cache file and of its metadata file.
+    """
+    if fmt not in CACHE_FORMATS:
+        raise ValueError(f"Unknown cache format '{fmt}', expected one of {list(CACHE_FORMATS)}")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filepath)), "cache")
+    name = os.path.splitext(os.path.basename(filepath))[0]
+    cache_path = os.path.join(cache_dir, name + CACHE_FORMATS[fmt])
+    return cache_path, cache_path + ".meta.json"
+
+# Function 3: Read the CSV with the typed schema
+def read_typed_csv(filepath):
+    """
+    Read the e-commerce CSV directly into the typed schema used by the cache.
+    """
+    df = pd.read_csv(filepath, dtype = CACHE_DTYPES, parse_dates = ["transaction_date"])
+    # downcast checks the minimum and maximum, so out-of-range values keep a wider type
+    for column in NARROW_COLUMNS:
+        if pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast = "integer")
+    return df
+
+# Function 4: Check whether the cache is still valid
+def is_cache_valid(filepath, cache_path, meta_path):
+    """
+    Check the cache against the source file and the schema version: a matching size and mtime
+    is enough, otherwise the cache is only reused if the content hash is unchanged.
+    """
+    if not (os.path.exists(cache_path) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path) as file:
+        meta = json.load(file)
+    if meta.get("schema_version") != CACHE_SCHEMA_VERSION:
+        return False
+    fingerprint = file_fingerprint(filepath)
+    if meta.get("size") == fingerprint["size"] and meta.get("mtime_ns") == fingerprint["mtime_ns"]:
+        return True
+    if meta.get("size") != fingerprint["size"] or meta.get("sha256") != file_hash(filepath):
+        return False
+    # Same content with a new mtime (e.g. after a checkout): refresh the metadata
+    meta.update(fingerprint)
+    with open(meta_path, "w") as file:
+        json.dump(meta, file, indent = 2)
+    return True
+
+# Function 5: Build the cache
+def build_cache(filepath, cache_path, meta_path, fmt = "parquet"):
+    """
+    Convert the CSV into a columnar file and record the source fingerprint.
+    """
+    df = read_typed_csv(filepath)
+    os.makedirs(os.path.dirname(cache_path), exist_ok = True)
+    if fmt == "parquet":
+        df.to_parquet(cache_path, index = False)
+    else:
+        df.to_feather(cache_path)
+    meta = {"source": os.path.abspath(filepath), "format": fmt, "schema_version": CACHE_SCHEMA_VERSION, "sha256": file_hash(filepath)}
+    meta.update(file_fingerprint(filepath))
+    with open(meta_path, "w") as file:
+        json.dump(meta, file, indent = 2)
+    return df
+
+# Function 6: Load the dataset through the cache
+def load_cached_data(filepath, cache_dir = None, fmt = "parquet"):
+    """
+    Load the e-commerce dataset from the columnar cache, building it on the first run
+    or when the source CSV has changed. Parquet and Feather both need pyarrow; without it
+    the CSV is read directly with the typed schema.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("pyarrow is not installed, reading the CSV without the columnar cache.")
+        return read_typed_csv(filepath)
+
+    cache_path, meta_path = cache_paths(filepath, cache_dir, fmt)
+    if not is_cache_valid(filepath, cache_path, meta_path):
+        print(f"Building columnar cache '{cache_path}'...")
+        return build_cache(filepath, cache_path, meta_path, fmt)
+    if fmt == "parquet":
+        return pd.read_parquet(cache_path)
+    return pd.read_feather(cache_path)
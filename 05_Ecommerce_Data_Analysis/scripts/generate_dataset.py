@@ -1,7 +1,10 @@
 # Importing the necessary libraries
+import argparse
+import os
 import numpy as np
 import pandas as pd
 import random
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 # Define Functions to Generate Data
@@ -56,11 +59,142 @@ def introduce_anomalies(df):
 
     return df
 
+# Vectorized, Sharded Generation for Very Large Datasets
+# Every shard gets its own random stream derived from the base seed, so the output only depends
+# on the seed and the shard layout, not on the number of worker processes.
+GENDERS = np.array(['Male', 'Female', 'Other'])
+GENDER_PROBABILITIES = [0.48, 0.48, 0.04]
+CATEGORIES = np.array(['Electronics', 'Clothing', 'Home', 'Books', 'Toys'])
+COLUMNS = ['transaction_id', 'customer_id', 'product_id', 'quantity', 'transaction_date', 'age', 'gender', 'category', 'price']
+
+def fixed_width_ids(prefix, numbers, width):
+    """
+    Build IDs of exactly width digits from an array of numbers below 10 ** width, without a Python
+    loop: the digits are computed arithmetically into a byte matrix that is viewed as fixed-width strings.
+    """
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    digits = (numbers[:, None] // powers % 10 + ord('0')).astype(np.uint8)
+    prefix_bytes = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    chars = np.hstack([np.broadcast_to(prefix_bytes, (len(digits), len(prefix_bytes))), digits])
+    return np.ascontiguousarray(chars).view(f'S{chars.shape[1]}').ravel()
+
+def format_ids(prefix, numbers, width):
+    """
+    Build zero-padded IDs (e.g. CUST000001) from an array of numbers, like prefix + str(n).zfill(width):
+    numbers with more than width digits keep all of them (CUST1234567).
+    """
+    numbers = np.asarray(numbers, dtype=np.int64)
+    max_width = max(width, len(str(int(numbers.max())))) if len(numbers) else width
+    if max_width == width:
+        return fixed_width_ids(prefix, numbers, width).astype(f'U{len(prefix) + width}')
+    # Numbers of every number of digits above width are formatted at their own width
+    widths = width + np.searchsorted(10 ** np.arange(width, max_width, dtype=np.int64), numbers, side='right')
+    ids = np.empty(len(numbers), dtype=f'U{len(prefix) + max_width}')
+    for digits in range(width, max_width + 1):
+        rows = np.flatnonzero(widths == digits)
+        if len(rows):
+            ids[rows] = fixed_width_ids(prefix, numbers[rows], digits).astype(f'U{len(prefix) + digits}')
+    return ids
+
+def generate_catalog(num_customers, num_products, seed):
+    """
+    Generate the customer and product attribute arrays, indexed by customer/product number.
+    Genders and categories are stored as codes into GENDERS and CATEGORIES.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+    return {
+        'ages': rng.integers(18, 70, size=num_customers, dtype=np.int8),
+        'gender_codes': rng.choice(len(GENDERS), size=num_customers, p=GENDER_PROBABILITIES).astype(np.int8),
+        'category_codes': rng.choice(len(CATEGORIES), size=num_products).astype(np.int8),
+        'prices': np.round(rng.uniform(5, 500, size=num_products), 2)
+    }
+
+def generate_transaction_chunk(rng, catalog, first_row, num_rows, reference_date):
+    """
+    Generate one chunk of joined transaction rows, with anomalies, using index lookups instead of merges.
+    """
+    customer_index = rng.integers(0, len(catalog['ages']), size=num_rows)
+    product_index = rng.integers(0, len(catalog['prices']), size=num_rows)
+    quantities = rng.integers(1, 5, size=num_rows).astype(np.float64)
+    days_ago = rng.integers(0, 365 * 3 + 1, size=num_rows).astype('timedelta64[D]')
+    prices = catalog['prices'][product_index]
+
+    # Introduce missing values in 'quantity' and anomalies in 'price'
+    quantities[rng.choice(num_rows, size=int(num_rows * 0.01), replace=False)] = np.nan
+    anomaly_indices = rng.choice(num_rows, size=int(num_rows * 0.005), replace=False)
+    prices[anomaly_indices] = prices[anomaly_indices] * 10
+
+    return pd.DataFrame({
+        'transaction_id': format_ids('TRANS', np.arange(first_row + 1, first_row + num_rows + 1), 9),
+        'customer_id': format_ids('CUST', customer_index + 1, 6),
+        'product_id': format_ids('PROD', product_index + 1, 6),
+        'quantity': quantities,
+        'transaction_date': reference_date - days_ago,
+        'age': catalog['ages'][customer_index],
+        'gender': pd.Categorical.from_codes(catalog['gender_codes'][customer_index], GENDERS),
+        'category': pd.Categorical.from_codes(catalog['category_codes'][product_index], CATEGORIES),
+        'price': prices
+    }, columns=COLUMNS)
+
+def generate_shard(shard_index, first_row, num_rows, output_path, num_customers, num_products, seed,
+                   reference_date, chunk_rows=1_000_000):
+    """
+    Generate one shard and write it to its own CSV file, chunk by chunk.
+    """
+    catalog = generate_catalog(num_customers, num_products, seed)
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(1, shard_index)))
+    reference_date = np.datetime64(reference_date, 'D')
+    if num_rows == 0:
+        # More shards than transactions: the shard is a file with the header only
+        pd.DataFrame(columns=COLUMNS).to_csv(output_path, index=False)
+    for offset in range(0, num_rows, chunk_rows):
+        size = min(chunk_rows, num_rows - offset)
+        chunk = generate_transaction_chunk(rng, catalog, first_row + offset, size, reference_date)
+        chunk.to_csv(output_path, mode='w' if offset == 0 else 'a', header=offset == 0, index=False)
+    return output_path
+
+def generate_sharded_dataset(num_transactions, output_dir, num_shards=8, workers=None, num_customers=100000,
+                             num_products=5000, seed=42, reference_date=None, chunk_rows=1_000_000):
+    """
+    Generate a large dataset as sharded CSV files written in parallel by worker processes.
+    Memory use per worker is bounded by chunk_rows, whatever the total number of rows.
+    """
+    reference_date = str(reference_date or np.datetime64('today', 'D'))
+    os.makedirs(output_dir, exist_ok=True)
+    edges = np.linspace(0, num_transactions, num_shards + 1).astype(np.int64)
+    paths = [os.path.join(output_dir, f'ecommerce_data-part-{i:05d}.csv') for i in range(num_shards)]
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(generate_shard, i, int(edges[i]), int(edges[i + 1] - edges[i]), paths[i],
+                            num_customers, num_products, seed, reference_date, chunk_rows)
+            for i in range(num_shards)
+        ]
+        return [future.result() for future in futures]
+
 # Main Function to Generate and Save Dataset
 def main():
-    num_customers = 100000
-    num_products = 5000
-    num_transactions = 1000000
+    parser = argparse.ArgumentParser(description='Generate the synthetic e-commerce dataset.')
+    parser.add_argument('--transactions', type=int, default=1000000)
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--fast', action='store_true', help='vectorized generator writing sharded CSV files in parallel')
+    parser.add_argument('--shards', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reference-date', default=None, help='most recent transaction date (default: today)')
+    parser.add_argument('--output-dir', default='../data/shards')
+    args = parser.parse_args()
+
+    if args.fast:
+        print(f"Generating {args.transactions} transactions in {args.shards} shards...")
+        paths = generate_sharded_dataset(args.transactions, args.output_dir, args.shards, args.workers,
+                                         args.customers, args.products, args.seed, args.reference_date)
+        print(f"Dataset generation complete: {len(paths)} shards saved to '{args.output_dir}'.")
+        return
+
+    num_customers = args.customers
+    num_products = args.products
+    num_transactions = args.transactions
 
     print("Generating customer data...")
     customers = generate_customer_data(num_customers)
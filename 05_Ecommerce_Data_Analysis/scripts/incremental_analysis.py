@@ -0,0 +1,240 @@
+# Importing the necessary libraries
+import argparse
+import os
+import pickle
+import numpy as np
+import pandas as pd
+
+from aggregation_engine import monthly_series, sort_descending, top_10, unstack_gender
+from data_analysis import report_aggregates
+from streaming_analysis import QuantileSketch
+
+# Incremental analysis: the aggregate state of all transactions seen so far is saved to disk and
+# updated from new rows only. The outlier bounds move as data arrives, so the state keeps the
+# transaction counts per (product, category, gender, month, price) instead of price sums: the
+# capped sums are recomputed from those counts at report time and match a full recompute.
+
+CUBE_KEYS = ["product_id", "category", "gender", "month", "price"]
+
+# Function 1: Empty state
+def empty_cube_index():
+    """
+    Create the cube index without any transaction, with the level types of a filled one.
+    """
+    levels = [pd.Index([], dtype = "str")] * 3 + [pd.PeriodIndex([], freq = "M"), pd.Index([], dtype = "float64")]
+    return pd.MultiIndex.from_arrays(levels, names = CUBE_KEYS)
+
+def empty_state():
+    """
+    Create the state of an empty transaction history.
+    The cube and the sorted transaction ID index are lists of segments (see add_segment).
+    """
+    return {
+        "cube_segments": [],
+        "id_segments": [],
+        "age_histogram": pd.Series(dtype = "int64"),
+        "quantity_sketch": QuantileSketch(),
+        "missing_quantity": 0,
+        "next_segment": 0
+    }
+
+# Function 2: Segments of the state
+def add_segment(segments, data, merge):
+    """
+    Append the data of a batch as a new segment. A segment is merged with the one before it
+    while it is at least half as large, so that there are O(log n) segments and every row is
+    merged O(log n) times: adding a batch costs about its own size, not that of the history.
+    Segments have a file name once saved; merged segments are new, unsaved ones.
+    """
+    segments.append({"file": None, "data": data})
+    while len(segments) > 1 and 2 * len(segments[-1]["data"]) >= len(segments[-2]["data"]):
+        last = segments.pop()
+        segments[-1] = {"file": None, "data": merge(segments[-1]["data"], last["data"])}
+    return segments
+
+def merge_ids(ids, new_ids):
+    """
+    Merge two sorted transaction ID arrays into one sorted array.
+    """
+    dtype = np.promote_types(ids.dtype, new_ids.dtype)
+    ids, new_ids = np.asarray(ids, dtype = dtype), np.asarray(new_ids, dtype = dtype)
+    return np.insert(ids, np.searchsorted(ids, new_ids), new_ids)
+
+def merge_cubes(cube, new_cube):
+    """
+    Add up two cubes of transaction counts.
+    """
+    return pd.concat([cube, new_cube]).groupby(level = CUBE_KEYS).sum()
+
+# Function 3: Load and save the state
+def load_state(state_dir):
+    """
+    Load the aggregate state from disk (an empty state if there is none yet).
+    The transaction ID segments are memory-mapped rather than read into memory.
+    """
+    aggregates_path = os.path.join(state_dir, "aggregates.pkl")
+    if not os.path.exists(aggregates_path):
+        return empty_state()
+    with open(aggregates_path, "rb") as file:
+        state = pickle.load(file)
+    if "cube" in state:
+        # States saved before the segments kept one cube, and one ID index in ids_file (or transaction_ids.npy)
+        state["cube_segments"] = [{"file": None, "data": state.pop("cube")}]
+        state["id_files"] = [state.pop("ids_file", "transaction_ids.npy")]
+        state["cube_files"] = []
+        state["next_segment"] = state.pop("generation", 0) + 1
+    else:
+        state["cube_segments"] = []
+        for name in state["cube_files"]:
+            with open(os.path.join(state_dir, name), "rb") as file:
+                state["cube_segments"].append({"file": name, "data": pickle.load(file)})
+    state["id_segments"] = [{"file": name, "data": np.load(os.path.join(state_dir, name), mmap_mode = "r")}
+                            for name in state.pop("id_files")]
+    del state["cube_files"]
+    return state
+
+def save_state(state, state_dir):
+    """
+    Save the aggregate state to disk.
+    Only the segments created since the last save are written, each to a new file. aggregates.pkl,
+    which lists the segment files, is replaced last, so a save interrupted at any point leaves the
+    previous state whole; the files of merged segments are removed after it.
+    """
+    os.makedirs(state_dir, exist_ok = True)
+    for key, prefix, extension in [("id_segments", "transaction_ids", ".npy"), ("cube_segments", "cube", ".pkl")]:
+        for segment in state[key]:
+            if segment["file"] is None:
+                segment["file"] = f"{prefix}.{state['next_segment']}{extension}"
+                state["next_segment"] += 1
+                path = os.path.join(state_dir, segment["file"])
+                if extension == ".npy":
+                    np.save(path, segment["data"])
+                else:
+                    with open(path, "wb") as file:
+                        pickle.dump(segment["data"], file)
+
+    aggregates = {key: value for key, value in state.items() if key not in ("id_segments", "cube_segments")}
+    aggregates["id_files"] = [segment["file"] for segment in state["id_segments"]]
+    aggregates["cube_files"] = [segment["file"] for segment in state["cube_segments"]]
+    aggregates_path = os.path.join(state_dir, "aggregates.pkl")
+    with open(aggregates_path + ".tmp", "wb") as file:
+        pickle.dump(aggregates, file)
+    os.replace(aggregates_path + ".tmp", aggregates_path)
+
+    # Remove the files of merged segments and any left by an interrupted save (a memory-mapped one stays readable)
+    in_use = set(aggregates["id_files"] + aggregates["cube_files"])
+    for name in os.listdir(state_dir):
+        if name.startswith(("transaction_ids", "cube.")) and name not in in_use:
+            os.remove(os.path.join(state_dir, name))
+
+# Function 4: Deduplicate new transactions
+def new_transactions_mask(transaction_ids, id_segments):
+    """
+    Return a mask of the transactions that are neither in the sorted ID segments nor repeated in the batch.
+    """
+    ids = np.asarray(transaction_ids, dtype = "S")
+    unseen = ~pd.Series(ids).duplicated().to_numpy()
+    for segment in id_segments:
+        known_ids = segment["data"]
+        if len(known_ids):
+            positions = np.searchsorted(known_ids, ids)
+            found = known_ids[np.minimum(positions, len(known_ids) - 1)] == ids
+            unseen &= ~found
+    return unseen
+
+# Function 5: Update the state with new rows
+def update_state(state, new_rows):
+    """
+    Update the state with a batch of raw (uncleaned) transactions.
+    The batch is added to the cube and to the ID index as new segments.
+
+    Returns:
+    - state (dict): The updated state.
+    - num_added (int): Number of new transactions.
+    - num_duplicates (int): Number of transactions already in the history (skipped).
+    """
+    mask = new_transactions_mask(new_rows["transaction_id"], state["id_segments"])
+    rows = new_rows[mask]
+
+    if len(rows):
+        keys = rows[CUBE_KEYS[:-2]].astype(str)
+        keys["month"] = rows["transaction_date"].dt.to_period("M")
+        keys["price"] = rows["price"].astype("float64")
+        add_segment(state["cube_segments"], keys.groupby(CUBE_KEYS).size(), merge_cubes)
+        add_segment(state["id_segments"], np.sort(np.asarray(rows["transaction_id"], dtype = "S")), merge_ids)
+
+    ages = rows["age"].value_counts()
+    state["age_histogram"] = state["age_histogram"].add(ages, fill_value = 0).astype("int64").sort_index()
+    state["quantity_sketch"].update(rows["quantity"])
+    state["missing_quantity"] += int(rows["quantity"].isnull().sum())
+    return state, int(mask.sum()), int((~mask).sum())
+
+# Function 6: Reports from the state
+def build_reports(state):
+    """
+    Compute the cleaning statistics and the aggregates of the whole history from the state.
+    The results are those of data_analysis (and of aggregation_engine) on the full dataset.
+    """
+    # Counts are only summed below, so the segments do not need to be merged first
+    segments = [segment["data"] for segment in state["cube_segments"]] or [pd.Series(dtype = "int64", index = empty_cube_index())]
+    cube = pd.concat([segment.reset_index(name = "count") for segment in segments], ignore_index = True)
+
+    # Same IQR bounds as handle_outliers, from the exact price counts
+    price_sketch = QuantileSketch()
+    price_sketch.counts = cube.groupby("price")["count"].sum()
+    Q1 = price_sketch.quantile(0.25)
+    Q3 = price_sketch.quantile(0.75)
+    IQR = Q3 - Q1
+    lower_bound = Q1 - 1.5 * IQR
+    upper_bound = Q3 + 1.5 * IQR
+
+    cube["sales"] = cube["price"].clip(lower = lower_bound, upper = upper_bound) * cube["count"]
+    aggregates = {
+        "top_products": top_10(cube.groupby("product_id")["sales"].sum().rename("price")),
+        "sales_by_gender": cube.groupby("gender")["sales"].sum().rename("price"),
+        "category_gender_pivot": unstack_gender(cube.groupby(["category", "gender"])["sales"].sum()),
+        "category_counts": sort_descending(cube.groupby("category")["count"].sum()),
+        "monthly_sales": monthly_series(cube.groupby("month")["sales"].sum().rename("price")),
+        "age_histogram": state["age_histogram"]
+    }
+    cleaning_stats = {
+        "median_quantity": state["quantity_sketch"].median(),
+        "missing_quantity": state["missing_quantity"],
+        "lower_bound": lower_bound,
+        "upper_bound": upper_bound,
+        "transactions": int(cube["count"].sum())
+    }
+    return cleaning_stats, aggregates
+
+# Main Function to Execute the Incremental Data Analysis
+def main():
+    parser = argparse.ArgumentParser(description = "Update the saved e-commerce analysis state with new transactions.")
+    parser.add_argument("new_data", nargs = "*", help = "CSV files of new transactions")
+    parser.add_argument("--state-dir", default = "../data/analysis_state")
+    parser.add_argument("--chunksize", type = int, default = 1_000_000)
+    args = parser.parse_args()
+
+    # Step 1: Load the saved state
+    print("Loading the analysis state...")
+    state = load_state(args.state_dir)
+
+    # Step 2: Update it with the new transactions only
+    for filepath in args.new_data:
+        print(f"Adding transactions from '{filepath}'...")
+        for chunk in pd.read_csv(filepath, parse_dates = ["transaction_date"], chunksize = args.chunksize):
+            state, num_added, num_duplicates = update_state(state, chunk)
+            print(f" - {num_added} new transactions, {num_duplicates} duplicates skipped")
+    if args.new_data:
+        save_state(state, args.state_dir)
+
+    # Step 3: Report from the state
+    cleaning_stats, aggregates = build_reports(state)
+    print(f"\nTransactions in the history: {cleaning_stats['transactions']}")
+    print(f"Median quantity: {cleaning_stats['median_quantity']}")
+    print(f"Price bounds: [{cleaning_stats['lower_bound']:.2f}, {cleaning_stats['upper_bound']:.2f}]")
+    report_aggregates(aggregates["top_products"], aggregates["sales_by_gender"], aggregates["category_gender_pivot"])
+
+    print("\nIncremental data analysis complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Importing the necessary libraries
+import numpy as np
+import pandas as pd
+
+from data_analysis import report_aggregates
+
+# Streaming version of the data analysis pipeline: the CSV is read in chunks and every step
+# works from mergeable per-chunk partial aggregates, so memory use is bounded by the chunk size
+# and by the number of distinct products/categories, not by the number of transactions.
+
+# Class 1: Mergeable quantile sketch
+class QuantileSketch:
+    """
+    Mergeable quantile sketch built from per-chunk value counts.
+
+    While the number of distinct values stays below max_distinct the counts are exact, so the
+    quantiles match pandas' linear interpolation. Past that limit, positive values are collapsed
+    into logarithmic buckets whose relative error is at most relative_error.
+    """
+
+    def __init__(self, max_distinct = 1_000_000, relative_error = 0.001):
+        self.max_distinct = max_distinct
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.counts = pd.Series(dtype = "int64")
+        self.exact = True
+
+    def update(self, values):
+        """
+        Add a chunk of values (NaNs are ignored) to the sketch.
+        """
+        chunk_counts = pd.Series(values).dropna().value_counts()
+        if not self.exact:
+            chunk_counts = self._compact(chunk_counts)
+        self._add_counts(chunk_counts)
+        return self
+
+    def merge(self, other):
+        """
+        Merge another sketch into this one.
+        """
+        other_counts = other.counts
+        if not other.exact and self.exact:
+            self.counts = self._compact(self.counts)
+            self.exact = False
+        elif not self.exact and other.exact:
+            other_counts = self._compact(other_counts)
+        self._add_counts(other_counts)
+        return self
+
+    def count(self):
+        """
+        Return the number of values added to the sketch.
+        """
+        return int(self.counts.sum())
+
+    def quantile(self, q):
+        """
+        Return the q-th quantile using the same linear interpolation as pandas (NaN for an empty sketch).
+        """
+        if self.count() == 0:
+            return np.nan
+        values = self.counts.index.to_numpy(dtype = "float64")
+        cumulative = np.cumsum(self.counts.to_numpy())
+        n = int(cumulative[-1])
+        # Same virtual index and interpolation formula as numpy's "linear" method
+        virtual_index = n * q + (1 - q) - 1
+        lower = int(np.floor(virtual_index))
+        upper = min(lower + 1, n - 1)
+        fraction = virtual_index - lower
+        a = values[np.searchsorted(cumulative, lower, side = "right")]
+        b = values[np.searchsorted(cumulative, upper, side = "right")]
+        diff_b_a = b - a
+        if fraction >= 0.5:
+            return b - diff_b_a * (1 - fraction)
+        return a + diff_b_a * fraction
+
+    def median(self):
+        """
+        Return the median (mean of the two middle values for an even count, like pandas; NaN for an empty sketch).
+        """
+        if self.count() == 0:
+            return np.nan
+        values = self.counts.index.to_numpy(dtype = "float64")
+        cumulative = np.cumsum(self.counts.to_numpy())
+        n = int(cumulative[-1])
+        a = values[np.searchsorted(cumulative, (n - 1) // 2, side = "right")]
+        b = values[np.searchsorted(cumulative, n // 2, side = "right")]
+        return (a + b) / 2
+
+    def _add_counts(self, counts):
+        self.counts = self.counts.add(counts, fill_value = 0).astype("int64").sort_index()
+        if self.exact and len(self.counts) > self.max_distinct:
+            self.counts = self._compact(self.counts)
+            self.exact = False
+
+    def _compact(self, counts):
+        # Map every positive value to the representative of its logarithmic bucket
+        values = counts.index.to_numpy(dtype = "float64", copy = True)
+        positive = values > 0
+        buckets = np.ceil(np.log(values[positive]) / np.log(self.gamma))
+        values[positive] = 2 * self.gamma ** buckets / (self.gamma + 1)
+        return counts.groupby(values).sum()
+
+# Function 1: Read the dataset in chunks
+def read_in_chunks(filepath, chunksize = 100_000):
+    """
+    Read the e-commerce dataset as an iterator of DataFrame chunks.
+    """
+    return pd.read_csv(filepath, parse_dates = ["transaction_date"], chunksize = chunksize)
+
+# Function 2: First pass - statistics needed for cleaning
+def compute_cleaning_statistics(filepath, chunksize = 100_000, max_distinct = 1_000_000, relative_error = 0.001):
+    """
+    Compute the median quantity and the IQR bounds for price in one pass over the chunks.
+    """
+    quantity_sketch = QuantileSketch(max_distinct, relative_error)
+    price_sketch = QuantileSketch(max_distinct, relative_error)
+    has_missing_quantity = False
+    for chunk in read_in_chunks(filepath, chunksize):
+        quantity_sketch.update(chunk["quantity"])
+        price_sketch.update(chunk["price"])
+        has_missing_quantity = has_missing_quantity or chunk["quantity"].isnull().any()
+
+    Q1 = price_sketch.quantile(0.25)
+    Q3 = price_sketch.quantile(0.75)
+    IQR = Q3 - Q1
+    return {
+        "median_quantity": quantity_sketch.median(),
+        "has_missing_quantity": bool(has_missing_quantity),
+        "lower_bound": Q1 - 1.5 * IQR,
+        "upper_bound": Q3 + 1.5 * IQR,
+        "exact": quantity_sketch.exact and price_sketch.exact
+    }
+
+# Function 3: Clean a single chunk
+def clean_chunk(chunk, cleaning_stats):
+    """
+    Impute missing quantities and cap outlier prices in one chunk.
+    """
+    # The in-memory path ends up with a float column whenever the full file has a missing quantity
+    if cleaning_stats["has_missing_quantity"]:
+        chunk["quantity"] = chunk["quantity"].astype("float64")
+    chunk["quantity"] = chunk["quantity"].fillna(cleaning_stats["median_quantity"])
+    chunk["price"] = np.where(chunk["price"] > cleaning_stats["upper_bound"], cleaning_stats["upper_bound"], chunk["price"])
+    chunk["price"] = np.where(chunk["price"] < cleaning_stats["lower_bound"], cleaning_stats["lower_bound"], chunk["price"])
+    return chunk
+
+# Function 4: Partial aggregates of a chunk
+def partial_aggregates(chunk):
+    """
+    Compute the per-chunk sums that the aggregated analysis is built from.
+    """
+    return {
+        "product_sales": chunk.groupby("product_id")["price"].sum(),
+        "gender_sales": chunk.groupby("gender")["price"].sum(),
+        "category_gender_sales": chunk.groupby(["category", "gender"])["price"].sum()
+    }
+
+def merge_partial_aggregates(total, partial):
+    """
+    Merge per-chunk partial aggregates into the running totals.
+    """
+    if total is None:
+        return partial
+    return {key: total[key].add(partial[key], fill_value = 0) for key in total}
+
+def finalize_aggregates(total):
+    """
+    Turn merged partial aggregates into the same results as data_analysis.compute_aggregates.
+    """
+    top_products = total["product_sales"].sort_values(ascending = False).head(10)
+    sales_by_gender = total["gender_sales"]
+    pivot_table = total["category_gender_sales"].unstack("gender")
+    return top_products, sales_by_gender, pivot_table
+
+# Function 5: Second pass - clean, aggregate and write incrementally
+def stream_clean_and_aggregate(filepath, output_path, cleaning_stats, chunksize = 100_000):
+    """
+    Clean every chunk, append it to the output CSV and accumulate the partial aggregates.
+    """
+    total = None
+    for i, chunk in enumerate(read_in_chunks(filepath, chunksize)):
+        chunk = clean_chunk(chunk, cleaning_stats)
+        chunk.to_csv(output_path, mode = "w" if i == 0 else "a", header = i == 0, index = False)
+        total = merge_partial_aggregates(total, partial_aggregates(chunk))
+    return finalize_aggregates(total)
+
+def run_streaming_pipeline(filepath, output_path, chunksize = 100_000, max_distinct = 1_000_000, relative_error = 0.001):
+    """
+    Run the cleaning and aggregated analysis with memory bounded by the chunk size.
+
+    On a dataset with fewer than max_distinct prices the results equal the in-memory path
+    (up to floating-point summation order in the group-by sums).
+    """
+    cleaning_stats = compute_cleaning_statistics(filepath, chunksize, max_distinct, relative_error)
+    aggregates = stream_clean_and_aggregate(filepath, output_path, cleaning_stats, chunksize)
+    return cleaning_stats, aggregates
+
+# Main Function to Execute the Streaming Data Analysis
+def main():
+    filepath = "../data/ecommerce_data.csv"
+    output_path = "../data/cleaned_ecommerce_data.csv"
+
+    # Step 1: Compute the median quantity and IQR bounds from per-chunk value counts
+    print("Computing cleaning statistics...")
+    cleaning_stats = compute_cleaning_statistics(filepath)
+    print(f"Median quantity: {cleaning_stats['median_quantity']}")
+    print(f"Price bounds: [{cleaning_stats['lower_bound']:.2f}, {cleaning_stats['upper_bound']:.2f}]")
+    if not cleaning_stats["exact"]:
+        print("Note: quantiles were estimated with the approximate sketch.")
+
+    # Step 2: Clean the chunks, write them incrementally and aggregate them
+    print("\nCleaning and aggregating the dataset chunk by chunk...")
+    aggregates = stream_clean_and_aggregate(filepath, output_path, cleaning_stats)
+
+    # Step 3: Report the aggregated analysis
+    print("\nPerforming aggregated analysis...")
+    report_aggregates(*aggregates)
+    print(f"\nCleaned data saved to '{output_path}'.")
+
+    print("\nStreaming data analysis complete.")
+
+if __name__ == "__main__":
+    main()
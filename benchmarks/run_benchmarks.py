@@ -0,0 +1,351 @@
+# Importing the necessary libraries
+import argparse
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Benchmark suite of the five projects. Inputs are built with the generators of the projects at
+# several scales, and every stage of each pipeline is timed (best of a few runs, wall and CPU
+# time) and memory-profiled (peak memory traced by tracemalloc during one more run, which covers
+# Python objects and NumPy/pandas arrays, but not the memory of worker processes). Results are
+# written as JSON and compared with a saved baseline: a stage that got slower or bigger than the
+# tolerance makes the run fail.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROJECT_DIRS = {
+    "traffic": "01_Traffic_Grid_Analysis",
+    "reviews": "02_Customer_Review_Processing",
+    "schools": "03_NYC_Schools_Analysis",
+    "stock": "04_Stock_Price_Analysis",
+    "ecommerce": os.path.join("05_Ecommerce_Data_Analysis", "scripts")
+}
+for directory in PROJECT_DIRS.values():
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import customer_review_processing
+import data_analysis
+import generate_dataset
+import generate_reviews
+import generate_stock_data
+import nyc_schools_analysis
+import review_pipeline
+import stock_price_analysis
+import traffic_grid_analysis
+from aggregation_engine import run_aggregations
+
+# Input size of every project at scale 1 (cells, reviews, schools, days, transactions). At scale
+# 100, they are about the default sizes of the generators.
+BASE_SIZES = {"traffic": 10_000, "reviews": 10_000, "schools": 10_000, "stock": 7_305, "ecommerce": 10_000}
+SCALES = (1, 10, 100)
+# A stage regresses when it is this much slower (or bigger) than in the baseline...
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+# ... and the difference is above the noise of short stages
+MIN_SECONDS = 0.005
+MIN_MEMORY_MB = 1.0
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.json")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Function 1: Build the inputs (the generated files are kept in the data directory and reused)
+def stock_dataset(scale, data_dir):
+    """
+    Return the path of a stock price CSV file of BASE_SIZES["stock"] * scale days: scale
+    consecutive histories from the generator, each with its own seed. Prices stay in the range
+    of the real dataset, where a single long random walk would compound its drift over centuries
+    (and overflow the sums of squares of the indicators).
+    """
+    path = os.path.join(data_dir, f"stock_data_{scale}x.csv")
+    if not os.path.exists(path):
+        days = BASE_SIZES["stock"]
+        starts = np.datetime64("2000-01-01") + np.arange(scale) * days
+        histories = [generate_stock_data.generate_stock_data(start = str(start), num_days = days, seed = 42 + i) for i, start in enumerate(starts)]
+        pd.concat(histories, ignore_index = True).to_csv(path, index = False)
+    return path
+
+def ecommerce_dataset(scale, data_dir):
+    """
+    Return the path of an e-commerce CSV file of BASE_SIZES["ecommerce"] * scale transactions.
+    """
+    output_dir = os.path.join(data_dir, f"ecommerce_{scale}x")
+    paths = [os.path.join(output_dir, "ecommerce_data-part-00000.csv")]
+    if not os.path.exists(paths[0]):
+        # A fixed reference date, so that the dataset does not depend on the day it is built
+        paths = generate_dataset.generate_sharded_dataset(BASE_SIZES["ecommerce"] * scale, output_dir, num_shards = 1,
+                                                          workers = 1, reference_date = "2024-12-31")
+    return paths[0]
+
+def reviews_dataset(scale, data_dir):
+    """
+    Return the path of a JSON lines file of BASE_SIZES["reviews"] * scale reviews.
+    """
+    path = os.path.join(data_dir, f"reviews_{scale}x.jsonl")
+    if not os.path.exists(path):
+        generate_reviews.write_reviews(generate_reviews.generate_reviews(BASE_SIZES["reviews"] * scale), path)
+    return path
+
+def read_reviews(file_path):
+    """
+    Read the review texts of a JSON lines file.
+    """
+    with open(file_path, encoding = "utf-8") as file:
+        return [json.loads(line)["review"] for line in file]
+
+# Function 2: Time and memory-profile the stages
+class BenchmarkSuite:
+    """
+    Runs pipeline stages and records their measurements in results, keyed by
+    "project/scale/stage" (for example "stock/10x/clean_data").
+    """
+
+    def __init__(self, repeat = 3, memory = True):
+        """
+        Parameters:
+        - repeat (int): Number of timed runs of every stage (the best one is kept).
+        - memory (bool): Whether to run every stage once more under tracemalloc for its peak memory.
+        """
+        self.repeat = repeat
+        self.memory = memory
+        self.results = {}
+
+    def stage(self, project, scale, name, function, setup = None, rows = None):
+        """
+        Measure a stage and return the result of its last run.
+
+        Parameters:
+        - project, scale, name: The key of the stage.
+        - function (callable): The stage, called with the values returned by setup.
+        - setup (callable, optional): Returns a fresh tuple of arguments before every run
+          (copies of the inputs of stages that modify them); it is not measured.
+        - rows (int, optional): The size of the input, for the throughput.
+
+        Returns:
+        - result: What the stage returned.
+        """
+        wall_times, cpu_times = [], []
+        for _ in range(self.repeat):
+            arguments = setup() if setup else ()
+            start_wall, start_cpu = time.perf_counter(), time.process_time()
+            result = function(*arguments)
+            wall_times.append(time.perf_counter() - start_wall)
+            cpu_times.append(time.process_time() - start_cpu)
+        record = {
+            "project": project,
+            "scale": scale,
+            "stage": name,
+            "rows": rows,
+            "seconds": min(wall_times),
+            "mean_seconds": sum(wall_times) / len(wall_times),
+            "cpu_seconds": min(cpu_times)
+        }
+        if rows:
+            record["rows_per_second"] = rows / record["seconds"] if record["seconds"] else None
+        if self.memory:
+            arguments = setup() if setup else ()
+            tracemalloc.start()
+            try:
+                result = function(*arguments)
+                record["peak_memory_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            finally:
+                tracemalloc.stop()
+        key = f"{project}/{scale}x/{name}"
+        self.results[key] = record
+        memory = f"{record['peak_memory_mb']:9.1f} MB" if self.memory else ""
+        print(f"{key:<50} {record['seconds'] * 1000:10.1f} ms {record['cpu_seconds'] * 1000:10.1f} ms cpu {memory}", flush = True)
+        return result
+
+def quiet(function, *args, **kwargs):
+    """
+    Run a function with its printed output discarded.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return function(*args, **kwargs)
+
+# Function 3: The pipelines of the projects
+def benchmark_traffic(suite, scale, data_dir):
+    """
+    Traffic grid analysis on a square grid of about BASE_SIZES["traffic"] * scale cells.
+    """
+    side = round(math.sqrt(BASE_SIZES["traffic"] * scale))
+    cells = side * side
+    grid = suite.stage("traffic", scale, "initialize_traffic_grid", lambda: traffic_grid_analysis.initialize_traffic_grid(side, side), rows = cells)
+    suite.stage("traffic", scale, "calculate_total_vehicles", lambda: traffic_grid_analysis.calculate_total_vehicles(grid), rows = cells)
+    suite.stage("traffic", scale, "find_max_traffic_intersections", lambda: traffic_grid_analysis.find_max_traffic_intersections(grid), rows = cells)
+    suite.stage("traffic", scale, "transpose_grid", lambda: traffic_grid_analysis.transpose_grid(grid), rows = cells)
+
+def benchmark_reviews(suite, scale, data_dir):
+    """
+    Review processing of BASE_SIZES["reviews"] * scale generated reviews: in memory, like the
+    original script, and streamed from file to file by the review pipeline.
+    """
+    path = reviews_dataset(scale, data_dir)
+    count = BASE_SIZES["reviews"] * scale
+    reviews = suite.stage("reviews", scale, "read_reviews", lambda: read_reviews(path), rows = count)
+    processed = suite.stage("reviews", scale, "process_review", lambda: [customer_review_processing.process_review(review) for review in reviews], rows = count)
+    suite.stage("reviews", scale, "join_reviews", lambda: " ".join(processed), rows = count)
+    output_path = os.path.join(data_dir, f"processed_reviews_{scale}x.txt")
+    suite.stage("reviews", scale, "process_file", lambda: quiet(review_pipeline.process_file, path, output_path), rows = count)
+
+def benchmark_schools(suite, scale, data_dir):
+    """
+    NYC schools analysis of BASE_SIZES["schools"] * scale generated schools.
+    """
+    count = BASE_SIZES["schools"] * scale
+    df = suite.stage("schools", scale, "generate_schools", lambda: nyc_schools_analysis.generate_schools(count, seed = 1), rows = count)
+    df = suite.stage("schools", scale, "clean_schools", lambda: nyc_schools_analysis.clean_schools(df), rows = count)
+    suite.stage("schools", scale, "combined_scores", lambda analysis: analysis.combined_scores,
+                setup = lambda: (nyc_schools_analysis.SchoolsAnalysis(df.copy()),), rows = count)
+    analysis = nyc_schools_analysis.SchoolsAnalysis(df)
+    analysis.combined_scores
+    suite.stage("schools", scale, "above_threshold", analysis.above_threshold, rows = count)
+    suite.stage("schools", scale, "top_schools", analysis.top_schools, rows = count)
+    suite.stage("schools", scale, "group_stats", analysis.group_stats, rows = count)
+
+def benchmark_stock(suite, scale, data_dir):
+    """
+    Stock price analysis of BASE_SIZES["stock"] * scale generated days.
+    """
+    path = stock_dataset(scale, data_dir)
+    count = BASE_SIZES["stock"] * scale
+    df = suite.stage("stock", scale, "load_data", lambda: stock_price_analysis.load_data(path), rows = count)
+    df = suite.stage("stock", scale, "clean_data", stock_price_analysis.clean_data, setup = lambda: (df.copy(),), rows = count)
+    df = suite.stage("stock", scale, "calculate_daily_returns", stock_price_analysis.calculate_daily_returns, setup = lambda: (df.copy(),), rows = count)
+    suite.stage("stock", scale, "calculate_rolling_indicators", stock_price_analysis.calculate_rolling_indicators, setup = lambda: (df.copy(),), rows = count)
+    stats, _ = suite.stage("stock", scale, "perform_statistical_analysis", lambda: stock_price_analysis.perform_statistical_analysis(df), rows = count)
+    suite.stage("stock", scale, "simulate_stock_prices", lambda: stock_price_analysis.simulate_stock_prices(df, stats, num_days = 30), rows = count)
+
+def benchmark_ecommerce(suite, scale, data_dir):
+    """
+    E-commerce data analysis of BASE_SIZES["ecommerce"] * scale generated transactions.
+    """
+    path = ecommerce_dataset(scale, data_dir)
+    count = BASE_SIZES["ecommerce"] * scale
+    df = suite.stage("ecommerce", scale, "load_data", lambda: data_analysis.load_data(path), rows = count)
+    df = suite.stage("ecommerce", scale, "handle_missing_values", data_analysis.handle_missing_values, setup = lambda: (df.copy(),), rows = count)
+    df = suite.stage("ecommerce", scale, "handle_outliers", data_analysis.handle_outliers, setup = lambda: (df.copy(),), rows = count)
+    suite.stage("ecommerce", scale, "aggregated_analysis", lambda: quiet(data_analysis.aggregated_analysis, df), rows = count)
+    suite.stage("ecommerce", scale, "run_aggregations", lambda: run_aggregations(df), rows = count)
+
+PIPELINES = {
+    "traffic": benchmark_traffic,
+    "reviews": benchmark_reviews,
+    "schools": benchmark_schools,
+    "stock": benchmark_stock,
+    "ecommerce": benchmark_ecommerce
+}
+
+# Function 4: Compare with the baseline
+def compare_results(results, baseline, time_tolerance = TIME_TOLERANCE, memory_tolerance = MEMORY_TOLERANCE):
+    """
+    Compare the measurements of every stage with those of the baseline, and print the comparison.
+
+    Parameters:
+    - results (dict): The current measurements, keyed by stage.
+    - baseline (dict): The measurements of the baseline, keyed by stage.
+    - time_tolerance, memory_tolerance (float): The relative increases allowed.
+
+    Returns:
+    - regressions (list): A description of every regression.
+    """
+    regressions = []
+    print(f"\n{'stage':<50} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, record in results.items():
+        if key not in baseline:
+            print(f"{key:<50} {'-':>10} {record['seconds'] * 1000:8.1f}ms {'new':>8}")
+            continue
+        reference = baseline[key]
+        change = record["seconds"] / reference["seconds"] - 1 if reference["seconds"] else 0.0
+        print(f"{key:<50} {reference['seconds'] * 1000:8.1f}ms {record['seconds'] * 1000:8.1f}ms {change:+8.1%}")
+        if change > time_tolerance and record["seconds"] - reference["seconds"] > MIN_SECONDS:
+            regressions.append(f"{key}: {reference['seconds'] * 1000:.1f} ms -> {record['seconds'] * 1000:.1f} ms ({change:+.0%})")
+        if "peak_memory_mb" in record and "peak_memory_mb" in reference:
+            growth = record["peak_memory_mb"] - reference["peak_memory_mb"]
+            if growth > MIN_MEMORY_MB and growth > memory_tolerance * reference["peak_memory_mb"]:
+                regressions.append(f"{key}: peak memory {reference['peak_memory_mb']:.1f} MB -> {record['peak_memory_mb']:.1f} MB")
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"{len(missing)} stages of the baseline were not run (other projects or scales)")
+    return regressions
+
+def environment():
+    """
+    Return a description of the machine and of the library versions.
+    """
+    return {
+        "created": datetime.datetime.now().isoformat(timespec = "seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+def write_json(data, path):
+    """
+    Write data as a JSON file, atomically.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(data, file, indent = 2)
+    os.replace(temporary_path, path)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the pipeline stages of every project at several scales.")
+    parser.add_argument("--scales", type = int, nargs = "+", default = list(SCALES))
+    parser.add_argument("--projects", nargs = "+", choices = list(PIPELINES), default = list(PIPELINES))
+    parser.add_argument("--repeat", type = int, default = 3, help = "timed runs of every stage")
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the memory profiling run")
+    parser.add_argument("--data-dir", default = DEFAULT_DATA_DIR, help = "directory of the generated inputs")
+    parser.add_argument("--output", default = DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default = DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action = "store_true", help = "save the results as the new baseline")
+    parser.add_argument("--tolerance", type = float, default = TIME_TOLERANCE, help = "relative slowdown allowed")
+    parser.add_argument("--memory-tolerance", type = float, default = MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.data_dir, exist_ok = True)
+    suite = BenchmarkSuite(args.repeat, memory = not args.no_memory)
+    for scale in args.scales:
+        for project in args.projects:
+            PIPELINES[project](suite, scale, args.data_dir)
+    metadata = environment()
+    metadata.update({"repeat": args.repeat, "scales": args.scales, "base_sizes": BASE_SIZES,
+                     "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+    report = {"metadata": metadata, "results": suite.results}
+    write_json(report, args.output)
+    print(f"\nResults written to '{args.output}'")
+
+    if args.save_baseline:
+        write_json(report, args.baseline)
+        print(f"Baseline saved to '{args.baseline}'")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at '{args.baseline}' (save one with --save-baseline)")
+        return
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline["metadata"].get("cpu_count") != metadata["cpu_count"] or baseline["metadata"].get("platform") != metadata["platform"]:
+        print("Warning: the baseline was measured on another machine")
+    regressions = compare_results(suite.results, baseline["results"], args.tolerance, args.memory_tolerance)
+    if regressions:
+        print(f"\n{'!' * 70}\nPERFORMANCE REGRESSIONS ({len(regressions)}) against '{args.baseline}':", file = sys.stderr)
+        for regression in regressions:
+            print(f"  {regression}", file = sys.stderr)
+        print("!" * 70, file = sys.stderr)
+        sys.exit(1)
+    print("\nNo regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# Importing the necessary libraries
+import hashlib
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Chart rendering service shared by the analyses. Charts are declared as specs: plain
+# dictionaries of the chart kind, the output file, the data to draw and the labels. They are
+# rendered by worker processes with the Agg backend, so the analysis goes on while its charts
+# are drawn and saved. Large inputs are reduced before they are sent to a worker: long series
+# are downsampled (LTTB or min-max decimation), histograms are sent as their bin counts and box
+# plots as their box statistics. A chart is not rendered again when its spec has not changed
+# since the file was last rendered.
+
+CHART_KINDS = ("line", "bar", "hist", "box")
+# Points of a line chart above which it is downsampled (a 12-inch figure is 1,200 pixels wide at 100 dpi)
+MAX_POINTS = 2_000
+# Markers are only drawn on lines with few points
+MAX_MARKERS = 200
+MAX_BARS = 50
+# Hashes of the specs of the charts rendered in a directory
+CACHE_FILE = ".chart_cache.json"
+# Part of every hash, so that a change of the drawing code renders the charts again
+RENDERER_VERSION = 1
+
+# Function 1: Downsample long series
+def lttb_indices(x, y, num_points):
+    """
+    Select num_points points of a series with the Largest-Triangle-Three-Buckets algorithm: the
+    first and last points, and in each of num_points - 2 buckets the point that makes the largest
+    triangle with the point selected in the previous bucket and the average of the next bucket.
+    The shape of the line, including its peaks, is kept with far fewer points.
+
+    Parameters:
+    - x, y (ndarray): The coordinates of the points, with x increasing.
+    - num_points (int): The number of points to keep (at least 3).
+
+    Returns:
+    - indices (ndarray): The sorted indices of the selected points.
+    """
+    n = len(y)
+    if num_points >= n or num_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype = np.float64)
+    y = np.asarray(y, dtype = np.float64)
+    # Bucket bounds of the points between the first and the last
+    edges = np.linspace(1, n - 1, num_points - 1).astype(np.int64)
+    counts = np.diff(edges)
+    average_x = np.r_[np.add.reduceat(x[:-1], edges[:-1]) / counts, x[-1]]
+    average_y = np.r_[np.add.reduceat(y[:-1], edges[:-1]) / counts, y[-1]]
+    indices = np.empty(num_points, dtype = np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(num_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # Twice the areas of the triangles (selected point, candidate, next average)
+        areas = np.abs((x[selected] - average_x[bucket + 1]) * (y[start:stop] - y[selected])
+                       - (x[selected] - x[start:stop]) * (average_y[bucket + 1] - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+def minmax_indices(y, num_points):
+    """
+    Select about num_points points of a series: the lowest and the highest point of each of
+    num_points / 2 buckets, and the first and last points. Every extreme of the series is kept.
+
+    Returns:
+    - indices (ndarray): The sorted indices of the selected points.
+    """
+    n = len(y)
+    if num_points >= n:
+        return np.arange(n)
+    buckets = np.arange(n) * max(num_points // 2, 1) // n
+    # Sorted by bucket, then by value: the first and last point of each bucket are its extremes
+    order = np.lexsort((y, buckets))
+    sorted_buckets = buckets[order]
+    first = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+    last = np.r_[sorted_buckets[1:] != sorted_buckets[:-1], True]
+    return np.unique(np.r_[0, order[first | last], n - 1])
+
+# Function 2: Declare charts
+def chart_spec(kind, path, data, title = "", xlabel = "", ylabel = "", figsize = (12, 6), rotation = 0, style = None, **options):
+    """
+    Return the spec of a chart.
+
+    Parameters:
+    - kind (str): One of CHART_KINDS.
+    - path (str): The output PNG file.
+    - data (dict): The arrays to draw (see the chart functions below).
+    - title, xlabel, ylabel (str): The labels of the chart.
+    - figsize (tuple): The size of the figure in inches.
+    - rotation (int): The rotation of the x tick labels.
+    - style (str, optional): A Seaborn theme style, such as "darkgrid".
+    - options: Options of the kind of chart (color, alpha, marker, palette).
+
+    Returns:
+    - spec (dict): The chart spec.
+    """
+    if kind not in CHART_KINDS:
+        raise ValueError(f"Unsupported chart kind '{kind}', expected one of {CHART_KINDS}")
+    return {"kind": kind, "path": path, "data": data, "title": title, "xlabel": xlabel, "ylabel": ylabel,
+            "figsize": tuple(figsize), "rotation": rotation, "style": style, "options": options}
+
+def line_chart(path, x, y, max_points = MAX_POINTS, downsample = "lttb", marker = None, **labels):
+    """
+    Return the spec of a line chart of y against x (numbers or dates). Series longer than
+    max_points are downsampled with LTTB ("lttb") or min-max decimation ("minmax"), and their
+    markers are dropped, as they are on any line with more than MAX_MARKERS points.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype = np.float64)
+    finite = np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if len(y) > max_points:
+        numeric_x = x.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x
+        indices = lttb_indices(numeric_x, y, max_points) if downsample == "lttb" else minmax_indices(y, max_points)
+        x, y = x[indices], y[indices]
+    if marker and len(y) > MAX_MARKERS:
+        marker = None
+    return chart_spec("line", path, {"x": x, "y": y}, marker = marker, **labels)
+
+def bar_chart(path, categories, values, max_bars = MAX_BARS, **labels):
+    """
+    Return the spec of a bar chart of values per category (only the first max_bars bars).
+    """
+    categories = np.asarray(categories, dtype = str)[:max_bars]
+    values = np.asarray(values)[:max_bars]
+    return chart_spec("bar", path, {"categories": categories, "values": values}, **labels)
+
+def binned_kde(counts, edges, num_points = 200):
+    """
+    Estimate the density curve of binned values with a Gaussian kernel (Scott's bandwidth, and
+    at least one bin wide), scaled to the counts of the bins.
+
+    Returns:
+    - x, y (ndarray): The points of the curve.
+    """
+    centers = (edges[:-1] + edges[1:]) / 2
+    width = edges[1] - edges[0]
+    total = counts.sum()
+    x = np.linspace(edges[0], edges[-1], num_points)
+    if total == 0:
+        return x, np.zeros(num_points)
+    mean = (centers * counts).sum() / total
+    std = np.sqrt(((centers - mean) ** 2 * counts).sum() / total)
+    bandwidth = max(std * total ** -0.2, width)
+    kernels = np.exp(-0.5 * ((x[:, None] - centers) / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    return x, kernels @ counts * width
+
+def histogram(path, values, bins = 50, kde = False, **labels):
+    """
+    Return the spec of a histogram of values (NaNs are left out). Only the counts of the bins
+    are kept, so the size of the spec does not depend on the number of values; with kde = True,
+    a density curve estimated from the counts is drawn over the bars.
+    """
+    values = np.asarray(values, dtype = np.float64)
+    counts, edges = np.histogram(values[np.isfinite(values)], bins = bins)
+    data = {"counts": counts, "edges": edges}
+    if kde:
+        data["kde_x"], data["kde_y"] = binned_kde(counts, edges)
+    return chart_spec("hist", path, data, **labels)
+
+def box_plot(path, groups, **labels):
+    """
+    Return the spec of a box plot of the values of groups (a dict of label -> values). Only the
+    box statistics of each group (quartiles, whiskers and outliers) are kept.
+    """
+    from matplotlib.cbook import boxplot_stats
+
+    stats = []
+    for label, values in groups.items():
+        values = np.asarray(values, dtype = np.float64)
+        group_stats = boxplot_stats(values[np.isfinite(values)])[0]
+        group_stats["label"] = str(label)
+        stats.append(group_stats)
+    return chart_spec("box", path, {"stats": stats}, **labels)
+
+# Function 3: Draw a chart (in a worker process)
+def draw_axes(spec):
+    """
+    Draw a chart spec on a new figure of the current backend and save it.
+    """
+    import matplotlib.pyplot as plt
+
+    data, options = spec["data"], spec["options"]
+    if spec["style"] or options.get("palette"):
+        import seaborn as sns
+        if spec["style"]:
+            sns.set_theme(style = spec["style"])
+    fig, ax = plt.subplots(figsize = spec["figsize"])
+    if spec["kind"] == "line":
+        ax.plot(data["x"], data["y"], color = options.get("color"), marker = options.get("marker"))
+    elif spec["kind"] == "bar":
+        palette = options.get("palette")
+        colors = sns.color_palette(palette, len(data["categories"])) if palette else options.get("color")
+        ax.bar(data["categories"], data["values"], color = colors)
+    elif spec["kind"] == "hist":
+        edges = data["edges"]
+        ax.bar(edges[:-1], data["counts"], width = np.diff(edges), align = "edge", color = options.get("color"),
+               alpha = options.get("alpha"), edgecolor = "white", linewidth = 0.5)
+        if "kde_x" in data:
+            ax.plot(data["kde_x"], data["kde_y"], color = options.get("color") or "C0")
+    else:
+        ax.bxp(data["stats"])
+    ax.set_title(spec["title"])
+    ax.set_xlabel(spec["xlabel"])
+    ax.set_ylabel(spec["ylabel"])
+    if spec["rotation"]:
+        plt.setp(ax.get_xticklabels(), rotation = spec["rotation"])
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(spec["path"]) or ".", exist_ok = True)
+    fig.savefig(spec["path"])
+    plt.close(fig)
+
+def draw_chart(spec):
+    """
+    Draw a chart spec with the Agg backend and save it. Returns the path of the file.
+    """
+    import matplotlib
+    matplotlib.use("Agg", force = True)
+
+    # Settings changed by a style stay within the chart (a worker draws many charts)
+    with matplotlib.rc_context():
+        draw_axes(spec)
+    return spec["path"]
+
+# Function 4: Render charts in worker processes
+def spec_hash(spec):
+    """
+    Return a hash of everything a chart spec draws.
+    """
+    digest = hashlib.blake2b(str(RENDERER_VERSION).encode(), digest_size = 16)
+    def update(value):
+        if isinstance(value, dict):
+            for key in sorted(value):
+                digest.update(key.encode())
+                update(value[key])
+        elif isinstance(value, (list, tuple)):
+            digest.update(b"[%d" % len(value))
+            for item in value:
+                update(item)
+        elif isinstance(value, np.ndarray):
+            digest.update(f"{value.dtype.str}{value.shape}".encode())
+            digest.update(np.ascontiguousarray(value).view(np.uint8) if value.dtype != object else repr(value.tolist()).encode())
+        else:
+            digest.update(repr(value).encode())
+    update(spec)
+    return digest.hexdigest()
+
+class ChartRenderer:
+    """
+    Renders chart specs in a pool of worker processes. submit returns at once; wait (or the end
+    of a with block) waits for the charts and records the hashes of their specs. A chart whose
+    file exists and whose spec has the hash recorded for that file is skipped.
+    """
+
+    def __init__(self, workers = None, use_cache = True):
+        """
+        Parameters:
+        - workers (int): Number of worker processes (default: one per core, up to 4; 0 draws in this process).
+        - use_cache (bool): Whether to skip the charts whose spec is unchanged.
+        """
+        self.workers = min(os.cpu_count() or 1, 4) if workers is None else workers
+        self.use_cache = use_cache
+        self.executor = None
+        self.pending = []
+        self.results = {}
+        self.caches = {}
+
+    def _cache(self, directory):
+        if directory not in self.caches:
+            try:
+                with open(os.path.join(directory, CACHE_FILE)) as file:
+                    self.caches[directory] = json.load(file)
+            except (OSError, ValueError):
+                self.caches[directory] = {}
+        return self.caches[directory]
+
+    def submit(self, spec):
+        """
+        Start rendering a chart spec, unless it is unchanged. Returns whether it will be rendered.
+        """
+        path = spec["path"]
+        directory, name = os.path.split(os.path.abspath(path))
+        digest = spec_hash(spec)
+        if self.use_cache and os.path.exists(path) and self._cache(directory).get(name) == digest:
+            self.results[path] = "unchanged"
+            return False
+        if self.workers == 0:
+            draw_chart(spec)
+            self.pending.append((path, digest, None))
+            return True
+        if self.executor is None:
+            # Forked workers start without importing anything again
+            context = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+            self.executor = ProcessPoolExecutor(self.workers, mp_context = context)
+        self.pending.append((path, digest, self.executor.submit(draw_chart, spec)))
+        return True
+
+    def wait(self):
+        """
+        Wait for the submitted charts and save the hashes of their specs.
+
+        Returns:
+        - results (dict): "rendered" or "unchanged" for every submitted path.
+        """
+        changed = set()
+        for path, digest, future in self.pending:
+            if future is not None:
+                future.result()
+            directory, name = os.path.split(os.path.abspath(path))
+            self._cache(directory)[name] = digest
+            self.results[path] = "rendered"
+            changed.add(directory)
+        self.pending = []
+        if self.use_cache:
+            for directory in changed:
+                temporary_path = os.path.join(directory, CACHE_FILE + ".tmp")
+                with open(temporary_path, "w") as file:
+                    json.dump(self.caches[directory], file, indent = 2, sort_keys = True)
+                os.replace(temporary_path, os.path.join(directory, CACHE_FILE))
+        return self.results
+
+    def close(self):
+        """
+        Wait for the submitted charts and stop the worker processes.
+        """
+        try:
+            return self.wait()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def render_charts(specs, workers = None, use_cache = True):
+    """
+    Render chart specs in worker processes and wait for them.
+
+    Returns:
+    - results (dict): "rendered" or "unchanged" for every path.
+    """
+    with ChartRenderer(workers, use_cache) as renderer:
+        for spec in specs:
+            renderer.submit(spec)
+    return renderer.results
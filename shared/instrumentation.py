@@ -0,0 +1,445 @@
+# Importing the necessary libraries
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Instrumentation of the pipeline steps. Steps are marked with the instrumented decorator or
+# the stage context manager. While a profiler is enabled, every step records its wall time, the
+# CPU time of the process, how far its peak memory rose above the memory at its start, and the
+# number of rows it received and returned. CPU time and peak memory are measured for the whole
+# process: a step that overlapped a step of another thread is flagged as process_wide, since its
+# figures include the work of that step. The records can be exported as a structured log (JSON
+# lines), a Chrome trace (chrome://tracing or https://ui.perfetto.dev) or Prometheus metrics in
+# the text format. While no profiler is enabled, a step costs one global lookup.
+
+# Directory of the exported files; profile_run only enables the instrumentation when it is set
+PROFILE_DIR_VARIABLE = "PIPELINE_PROFILE_DIR"
+# Memory measurement of profile_run (see MEMORY_MODES), "rss" by default
+PROFILE_MEMORY_VARIABLE = "PIPELINE_PROFILE_MEMORY"
+METRIC_PREFIX = "pipeline_stage"
+
+# The enabled profiler (None while the instrumentation is disabled)
+_profiler = None
+
+# Function 1: Count rows
+def row_count(value):
+    """
+    Return the number of rows of a DataFrame, Series, array or list, or None for other values.
+    """
+    shape = getattr(value, "shape", None)
+    if shape:
+        return int(shape[0])
+    if isinstance(value, list):
+        return len(value)
+    return None
+
+# Function 2: Measure the memory
+def rss_usage():
+    """
+    Return the current and peak resident memory of the process in bytes (VmRSS and VmHWM of
+    /proc/self/status, on Linux), or None where they are not available.
+    """
+    try:
+        usage = {}
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, value = line.split(":")
+                    usage[key] = int(value.split()[0]) * 1024
+        return usage["VmRSS"], usage["VmHWM"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+def reset_rss_peak():
+    """
+    Reset the peak resident memory of the process to its current memory (Linux 4.0 and later).
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+def traced_usage():
+    return tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+
+# Functions returning the current and peak memory in bytes (or None), and resetting the peak.
+# "rss" measures the resident memory of the process, which is cheap and covers every allocation
+# (including those of C libraries); "tracemalloc" measures the memory allocated through Python
+# and NumPy only, but it slows down steps that allocate many Python objects by up to ten times.
+MEMORY_MODES = {
+    "rss": (rss_usage, reset_rss_peak),
+    "tracemalloc": (traced_usage, tracemalloc.reset_peak)
+}
+
+# Function 3: Record the steps
+class StageRecord:
+    """
+    Measurements of one run of a step. rows_out can be set inside a stage block.
+    """
+
+    def __init__(self, name, rows_in = None, parent = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.status = "ok"
+        self.peak_memory = 0
+        self.process_wide = False
+
+    def ancestors(self):
+        record = self.parent
+        while record:
+            yield record
+            record = record.parent
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "depth": self.depth,
+            "start": self.start,
+            "wall_seconds": self.wall_seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_memory_delta_bytes": self.peak_memory_delta,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "status": self.status,
+            "process_wide": self.process_wide,
+            "thread": self.thread
+        }
+
+class NullStage:
+    """
+    What the stage context manager gives while the instrumentation is disabled.
+    """
+    rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_STAGE = NullStage()
+
+class Profiler:
+    """
+    Records the steps of a pipeline run, nested steps included (a step run by another step is its
+    child; a step run in another thread is a child of the step given as its parent).
+    """
+
+    def __init__(self, pipeline, memory = "rss"):
+        """
+        Parameters:
+        - pipeline (str): The name of the pipeline, in the exported records.
+        - memory (str or None): How to measure the peak memory of the steps (see MEMORY_MODES),
+          or None not to measure it.
+        """
+        if memory and memory not in MEMORY_MODES:
+            raise ValueError(f"Unknown memory mode '{memory}', expected one of {list(MEMORY_MODES)}")
+        self.pipeline = pipeline
+        self.memory = memory
+        self.run_id = datetime.datetime.now().isoformat(timespec = "seconds")
+        self.records = []
+        self.local = threading.local()
+        # The steps running in every thread
+        self.open_records = []
+        self.lock = threading.Lock()
+        self.started_tracing = False
+
+    def start(self):
+        if self.memory == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def current_stage(self):
+        """
+        Return the record of the innermost step running in the calling thread, or None.
+        """
+        stack = self.local.__dict__.get("stack")
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def stage(self, name, rows_in = None, parent = None):
+        """
+        Measure the block of a step. Yields its StageRecord.
+        The parent is the innermost step of the calling thread, unless one is given (such as the
+        step that submitted the block to a thread pool, see current_stage).
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        record = StageRecord(name, rows_in, parent or (stack[-1] if stack else None))
+        with self.lock:
+            # Steps of other threads that are not enclosing this one share its CPU time and memory
+            ancestors = set(map(id, record.ancestors()))
+            for other in self.open_records:
+                if id(other) not in ancestors:
+                    other.process_wide = record.process_wide = True
+            self.open_records.append(record)
+            usage = MEMORY_MODES[self.memory][0]() if self.memory else None
+            if usage:
+                start_memory, peak = usage
+                # The peak is reset for this step; the running steps keep what they reached so far
+                for other in self.open_records:
+                    other.peak_memory = max(other.peak_memory, peak)
+                MEMORY_MODES[self.memory][1]()
+        stack.append(record)
+        record.thread = threading.get_ident()
+        record.start = time.time()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException:
+            record.status = "error"
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - start_wall
+            record.cpu_seconds = time.process_time() - start_cpu
+            record.peak_memory_delta = None
+            with self.lock:
+                if usage:
+                    end_usage = MEMORY_MODES[self.memory][0]()
+                    record.peak_memory = max(record.peak_memory, end_usage[1] if end_usage else 0)
+                    record.peak_memory_delta = max(record.peak_memory - start_memory, 0)
+                    if record.parent:
+                        record.parent.peak_memory = max(record.parent.peak_memory, record.peak_memory)
+                self.open_records.remove(record)
+            stack.pop()
+            self.records.append(record)
+
+    # Function 4: Export the records
+    def to_dicts(self):
+        """
+        Return the records in the order the steps started, as dictionaries.
+        """
+        records = sorted(self.records, key = lambda record: record.start)
+        return [{"pipeline": self.pipeline, "run_id": self.run_id, **record.to_dict()} for record in records]
+
+    def write_log(self, path):
+        """
+        Append the records to a JSON lines file (one line per step), which keeps the history of the runs.
+        """
+        with open(path, "a") as file:
+            for record in self.to_dicts():
+                file.write(json.dumps(record) + "\n")
+
+    def chrome_trace(self):
+        """
+        Return the records as a Chrome trace (complete events, in microseconds).
+        """
+        events = []
+        for record in self.to_dicts():
+            events.append({
+                "name": record["stage"],
+                "cat": self.pipeline,
+                "ph": "X",
+                "ts": record["start"] * 1e6,
+                "dur": record["wall_seconds"] * 1e6,
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {key: record[key] for key in ("cpu_seconds", "peak_memory_delta_bytes", "rows_in", "rows_out", "status", "process_wide")}
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"pipeline": self.pipeline, "run_id": self.run_id}}
+
+    def write_chrome_trace(self, path):
+        write_atomically(path, json.dumps(self.chrome_trace()))
+
+    def prometheus_text(self):
+        """
+        Return the metrics of the run in the Prometheus text format: per step, the totals over
+        its runs of the wall time, CPU time and rows, the largest peak memory delta, and whether a
+        run overlapped steps of other threads.
+        """
+        totals = {}
+        for record in self.records:
+            stage = totals.setdefault(record.name, {"duration_seconds": 0.0, "cpu_seconds": 0.0, "rows_in": 0, "rows_out": 0,
+                                                    "peak_memory_delta_bytes": 0, "process_wide": 0, "runs": 0})
+            stage["duration_seconds"] += record.wall_seconds
+            stage["cpu_seconds"] += record.cpu_seconds
+            stage["rows_in"] += record.rows_in or 0
+            stage["rows_out"] += record.rows_out or 0
+            stage["peak_memory_delta_bytes"] = max(stage["peak_memory_delta_bytes"], record.peak_memory_delta or 0)
+            stage["process_wide"] = max(stage["process_wide"], int(record.process_wide))
+            stage["runs"] += 1
+        descriptions = {
+            "duration_seconds": "Wall time of the pipeline stage in the last run.",
+            "cpu_seconds": "CPU time of the process during the pipeline stage in the last run.",
+            "peak_memory_delta_bytes": "Rise of the peak memory above the memory at the start of the pipeline stage in the last run.",
+            "rows_in": "Rows received by the pipeline stage in the last run.",
+            "rows_out": "Rows returned by the pipeline stage in the last run.",
+            "process_wide": "1 if the pipeline stage overlapped stages of other threads in the last run, so that its CPU time and peak memory include theirs.",
+            "runs": "Number of runs of the pipeline stage in the last run of the pipeline."
+        }
+        lines = []
+        for metric, description in descriptions.items():
+            lines.append(f"# HELP {METRIC_PREFIX}_{metric} {description}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{metric} gauge")
+            for name, stage in totals.items():
+                lines.append(f'{METRIC_PREFIX}_{metric}{{pipeline="{label_value(self.pipeline)}",stage="{label_value(name)}"}} {stage[metric]}')
+        lines.append("# HELP pipeline_last_run_timestamp_seconds Start time of the last run of the pipeline.")
+        lines.append("# TYPE pipeline_last_run_timestamp_seconds gauge")
+        start = min((record.start for record in self.records), default = time.time())
+        lines.append(f'pipeline_last_run_timestamp_seconds{{pipeline="{label_value(self.pipeline)}"}} {start}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        write_atomically(path, self.prometheus_text())
+
+    def export(self, output_dir):
+        """
+        Append the records to <pipeline>.jsonl, and write <pipeline>.trace.json and <pipeline>.prom
+        (a file for the textfile collector of the Prometheus node exporter) in output_dir.
+        """
+        os.makedirs(output_dir, exist_ok = True)
+        base_path = os.path.join(output_dir, self.pipeline)
+        self.write_log(base_path + ".jsonl")
+        self.write_chrome_trace(base_path + ".trace.json")
+        self.write_prometheus(base_path + ".prom")
+
+    def summary(self):
+        """
+        Return a table of the steps, indented by nesting; every step is listed under the one it ran
+        in, also when steps of several threads overlap. The CPU time and memory of the steps that
+        overlapped steps of other threads are marked with a "*".
+        """
+        children = {}
+        for record in sorted(self.records, key = lambda record: record.start):
+            children.setdefault(id(record.parent) if record.parent else None, []).append(record)
+        def walk(parent_id):
+            for record in children.get(parent_id, []):
+                yield {"pipeline": self.pipeline, "run_id": self.run_id, **record.to_dict()}
+                yield from walk(id(record))
+        lines = [f"{'stage':<40} {'wall':>10} {'cpu':>10} {'peak mem':>10} {'rows in':>10} {'rows out':>10}"]
+        for record in walk(None):
+            mark = "*" if record["process_wide"] else " "
+            memory = "" if record["peak_memory_delta_bytes"] is None else f"{record['peak_memory_delta_bytes'] / 2**20:.1f} MB"
+            rows_in = "" if record["rows_in"] is None else record["rows_in"]
+            rows_out = "" if record["rows_out"] is None else record["rows_out"]
+            lines.append(f"{'  ' * record['depth'] + record['stage']:<40} {record['wall_seconds']:9.3f}s {record['cpu_seconds']:9.3f}s{mark}"
+                         f"{memory:>9}{mark if memory else ' '} {rows_in:>10} {rows_out:>10}")
+        if any(record.process_wide for record in self.records):
+            lines.append("* CPU time and memory of the whole process: the step overlapped steps of other threads")
+        return "\n".join(lines)
+
+def label_value(value):
+    """
+    Escape a Prometheus label value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_atomically(path, text):
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as file:
+        file.write(text)
+    os.replace(temporary_path, path)
+
+# Function 5: Mark the steps
+def enable(pipeline, memory = "rss"):
+    """
+    Enable the instrumentation with a new profiler, and return it.
+    """
+    global _profiler
+    profiler = Profiler(pipeline, memory)
+    profiler.start()
+    _profiler = profiler
+    return profiler
+
+def disable():
+    """
+    Disable the instrumentation, and return the profiler that was enabled (or None).
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+def stage(name, rows_in = None, parent = None):
+    """
+    Context manager measuring a block as a step while the instrumentation is enabled:
+
+        with stage("run_aggregations", rows_in = len(df)) as step:
+            aggregates = run_aggregations(df)
+            step.rows_out = len(aggregates)
+
+    A block run in another thread is recorded under the step given as its parent (see current_stage).
+    """
+    return NULL_STAGE if _profiler is None else _profiler.stage(name, rows_in, parent)
+
+def current_stage():
+    """
+    Return the record of the innermost step running in the calling thread (None while the
+    instrumentation is disabled or outside of any step), to be given as the parent of the steps
+    it submits to other threads.
+    """
+    return None if _profiler is None else _profiler.current_stage()
+
+def instrumented(function = None, name = None):
+    """
+    Decorator measuring every call of a function as a step while the instrumentation is enabled
+    (as @instrumented, or @instrumented(name = "...")). The input rows are those of the first
+    argument and the output rows those of the result (see row_count).
+    """
+    if function is None:
+        return functools.partial(instrumented, name = name)
+    stage_name = name or function.__name__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _profiler is None:
+            return function(*args, **kwargs)
+        with _profiler.stage(stage_name, row_count(args[0]) if args else None) as record:
+            result = function(*args, **kwargs)
+            record.rows_out = row_count(result)
+            return result
+    return wrapper
+
+def _disable_in_child():
+    # Forked worker processes (such as those of the chart renderer) inherit the profiler and the
+    # tracing of tracemalloc, which would slow them down; their steps are not recorded
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child = _disable_in_child)
+
+@contextmanager
+def profile_run(pipeline, output_dir = None, memory = None):
+    """
+    Profile a run of a pipeline when an output directory is given or set in the
+    PIPELINE_PROFILE_DIR environment variable; otherwise the instrumentation stays disabled.
+    The memory mode (see MEMORY_MODES) can also be set in PIPELINE_PROFILE_MEMORY ("none" not
+    to measure the memory).
+    The whole run is the root step. At the end, the records are exported to the output directory
+    (see Profiler.export) and a summary is printed to standard error.
+
+    Yields:
+    - profiler (Profiler or None): The enabled profiler.
+    """
+    output_dir = output_dir or os.environ.get(PROFILE_DIR_VARIABLE)
+    if not output_dir:
+        yield None
+        return
+    memory = memory or os.environ.get(PROFILE_MEMORY_VARIABLE, "rss")
+    profiler = enable(pipeline, None if memory == "none" else memory)
+    try:
+        with profiler.stage(pipeline):
+            yield profiler
+    finally:
+        disable()
+        profiler.export(output_dir)
+        print(f"\nProfile of {pipeline} (exported to '{output_dir}'):\n{profiler.summary()}", file = sys.stderr)
@@ -0,0 +1,432 @@
+# Importing the necessary libraries
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import threading
+import types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from shared.instrumentation import current_stage, stage
+
+# Memoized task runner for the pipelines. A pipeline is declared as tasks: plain dictionaries of
+# a function, the names of its inputs (outputs of other tasks), its parameters, the names of its
+# outputs and the files it writes. Every task has a key, a hash of its code, its parameters (the
+# contents of the input files included) and the keys of the tasks it depends on. Its results are
+# stored under that key in an on-disk artifact cache, so a task only runs again when something it
+# depends on changed; the cache is kept under a size limit by evicting the least recently used
+# artifacts. Tasks that do not depend on each other run concurrently, in threads; the tasks that
+# start process pools run alone in the main thread.
+
+# Part of every key, so that a change of the format of the artifacts runs every task again
+RUNNER_VERSION = 2
+# The modules under this directory are hashed into the keys of the tasks that use them
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_BYTES = 1 << 30
+ARTIFACT_SUFFIX = ".pkl"
+
+# Function 1: Declare the tasks
+class FileInput:
+    """
+    A file parameter of a task: the function receives the path, and the key of the task depends
+    on the contents of the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def fingerprint(self):
+        digest = hashlib.blake2b(digest_size = 16)
+        with open(self.path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def __repr__(self):
+        return f"FileInput({self.path!r})"
+
+def file_input(path):
+    """
+    Return a task parameter for a file read by the task (see FileInput).
+    """
+    return FileInput(path)
+
+def task(name, function, inputs = (), params = None, outputs = None, files = (), after = (), cache = True,
+         copy_inputs = False, main_thread = False, version = None):
+    """
+    Return the spec of a task.
+
+    Parameters:
+    - name (str): The name of the task.
+    - function (callable): Called with the values of the inputs as positional arguments, and the parameters as keywords.
+    - inputs (list): The names of the outputs of other tasks passed to the function.
+    - params (dict): Constant keyword arguments (file_input(path) for the files the task reads).
+    - outputs (list): The names of the outputs, when the function returns a tuple of several
+      values (default: a single output named like the task).
+    - files (list): The files written by the task; its results are only reused while they exist.
+    - after (list): Names of tasks to run before this one, without using their outputs (to
+      keep the printed reports in order, for example).
+    - cache (bool): Whether to store the results. Tasks that are not stored run every time they
+      are needed; those that no other task uses (such as reports) run on every run.
+    - copy_inputs (bool): Whether to pass copies of the inputs, for functions that modify them.
+    - main_thread (bool): Run the task in the main thread while no other task runs, for the
+      steps that start process pools: forking while other threads run can deadlock the workers.
+    - version: Part of the key; change it to run the task again for a change the key does not
+      see (see function_fingerprint), such as an upgrade of an installed package.
+
+    Returns:
+    - spec (dict): The task spec.
+    """
+    return {"name": name, "function": function, "inputs": list(inputs), "params": dict(params or {}),
+            "outputs": list(outputs) if outputs else [name], "files": list(files), "after": list(after),
+            "cache": cache, "copy_inputs": copy_inputs, "main_thread": main_thread, "version": version}
+
+# Function 2: Compute the keys
+def is_local_module(module):
+    """
+    Return whether a module is a source file of the repository (not the standard library or a package).
+    """
+    path = getattr(module, "__file__", None)
+    return bool(path) and os.path.abspath(path).startswith(REPOSITORY_ROOT + os.sep) and os.sep + "site-packages" + os.sep not in path
+
+def defining_module(value):
+    """
+    Return the module a global value comes from: the module itself, or the module that defines a function or class.
+    """
+    if isinstance(value, types.ModuleType):
+        return value
+    module_name = getattr(value, "__module__", None)
+    return sys.modules.get(module_name) if isinstance(module_name, str) else None
+
+def code_names(code):
+    """
+    Return the global and attribute names used by a code object and the functions nested in it.
+    """
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= code_names(constant)
+    return names
+
+def update_module_hash(digest, module, seen):
+    # The source of a repository module, and of the repository modules it uses
+    if module.__name__ in seen:
+        return
+    seen.add(module.__name__)
+    with open(module.__file__, "rb") as file:
+        digest.update(file.read())
+    for value in list(vars(module).values()):
+        other = defining_module(value)
+        if other is not None and other is not module and is_local_module(other):
+            update_module_hash(digest, other, seen)
+
+def update_function_hash(digest, function, seen):
+    # A function of an imported repository module is covered by the source of the whole module
+    # and of the repository modules it uses: the module may reach it through a registry or any
+    # other way. The functions of the script being run are followed one by one instead, so that
+    # editing one step of the script does not run the other steps again.
+    function = inspect.unwrap(function)
+    module = defining_module(function)
+    if module is not None and module.__name__ != "__main__" and is_local_module(module):
+        update_module_hash(digest, module, seen)
+        return
+    if id(function) in seen:
+        return
+    seen.add(id(function))
+    try:
+        digest.update(inspect.getsource(function).encode())
+    except (OSError, TypeError):
+        code = getattr(function, "__code__", None)
+        digest.update(repr((getattr(function, "__qualname__", repr(function)), code.co_code if code else None, code.co_names if code else None)).encode())
+    if inspect.isclass(function):
+        for member in vars(function).values():
+            if inspect.isfunction(member):
+                update_function_hash(digest, member, seen)
+        return
+    code = getattr(function, "__code__", None)
+    global_values = getattr(function, "__globals__", {})
+    for name in sorted(code_names(code)) if code else []:
+        if name in global_values:
+            digest.update(name.encode())
+            update_reference_hash(digest, global_values[name], module, seen)
+
+def update_reference_hash(digest, value, module, seen):
+    # A global used by a function of the script: functions and classes (also inside containers,
+    # such as registries), repository modules, and constants; installed packages are left out
+    if isinstance(value, dict):
+        for key in sorted(value, key = repr):
+            digest.update(repr(key).encode())
+            update_reference_hash(digest, value[key], module, seen)
+        return
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key = repr) if isinstance(value, (set, frozenset)) else value
+        for item in items:
+            update_reference_hash(digest, item, module, seen)
+        return
+    other = defining_module(value)
+    if inspect.isfunction(value) or inspect.isclass(value) or inspect.ismethod(value):
+        if other is module or (other is not None and is_local_module(other)):
+            update_function_hash(digest, value, seen)
+    elif isinstance(value, types.ModuleType):
+        if is_local_module(value):
+            update_module_hash(digest, value, seen)
+    elif other is None or other is module or is_local_module(other):
+        # Values whose repr holds an address are left out, as it changes on every run
+        text = repr(value)
+        if " at 0x" not in text:
+            digest.update(text.encode())
+
+def function_fingerprint(function):
+    """
+    Return a hash of the code a task runs. For a function of the script being run, it covers
+    the source of the function (of the function it wraps, for a decorated function), of the
+    functions, classes and constants of the script it uses, and of the repository modules it
+    uses, such as the aggregation engine or the chart renderer. For a function of a repository
+    module, it covers the source of that module and of the repository modules it uses.
+    Installed packages are not part of it.
+    """
+    digest = hashlib.blake2b(digest_size = 20)
+    update_function_hash(digest, function, set())
+    return digest.hexdigest()
+
+def update_hash(digest, value):
+    """
+    Add a parameter value to a hash: containers item by item, arrays by their bytes, files by
+    their contents, and other values by their repr.
+    """
+    if isinstance(value, dict):
+        digest.update(b"{%d" % len(value))
+        for key in sorted(value, key = repr):
+            update_hash(digest, key)
+            update_hash(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(b"[%d" % len(value))
+        for item in value:
+            update_hash(digest, item)
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        digest.update(f"{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).view(np.uint8))
+    elif isinstance(value, FileInput):
+        digest.update(f"file:{value.fingerprint()}".encode())
+    else:
+        digest.update(repr(value).encode())
+
+# Function 3: Store the results
+class ArtifactCache:
+    """
+    Directory of pickled task results, named by their keys. Reading an artifact marks it as
+    recently used (its modification time), and evict removes the least recently used artifacts
+    until the directory is under its size limit.
+    """
+
+    def __init__(self, directory, max_bytes = DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok = True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ARTIFACT_SUFFIX)
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def load(self, key):
+        path = self.path(key)
+        with open(path, "rb") as file:
+            value = pickle.load(file)
+        os.utime(path)
+        return value
+
+    def store(self, key, value):
+        path = self.path(key)
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(value, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    def evict(self):
+        """
+        Remove the least recently used artifacts until the total size is under max_bytes.
+
+        Returns:
+        - removed (int): The number of artifacts removed.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(ARTIFACT_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+# Function 4: Run the tasks
+class TaskRunner:
+    """
+    Runs the tasks of a pipeline, reusing the stored results of those whose key did not change.
+    Only the tasks needed by the final tasks (those whose outputs no task uses) run; stored
+    results are only read when a task that runs needs them.
+    """
+
+    def __init__(self, cache_dir, max_bytes = DEFAULT_CACHE_BYTES, workers = 4):
+        """
+        Parameters:
+        - cache_dir (str): The directory of the artifact cache.
+        - max_bytes (int): The size limit of the artifact cache.
+        - workers (int): The number of tasks run at the same time.
+        """
+        self.cache = ArtifactCache(cache_dir, max_bytes)
+        self.workers = workers
+        self.lock = threading.Lock()
+
+    def _plan(self, tasks):
+        # Producers of the outputs, and the tasks in an order where dependencies come first
+        self.tasks = {}
+        self.producers = {}
+        for spec in tasks:
+            if spec["name"] in self.tasks:
+                raise ValueError(f"Duplicate task '{spec['name']}'")
+            self.tasks[spec["name"]] = spec
+            for output in spec["outputs"]:
+                if output in self.producers:
+                    raise ValueError(f"Output '{output}' is produced by '{self.producers[output]}' and '{spec['name']}'")
+                self.producers[output] = spec["name"]
+        self.dependencies = {}
+        for name, spec in self.tasks.items():
+            for output in spec["inputs"]:
+                if output not in self.producers:
+                    raise ValueError(f"Task '{name}' uses '{output}', which no task produces")
+            for other in spec["after"]:
+                if other not in self.tasks:
+                    raise ValueError(f"Task '{name}' runs after '{other}', which is not a task")
+            self.dependencies[name] = [self.producers[output] for output in spec["inputs"]]
+        order, state = [], {}
+        def visit(name):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Task '{name}' depends on itself")
+            state[name] = "visiting"
+            for other in self.dependencies[name] + self.tasks[name]["after"]:
+                visit(other)
+            state[name] = "done"
+            order.append(name)
+        for name in self.tasks:
+            visit(name)
+        return order
+
+    def _key(self, name):
+        spec = self.tasks[name]
+        digest = hashlib.blake2b(digest_size = 20)
+        update_hash(digest, [RUNNER_VERSION, name, spec["outputs"], spec["version"]])
+        digest.update(function_fingerprint(spec["function"]).encode())
+        update_hash(digest, spec["params"])
+        update_hash(digest, [(output, self.keys[self.producers[output]]) for output in spec["inputs"]])
+        return digest.hexdigest()
+
+    def value(self, output):
+        """
+        Return the value of an output of the last run, read from the cache when its task did not run.
+        """
+        with self.lock:
+            if output in self.values:
+                return self.values[output]
+            name = self.producers[output]
+            if not self.stored[name]:
+                raise KeyError(f"Output '{output}' of task '{name}' was neither computed nor stored")
+            with stage(f"load:{name}"):
+                values = self.cache.load(self.keys[name])
+            self.values.update(zip(self.tasks[name]["outputs"], values))
+            return self.values[output]
+
+    def _execute(self, name, parent = None):
+        # A step of the instrumentation covers the task, with the reading of its inputs from the cache;
+        # tasks run in the pool are recorded under the step that runs the pipeline
+        spec = self.tasks[name]
+        with stage(f"task:{name}", parent = parent):
+            arguments = [self.value(output) for output in spec["inputs"]]
+            if spec["copy_inputs"]:
+                arguments = [argument.copy() if hasattr(argument, "copy") else argument for argument in arguments]
+            params = {key: value.path if isinstance(value, FileInput) else value for key, value in spec["params"].items()}
+            result = spec["function"](*arguments, **params)
+            values = tuple(result) if len(spec["outputs"]) > 1 else (result,)
+            if len(values) != len(spec["outputs"]):
+                raise ValueError(f"Task '{name}' returned {len(values)} values for the outputs {spec['outputs']}")
+            if spec["cache"]:
+                with stage(f"store:{name}"):
+                    self.cache.store(self.keys[name], values)
+        with self.lock:
+            self.values.update(zip(spec["outputs"], values))
+
+    def run(self, tasks):
+        """
+        Run a pipeline.
+
+        Parameters:
+        - tasks (list): The task specs (see task).
+
+        Returns:
+        - statuses (dict): For every task, "ran", "cached" (its stored results are valid) or
+          "unchanged" (not stored, and not needed by a task that ran).
+        """
+        order = self._plan(tasks)
+        self.keys, self.values = {}, {}
+        for name in order:
+            self.keys[name] = self._key(name)
+        self.stored = {
+            name: spec["cache"] and self.cache.contains(self.keys[name]) and all(os.path.exists(path) for path in spec["files"])
+            for name, spec in self.tasks.items()
+        }
+
+        # The tasks to run: the final tasks without stored results, and the tasks they need
+        used = {output for spec in self.tasks.values() for output in spec["inputs"]}
+        pending = [name for name, spec in self.tasks.items() if not set(spec["outputs"]) & used and not self.stored[name]]
+        to_run = set()
+        while pending:
+            name = pending.pop()
+            if name not in to_run:
+                to_run.add(name)
+                pending.extend(other for other in self.dependencies[name] if not self.stored[other])
+        waits_for = {name: {other for other in self.dependencies[name] + self.tasks[name]["after"] if other in to_run} for name in to_run}
+
+        # Every task starts as soon as the tasks it waits for are done; a main-thread task waits
+        # until the running tasks are done, and no task starts while it runs
+        done, started, running = set(), set(), {}
+        parent = current_stage()
+        with ThreadPoolExecutor(self.workers) as executor:
+            while len(done) < len(to_run):
+                ready = [name for name in order if name in to_run and name not in started and waits_for[name] <= done]
+                exclusive = [name for name in ready if self.tasks[name]["main_thread"]]
+                if exclusive and not running:
+                    started.add(exclusive[0])
+                    self._execute(exclusive[0])
+                    done.add(exclusive[0])
+                    continue
+                if not exclusive:
+                    for name in ready:
+                        started.add(name)
+                        running[executor.submit(self._execute, name, parent)] = name
+                finished, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    future.result()
+                    done.add(name)
+        self.cache.evict()
+        return {name: "ran" if name in to_run else "cached" if self.stored[name] else "unchanged" for name in order}
+
+def status_summary(statuses):
+    """
+    Return a line listing the tasks that ran and those whose stored results were reused.
+    """
+    ran = [name for name, status in statuses.items() if status == "ran"]
+    cached = [name for name, status in statuses.items() if status == "cached"]
+    return f"Steps run: {', '.join(ran) or 'none'}; reused from the cache: {', '.join(cached) or 'none'}"